@@ -17,7 +17,7 @@ DEVICES = {
     "lampada": {
         "id": "id_here",
         "ip": "ip_here",
-        "key": "key_here"~)",
+        "key": "key_here",
         "version": 3.5,
     },
 }
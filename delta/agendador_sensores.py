@@ -0,0 +1,112 @@
+"""
+Agenda adaptativa de leitura de cada sensor.
+
+Cada sensor começa no seu período base (hardware.PERIODO_SENSORES) e:
+  - nunca é lido antes do intervalo mínimo do hardware (DHT22 ~2 s);
+  - acelera (período / 2) quando os valores mudam rápido;
+  - desacelera (período x 1.25) quando estão estáveis, até PERIODO_MAXIMO;
+  - recua exponencialmente após falhas seguidas.
+
+Também guarda contadores de latência e falhas por sensor.
+"""
+
+import time
+
+import metricas_http
+
+# Intervalo mínimo entre leituras imposto pelo hardware (s)
+PERIODO_MINIMO = {"AHT20": 0.1, "BMP280": 0.05, "DHT22": 2.0}
+PERIODO_MAXIMO = 8.0  # Abaixo de IDADE_MAXIMA_LEITURA (delta.py) para a leitura nunca "vencer"
+
+# Variação entre duas leituras considerada "rápida" para cada grandeza
+LIMIAR_VARIACAO = {"temp": 0.2, "umid": 1.0, "pressao": 0.3}
+FATOR_ACELERAR = 0.5
+FATOR_DESACELERAR = 1.25
+ALFA_TAXA_FALHAS = 0.05   # Média exponencial da taxa de falhas
+
+
+class AgendaSensor:
+    """Período atual, próxima leitura e contadores de um sensor."""
+
+    __slots__ = ("nome", "minimo", "periodo", "proxima", "ultima_tentativa", "ultimo",
+                 "falhas_seguidas", "leituras", "falhas", "latencia_total", "latencia_max", "taxa_falhas")
+
+    def __init__(self, nome: str, periodo_base: float):
+        self.nome = nome
+        self.minimo = PERIODO_MINIMO.get(nome, 0.0)
+        self.periodo = max(self.minimo, periodo_base)
+        self.proxima = 0.0
+        self.ultima_tentativa = float("-inf")
+        self.ultimo = None
+        self.falhas_seguidas = 0
+        self.leituras = 0
+        self.falhas = 0
+        self.latencia_total = 0.0
+        self.latencia_max = 0.0
+        self.taxa_falhas = 0.0
+
+    def pode_ler(self, agora: float) -> bool:
+        """O intervalo mínimo do hardware já passou desde a última tentativa?"""
+        return agora - self.ultima_tentativa >= self.minimo
+
+    def _variacao(self, dados) -> float:
+        """Maior variação relativa ao limiar entre esta leitura e a anterior."""
+        if self.ultimo is None:
+            return 0.0
+        maior = 0.0
+        for g, limiar in LIMIAR_VARIACAO.items():
+            novo, velho = dados.get(g), self.ultimo.get(g)
+            if novo is not None and velho is not None:
+                maior = max(maior, abs(novo - velho) / limiar)
+        return maior
+
+    def registrar(self, dados, latencia: float, agora: float):
+        """Registra uma tentativa (dados=None em falha) e agenda a próxima."""
+        self.ultima_tentativa = agora
+        self.latencia_total += latencia
+        self.latencia_max = max(self.latencia_max, latencia)
+        falhou = dados is None
+        self.taxa_falhas += ALFA_TAXA_FALHAS * (float(falhou) - self.taxa_falhas)
+
+        if falhou:
+            self.falhas += 1
+            self.falhas_seguidas += 1
+            espera = min(PERIODO_MAXIMO, self.periodo * 2 ** self.falhas_seguidas)
+        else:
+            self.leituras += 1
+            self.falhas_seguidas = 0
+            variacao = self._variacao(dados)
+            if variacao >= 1.0:
+                self.periodo *= FATOR_ACELERAR
+            elif variacao < 0.25:
+                self.periodo *= FATOR_DESACELERAR
+            self.periodo = min(PERIODO_MAXIMO, max(self.minimo, self.periodo))
+            self.ultimo = dados
+            espera = self.periodo
+        self.proxima = agora + max(self.minimo, espera)
+
+    def resumo(self) -> dict:
+        tentativas = self.leituras + self.falhas
+        return {
+            "periodo_s": round(self.periodo, 3),
+            "leituras": self.leituras,
+            "falhas": self.falhas,
+            "taxa_falhas": round(self.taxa_falhas, 3),
+            "latencia_media_ms": round(self.latencia_total / tentativas * 1000, 2) if tentativas else None,
+            "latencia_max_ms": round(self.latencia_max * 1000, 2),
+        }
+
+
+def ler_agendado(agenda: AgendaSensor, ler):
+    """Chama `ler()` medindo a latência; exceção ou None contam como falha."""
+    t0 = time.perf_counter()
+    try:
+        dados = ler()
+    except Exception:
+        dados = None  # DHT22 falha com frequencia
+    latencia = time.perf_counter() - t0
+    agenda.registrar(dados, latencia, time.monotonic())
+    metricas_http.LATENCIA_SENSOR.observar(latencia, agenda.nome)
+    if dados is None:
+        metricas_http.FALHAS_SENSOR.inc(1, agenda.nome)
+    return dados
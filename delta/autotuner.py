@@ -0,0 +1,278 @@
+"""
+Autotuner do SLM: mede, nesta máquina, quanto cada configuração custa em
+latência e em acerto das tool calls, e grava a mais rápida que atinge o
+acerto mínimo em config_slm.json (carregado pelo delta.py).
+
+A grade cobre os modelos instalados no Ollama (a quantização faz parte da
+tag, ex: llama3.2:3b-instruct-q4_K_M), num_ctx, num_predict, variantes do
+SYSTEM_PROMPT e estilos do schema das ferramentas (config_slm.ESTILOS). O
+corpus rotulado é o do benchmark (entradas com "ferramentas").
+
+    python3 autotuner.py                               # grade padrão, todos os modelos
+    python3 autotuner.py --modelos llama3.2:1b llama3.2:3b --num-ctx 2048
+    python3 autotuner.py --acerto-minimo 1.0 --nao-salvar
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+
+# O autotuner não lê sensores nem mexe no LED: nada de I2C/GPIO concorrendo com o DELTA
+os.environ.setdefault("DELTA_BACKEND", "simulado")
+
+import ollama
+
+import delta
+import config_slm
+import metricas_latencia
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark", "corpus.json")
+
+NUM_CTX = (1024, 2048, 4096)
+NUM_PREDICT = (64, 128)
+ACERTO_MINIMO = 0.9         # Fração das frases com as tool calls certas
+REPETICOES = 1              # Passadas pelo corpus por configuração
+MEDIA_CONTEXTO = 26.0       # Temperatura fixa no prompt (resultados comparáveis entre execuções)
+
+
+def variantes_prompt(base: str) -> dict:
+    """
+    completo: SYSTEM_PROMPT do delta.py
+    regras: sem o bloco de ações (o prompt da rota de tools já repete)
+    curto: só a identidade e o formato da resposta
+    """
+    blocos = base.split("\n\n")
+    variantes = {"completo": base}
+    if len(blocos) >= 3:
+        variantes["regras"] = "\n\n".join(blocos[:2])
+    if len(blocos) >= 2:
+        variantes["curto"] = blocos[0]
+    return variantes
+
+
+def modelos_instalados() -> list:
+    """[(tag, quantização ou None)] do /api/tags."""
+    modelos = []
+    for m in ollama.list()["models"]:
+        detalhes = m.get("details") or {}
+        modelos.append((m.get("model") or m.get("name"), detalhes.get("quantization_level")))
+    return modelos
+
+
+def carregar_corpus(caminho: str = CORPUS) -> list:
+    with open(caminho, encoding="utf-8") as f:
+        return [e for e in json.load(f) if "ferramentas" in e]
+
+
+def _normalizar(valor):
+    """Compara argumentos sem depender de como o modelo tipou ("22", 22, 22.0, "true")."""
+    if isinstance(valor, str):
+        texto = valor.strip().lower()
+        if texto in ("true", "false"):
+            return texto == "true"
+        try:
+            return float(texto)
+        except ValueError:
+            return texto
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    return valor
+
+
+def acertou(esperadas: list, tool_calls) -> bool:
+    """
+    Mesmas ferramentas (com repetição) e, em cada uma, os argumentos rotulados
+    com o valor certo; argumentos a mais são tolerados.
+    """
+    obtidas = []
+    for call in tool_calls or []:
+        args = call["function"]["arguments"]
+        if isinstance(args, str):
+            try:
+                args = json.loads(args)
+            except ValueError:
+                args = {}
+        obtidas.append((call["function"]["name"], args or {}))
+    if sorted(n for n, _ in obtidas) != sorted(e["nome"] for e in esperadas):
+        return False
+    for e in esperadas:
+        casou = next((i for i, (nome, args) in enumerate(obtidas) if nome == e["nome"] and all(
+            k in args and _normalizar(args[k]) == _normalizar(v) for k, v in e["argumentos"].items())), None)
+        if casou is None:
+            return False
+        obtidas.pop(casou)
+    return True
+
+
+def _chamar(modelo: str, system_prompt: str, tools: list, opcoes: dict, comando: str):
+    mensagens = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": delta.montar_prompt_ferramentas(comando, MEDIA_CONTEXTO)},
+    ]
+    inicio = time.perf_counter()
+    resp = ollama.chat(model=modelo, messages=mensagens, tools=tools, options=opcoes)
+    return resp, time.perf_counter() - inicio
+
+
+def avaliar(config: dict, corpus: list, repeticoes: int = REPETICOES) -> dict:
+    """Acerto e latência (parede, prefill, decode) de uma configuração no corpus."""
+    tools = config_slm.estilizar_ferramentas(delta.TOOLS, config["estilo_ferramentas"])
+    parede, prompt_tokens, certas, total = [], [], 0, 0
+    for _ in range(repeticoes):
+        for entrada in corpus:
+            resp, segundos = _chamar(config["modelo"], config["system_prompt"], tools,
+                                     config["opcoes"], entrada["texto"])
+            total += 1
+            certas += acertou(entrada["ferramentas"], resp["message"].get("tool_calls"))
+            desempenho = metricas_latencia.desempenho_ollama(resp, segundos)
+            parede.append(segundos * 1000)
+            if "prompt_tokens" in desempenho:
+                prompt_tokens.append(desempenho["prompt_tokens"])
+    parede.sort()
+    return {
+        "acerto": certas / total if total else 0.0,
+        "p50_ms": parede[len(parede) // 2],
+        "p95_ms": parede[min(len(parede) - 1, int(len(parede) * 0.95))],
+        "prompt_tokens": sum(prompt_tokens) / len(prompt_tokens) if prompt_tokens else None,
+    }
+
+
+def fronteira_pareto(resultados: list) -> list:
+    """Configurações que nenhuma outra supera em acerto e em p50 ao mesmo tempo."""
+    fronteira = []
+    for r in resultados:
+        dominada = any(
+            o["acerto"] >= r["acerto"] and o["p50_ms"] <= r["p50_ms"]
+            and (o["acerto"] > r["acerto"] or o["p50_ms"] < r["p50_ms"])
+            for o in resultados
+        )
+        if not dominada:
+            fronteira.append(r)
+    return sorted(fronteira, key=lambda r: r["p50_ms"])
+
+
+def escolher(fronteira: list, acerto_minimo: float = ACERTO_MINIMO) -> dict:
+    """A mais rápida da fronteira com acerto suficiente; senão, a de maior acerto."""
+    aceitas = [r for r in fronteira if r["acerto"] >= acerto_minimo]
+    if aceitas:
+        return min(aceitas, key=lambda r: r["p50_ms"])
+    return max(fronteira, key=lambda r: (r["acerto"], -r["p50_ms"]))
+
+
+def grade(modelos: list, num_ctx, num_predict, prompts: dict, estilos) -> list:
+    """
+    Configurações agrupadas por (modelo, num_ctx): trocar qualquer um dos dois
+    recarrega o modelo no Ollama, então cada grupo tem um aquecimento só.
+    """
+    configs = []
+    for (modelo, quantizacao), ctx in itertools.product(modelos, num_ctx):
+        for predict, (variante, texto), estilo in itertools.product(num_predict, prompts.items(), estilos):
+            opcoes = {"num_ctx": ctx}
+            if predict:
+                opcoes["num_predict"] = predict
+            configs.append({"modelo": modelo, "quantizacao": quantizacao, "opcoes": opcoes,
+                            "variante_prompt": variante, "system_prompt": texto,
+                            "estilo_ferramentas": estilo})
+    return configs
+
+
+def _rotulo(c: dict) -> str:
+    return (f"{c['modelo']:<28} ctx={c['opcoes']['num_ctx']:<5} "
+            f"predict={c['opcoes'].get('num_predict', '-')!s:<4} "
+            f"{c['variante_prompt']:<8} {c['estilo_ferramentas']:<8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Escolhe modelo, opcoes e prompt do SLM medindo acerto e latencia.")
+    parser.add_argument("--modelos", nargs="+", help="tags do Ollama (padrao: todos os instalados)")
+    parser.add_argument("--num-ctx", nargs="+", type=int, default=list(NUM_CTX))
+    parser.add_argument("--num-predict", nargs="+", type=int, default=list(NUM_PREDICT),
+                        help="0 = sem limite")
+    parser.add_argument("--prompts", nargs="+", help="variantes do SYSTEM_PROMPT (completo, regras, curto)")
+    parser.add_argument("--estilos", nargs="+", choices=config_slm.ESTILOS, default=list(config_slm.ESTILOS))
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--acerto-minimo", type=float, default=ACERTO_MINIMO)
+    parser.add_argument("--saida", default=config_slm.CAMINHO, help="arquivo de configuracao gravado")
+    parser.add_argument("--nao-salvar", action="store_true", help="so mostra o resultado")
+    args = parser.parse_args(argv)
+
+    instalados = modelos_instalados()
+    if args.modelos:
+        faltando = set(args.modelos) - {m for m, _ in instalados}
+        if faltando:
+            print(f"[ERRO] Modelos nao instalados: {', '.join(sorted(faltando))} (ollama pull ...)")
+            return 1
+        instalados = [(m, q) for m, q in instalados if m in args.modelos]
+    if not instalados:
+        print("[ERRO] Nenhum modelo instalado no Ollama")
+        return 1
+
+    prompts = variantes_prompt(delta.SYSTEM_PROMPT)
+    if args.prompts:
+        desconhecidas = set(args.prompts) - set(prompts)
+        if desconhecidas:
+            parser.error(f"variantes desconhecidas: {', '.join(sorted(desconhecidas))} (ha: {', '.join(prompts)})")
+        prompts = {k: v for k, v in prompts.items() if k in args.prompts}
+
+    corpus = carregar_corpus(args.corpus)
+    configs = grade(instalados, args.num_ctx, args.num_predict, prompts, args.estilos)
+    print(f"[INFO] {len(configs)} configuracoes x {len(corpus) * args.repeticoes} frases "
+          f"= {len(configs) * len(corpus) * args.repeticoes} chamadas ao Ollama")
+
+    resultados, grupo = [], None
+    for i, config in enumerate(configs, 1):
+        if (config["modelo"], config["opcoes"]["num_ctx"]) != grupo:
+            grupo = (config["modelo"], config["opcoes"]["num_ctx"])
+            # Aquecimento: a carga do modelo (e do contexto) não entra na medição
+            _chamar(config["modelo"], config["system_prompt"], delta.TOOLS, config["opcoes"], corpus[0]["texto"])
+        try:
+            r = {**config, **avaliar(config, corpus, args.repeticoes)}
+        except ollama.ResponseError as e:
+            print(f"[AVISO] {_rotulo(config)} falhou: {e}")
+            continue
+        resultados.append(r)
+        print(f"[{i:>3}/{len(configs)}] {_rotulo(r)} acerto {r['acerto'] * 100:5.1f}%  "
+              f"p50 {r['p50_ms']:7.0f} ms  p95 {r['p95_ms']:7.0f} ms")
+
+    if not resultados:
+        print("[ERRO] Nenhuma configuracao avaliada")
+        return 1
+
+    fronteira = fronteira_pareto(resultados)
+    print("\nFronteira de Pareto (acerto x p50):")
+    for r in fronteira:
+        print(f"  {_rotulo(r)} acerto {r['acerto'] * 100:5.1f}%  p50 {r['p50_ms']:7.0f} ms")
+
+    escolhida = escolher(fronteira, args.acerto_minimo)
+    if escolhida["acerto"] < args.acerto_minimo:
+        print(f"[AVISO] Nenhuma configuracao atingiu {args.acerto_minimo * 100:.0f}% de acerto; "
+              f"usando a de maior acerto")
+    print(f"\nEscolhida: {_rotulo(escolhida)}")
+
+    if args.nao_salvar:
+        return 0
+    config_slm.salvar({
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "maquina": os.uname().nodename,
+        "modelo": escolhida["modelo"],
+        "quantizacao": escolhida["quantizacao"],
+        "opcoes": escolhida["opcoes"],
+        "variante_prompt": escolhida["variante_prompt"],
+        "system_prompt": escolhida["system_prompt"],
+        "estilo_ferramentas": escolhida["estilo_ferramentas"],
+        "acerto": escolhida["acerto"],
+        "p50_ms": escolhida["p50_ms"],
+        "p95_ms": escolhida["p95_ms"],
+    }, args.saida)
+    print(f"[INFO] Configuracao gravada em {args.saida} (carregada pelo delta.py na proxima inicializacao)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""
+Camada de abstração do hardware (sensores e LED).
+
+O backend é escolhido pela variável de ambiente DELTA_BACKEND:
+  rpi       Raspberry Pi real: board/adafruit/gpiozero, importados só aqui
+  simulado  valores sintéticos, com latência e falhas configuráveis
+  replay    reproduz as leituras gravadas em delta/logs/ (log_sensores)
+
+Com simulado/replay o DELTA roda (e pode ser medido) em qualquer Linux,
+sem I2C nem GPIO.
+
+    DELTA_BACKEND=simulado DELTA_SIM_FALHAS=0.3 python3 delta.py
+    DELTA_BACKEND=replay DELTA_REPLAY_DIR=/caminho/logs DELTA_REPLAY_VELOCIDADE=60 python3 delta.py
+"""
+
+import os
+import math
+import time
+import random
+import bisect
+
+BACKEND = os.environ.get("DELTA_BACKEND", "rpi")
+
+# --- rpi ---
+PRESSAO_NIVEL_MAR = 1013.25
+
+# --- simulado ---
+# Latência de cada leitura (s) e probabilidade de falha; DELTA_SIM_LATENCIA escala
+# todas as latências e DELTA_SIM_FALHAS, se definida, vale para todos os sensores
+LATENCIA_SIMULADA = {"AHT20": 0.08, "BMP280": 0.01, "DHT22": 0.25}
+FALHA_SIMULADA = {"AHT20": 0.0, "BMP280": 0.0, "DHT22": 0.2}
+ESCALA_LATENCIA = float(os.environ.get("DELTA_SIM_LATENCIA", "1.0"))
+if os.environ.get("DELTA_SIM_FALHAS"):
+    FALHA_SIMULADA = dict.fromkeys(FALHA_SIMULADA, float(os.environ["DELTA_SIM_FALHAS"]))
+
+# --- replay ---
+HORAS_REPLAY = float(os.environ.get("DELTA_REPLAY_HORAS", "24"))          # Últimas N h do log reproduzidas
+VELOCIDADE_REPLAY = float(os.environ.get("DELTA_REPLAY_VELOCIDADE", "1"))  # 60 = 1 h do log por minuto
+DIRETORIO_REPLAY = os.environ.get("DELTA_REPLAY_DIR")  # Ex: logs copiados da Pi; padrão delta/logs/
+
+
+class BackendRPi:
+    """Sensores e LED reais da Raspberry Pi."""
+
+    nome = "rpi"
+
+    def sensores(self) -> dict:
+        """{nome: função de leitura} dos sensores que inicializaram."""
+        try:
+            import board
+            import adafruit_dht
+            import adafruit_ahtx0
+            import adafruit_bmp280
+        except ImportError as e:
+            print(f"[AVISO] Bibliotecas dos sensores indisponiveis ({e}); use DELTA_BACKEND=simulado")
+            return {}
+
+        leitores = {}
+        i2c = board.I2C()
+
+        # 1. AHT20
+        try:
+            aht = adafruit_ahtx0.AHTx0(i2c)
+            leitores['AHT20'] = lambda: {'temp': aht.temperature, 'umid': aht.relative_humidity}
+        except Exception as e:
+            print(f"[AVISO] AHT20 off: {e}")
+
+        # 2. BMP280 (Tentativa Automatica)
+        bmp = None
+        try:
+            # Tenta sem endereco forçado (padrao 0x77)
+            bmp = adafruit_bmp280.Adafruit_BMP280_I2C(i2c)
+        except ValueError:
+            # Se falhar, tenta o endereco alternativo (0x76)
+            try:
+                bmp = adafruit_bmp280.Adafruit_BMP280_I2C(i2c, address=0x76)
+            except Exception as e:
+                print(f"[AVISO] BMP280 off (0x76 falhou): {e}")
+        except Exception as e:
+            print(f"[AVISO] BMP280 off: {e}")
+        if bmp is not None:
+            bmp.sea_level_pressure = PRESSAO_NIVEL_MAR
+            leitores['BMP280'] = lambda: {
+                'temp': bmp.temperature,
+                'pressao': bmp.pressure,
+                'altitude': bmp.altitude
+            }
+
+        # 3. DHT22
+        try:
+            dht = adafruit_dht.DHT22(board.D4, use_pulseio=False)
+
+            def ler_dht():
+                t = dht.temperature
+                u = dht.humidity
+                return {'temp': t, 'umid': u} if t is not None else None
+
+            leitores['DHT22'] = ler_dht
+        except Exception as e:
+            print(f"[AVISO] DHT22 off: {e}")
+
+        return leitores
+
+    def led(self):
+        from gpiozero import RGBLED
+        return RGBLED(red=13, green=19, blue=26, active_high=False)
+
+
+class LEDSimulado:
+    """Mesma interface usada do gpiozero.RGBLED (color/off), sem GPIO."""
+
+    def __init__(self):
+        self.color = (0.0, 0.0, 0.0)
+
+    def off(self):
+        self.color = (0.0, 0.0, 0.0)
+
+
+class BackendSimulado:
+    """Sala sintética: temperatura/umidade oscilando devagar, com ruído, latência e falhas."""
+
+    nome = "simulado"
+
+    def __init__(self, semente: int | None = None):
+        self._rng = random.Random(semente)
+        self._inicio = time.monotonic()
+
+    def _ambiente(self) -> tuple:
+        # Um ciclo a cada 20 min, para a tendência ter o que mostrar
+        fase = 2 * math.pi * (time.monotonic() - self._inicio) / 1200.0
+        return 25.0 + 1.5 * math.sin(fase), 55.0 - 5.0 * math.sin(fase)
+
+    def _ler(self, nome: str):
+        time.sleep(LATENCIA_SIMULADA.get(nome, 0.0) * ESCALA_LATENCIA)
+        if self._rng.random() < FALHA_SIMULADA.get(nome, 0.0):
+            raise RuntimeError(f"{nome}: falha simulada")
+        temp, umid = self._ambiente()
+        ruido = self._rng.gauss
+        if nome == "BMP280":
+            pressao = 1008.0 + ruido(0, 0.1)
+            altitude = 44330.0 * (1.0 - (pressao / PRESSAO_NIVEL_MAR) ** 0.1903)
+            return {'temp': temp + 0.5 + ruido(0, 0.1), 'pressao': pressao, 'altitude': altitude}
+        return {'temp': temp + ruido(0, 0.2), 'umid': umid + ruido(0, 1.0)}
+
+    def sensores(self) -> dict:
+        return {nome: (lambda n=nome: self._ler(n)) for nome in LATENCIA_SIMULADA}
+
+    def led(self):
+        return LEDSimulado()
+
+
+class BackendReplay:
+    """Reproduz as leituras do log em disco, em loop, na velocidade configurada."""
+
+    nome = "replay"
+
+    def __init__(self, horas: float = HORAS_REPLAY, velocidade: float = VELOCIDADE_REPLAY,
+                 diretorio: str | None = DIRETORIO_REPLAY):
+        import log_sensores
+
+        diretorio = diretorio or log_sensores.DIRETORIO_LOG
+        # Termina na última gravação do log (que pode ter sido copiado de outra máquina)
+        existentes = log_sensores.arquivos(diretorio)
+        agora = os.path.getmtime(existentes[-1]) if existentes else time.time()
+        linhas = log_sensores.ler(agora - horas * 3600, agora, diretorio=diretorio)
+        # {sensor: ([t, ...], [{campo: valor}, ...])}, agrupando as grandezas de cada leitura
+        self._series = {}
+        for t, serie, valor in linhas:
+            sensor, campo = serie.split(".", 1)
+            tempos, valores = self._series.setdefault(sensor, ([], []))
+            if not tempos or tempos[-1] != t:
+                tempos.append(t)
+                valores.append({})
+            valores[-1][campo] = valor
+        self._t0 = linhas[0][0] if linhas else agora
+        self._duracao = max(1.0, (linhas[-1][0] - self._t0) if linhas else 1.0)
+        self._velocidade = velocidade
+        self._inicio = time.monotonic()
+        if not linhas:
+            print(f"[AVISO] Replay: nenhuma leitura em {diretorio}")
+
+    def _ler(self, nome: str):
+        tempos, valores = self._series[nome]
+        decorrido = ((time.monotonic() - self._inicio) * self._velocidade) % self._duracao
+        i = bisect.bisect_right(tempos, self._t0 + decorrido) - 1
+        return dict(valores[max(i, 0)])
+
+    def sensores(self) -> dict:
+        return {nome: (lambda n=nome: self._ler(n)) for nome in self._series}
+
+    def led(self):
+        return LEDSimulado()
+
+
+BACKENDS = {"rpi": BackendRPi, "simulado": BackendSimulado, "replay": BackendReplay}
+_atual = None
+
+
+def atual():
+    """Instância do backend selecionado por DELTA_BACKEND (criada na primeira chamada)."""
+    global _atual
+    if _atual is None:
+        if BACKEND not in BACKENDS:
+            raise ValueError(f"DELTA_BACKEND invalido: '{BACKEND}' (use {', '.join(BACKENDS)})")
+        _atual = BACKENDS[BACKEND]()
+    return _atual
@@ -0,0 +1,13 @@
+"""
+Benchmark reprodutível do pipeline do DELTA.
+
+Roda um corpus de frases (texto ou WAV) pelo roteamento, montagem de prompt
+e despacho de ferramentas do delta.py, contra um Ollama falso local (respostas
+roteirizadas, ritmo de tokens configurável) e dispositivos Tuya simulados.
+Relata percentis por rota/etapa, vazão e alocações, e compara com uma linha
+de base para acusar regressões.
+
+    cd delta
+    python3 -m benchmark                       # mede e compara com benchmark/baseline.json
+    python3 -m benchmark --salvar-baseline     # grava a linha de base desta máquina
+"""
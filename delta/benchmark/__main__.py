@@ -0,0 +1,5 @@
+import sys
+
+from benchmark.executor import main
+
+sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Dispositivos Tuya simulados para o benchmark.
+
+Mesma interface usada do tinytuya.OutletDevice (set_value,
+set_multiple_values, status, modo persistente com _receive/_process_message
+e seqno nos acks), com o RTT de
+cada dispositivo e uma taxa de falhas configuráveis. `instalar()` troca o
+conectar_dispositivo dos módulos que falam com a rede.
+"""
+
+import time
+import queue
+import random
+import select
+import socket
+import threading
+
+# RTT típico de uma escrita na rede local (ms) e desvio
+RTT_MS = {"ar": 120.0, "interruptor": 60.0, "lampada": 80.0}
+JITTER_MS = 10.0
+# Preparar a conexão (resolver o IP, abrir o socket, negociar a chave de sessão
+# nas versões 3.4/3.5) custa alguns RTTs antes da primeira escrita
+CONEXAO_MS = 150.0
+TAXA_FALHAS = 0.0
+
+
+class MensagemSimulada:
+    """Como o TuyaMessage do tinytuya (seqno, cmd, retcode), já com a resposta decodificada."""
+
+    __slots__ = ("seqno", "cmd", "retcode", "resposta")
+
+    def __init__(self, seqno: int, cmd: int, retcode: int, resposta: dict):
+        self.seqno = seqno
+        self.cmd = cmd
+        self.retcode = retcode
+        self.resposta = resposta
+
+
+class DispositivoSimulado:
+    def __init__(self, nome: str, rtt_ms: float, taxa_falhas: float, rng: random.Random):
+        self.nome = nome
+        self.rtt_ms = rtt_ms
+        self.taxa_falhas = taxa_falhas
+        self.dps = {}
+        self.seqno = 1
+        self.escritas = 0
+        self._rng = rng
+        self._pushes = queue.Queue()
+        # Par de sockets só para o select() da thread leitora ver "dados chegando"
+        self.socket, self._aviso = socket.socketpair()
+        self._sinal = self.socket
+        self.socketRetryLimit = 5
+        self.version = 3.3
+
+    # --- configuração (ignorada) ---
+    def set_version(self, versao):
+        self.version = versao
+
+    def set_socketPersistent(self, persistente):
+        pass
+
+    def set_socketTimeout(self, timeout):
+        self._timeout = timeout
+
+    def close(self):
+        pass
+
+    # --- protocolo ---
+    def _rtt(self):
+        time.sleep(max(0.0, self._rng.gauss(self.rtt_ms, JITTER_MS)) / 1000)
+
+    def _escrever(self, frame: dict, nowait: bool):
+        self.seqno += 1
+        self.escritas += 1
+        if self._rng.random() < self.taxa_falhas:
+            resposta = {"Err": "905", "Error": "Network Error: Device Unreachable"}
+        else:
+            self.dps.update({str(k): v for k, v in frame.items()})
+            resposta = {"dps": {str(k): v for k, v in frame.items()}}
+        if nowait:
+            # A confirmação (ack com o seqno do frame) chega depois, pela conexão persistente
+            ack = MensagemSimulada(self.seqno - 1, 7, 1 if "Err" in resposta else 0, resposta)
+            threading.Timer(self.rtt_ms / 1000, self._push, (ack,)).start()
+            return None
+        self._rtt()
+        return resposta
+
+    def set_value(self, dps, valor, nowait: bool = False):
+        return self._escrever({dps: valor}, nowait)
+
+    def set_multiple_values(self, frame: dict, nowait: bool = False):
+        return self._escrever(frame, nowait)
+
+    def status(self):
+        self._rtt()
+        return {"dps": dict(self.dps)}
+
+    # --- leitura da conexão persistente (o que escrita_pipeline usa do tinytuya) ---
+    def _receive(self):
+        self._sinal.recv(1)
+        return self._pushes.get_nowait()
+
+    def _process_message(self, msg):
+        return msg.resposta
+
+    def receive(self):
+        if not select.select([self.socket], [], [], getattr(self, "_timeout", 1.0))[0]:
+            return None
+        return self._process_message(self._receive())
+
+    def _push(self, msg):
+        self._pushes.put(msg)
+        self._aviso.send(b"\0")
+
+
+_dispositivos = {}
+
+
+def instalar(rtt_ms: dict | None = None, taxa_falhas: float = TAXA_FALHAS, semente: int | None = 0,
+             conexao_ms: float = CONEXAO_MS) -> dict:
+    """Passa a usar dispositivos simulados em controle_tuya, fila_comandos e escrita_pipeline."""
+    import controle_tuya
+    import escrita_pipeline
+    import fila_comandos
+
+    rtt_ms = {**RTT_MS, **(rtt_ms or {})}
+    rng = random.Random(semente)
+    _dispositivos.clear()
+    for nome in controle_tuya.DEVICES:
+        _dispositivos[nome] = DispositivoSimulado(nome, rtt_ms.get(nome, 80.0), taxa_falhas, rng)
+
+    def conectar(nome):
+        time.sleep(conexao_ms / 1000)
+        return _dispositivos[nome]
+
+    controle_tuya.conectar_dispositivo = conectar
+    fila_comandos.conectar_dispositivo = conectar
+    escrita_pipeline.conectar_dispositivo = conectar
+    return _dispositivos
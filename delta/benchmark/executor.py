@@ -0,0 +1,394 @@
+"""
+Executor do benchmark: ambiente simulado, medição, relatório e linha de base.
+"""
+
+import io
+import os
+import json
+import math
+import time
+import asyncio
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import contextlib
+
+from benchmark import dispositivos
+from benchmark.ollama_falso import OllamaFalso, Tempos
+
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+CORPUS = os.path.join(DIRETORIO, "corpus.json")
+BASELINE = os.path.join(DIRETORIO, "baseline.json")
+
+REPETICOES = 5
+AQUECIMENTO = 1             # Passadas descartadas (conexões, caches, imports tardios)
+LIMIAR_REGRESSAO = 0.20     # p50/p95 acima de baseline x (1 + limiar) é regressão
+PISO_MS = 5.0               # ... desde que a diferença passe disso (ruído de escalonamento)
+PERCENTIS = (50, 95, 99)
+ESPERA_SENSORES = 5.0       # Tempo máximo esperando a primeira fusão dos sensores (s)
+
+
+def percentil(valores: list, p: float) -> float:
+    """Percentil por rank mais próximo (valores já ordenados)."""
+    return valores[max(0, math.ceil(len(valores) * p / 100) - 1)]
+
+
+def carregar_corpus(caminho: str = CORPUS) -> list:
+    with open(caminho, encoding="utf-8") as f:
+        corpus = json.load(f)
+    base = os.path.dirname(os.path.abspath(caminho))
+    for entrada in corpus:
+        if "wav" in entrada:
+            entrada["wav"] = os.path.join(base, entrada["wav"])
+    return corpus
+
+
+def resposta_slm(entrada: dict) -> dict:
+    """Resposta roteirizada do Ollama falso para uma entrada do corpus."""
+    if "ferramentas" in entrada:
+        return {"tool_calls": [{"function": {"name": f["nome"], "arguments": f["argumentos"]}}
+                               for f in entrada["ferramentas"]]}
+    return {"texto": entrada.get("resposta", "Certo.")}
+
+
+class Ambiente:
+    """
+    Ollama falso + backend de sensores simulado + dispositivos simulados, com o
+    delta.py importado por cima. O import acontece aqui porque OLLAMA_HOST e
+    DELTA_BACKEND precisam estar definidos antes.
+    """
+
+    def __init__(self, corpus: list, tempos: Tempos, rtt_ms: dict | None = None, taxa_falhas: float = 0.0):
+        self.corpus = corpus
+        self.falso = OllamaFalso({e["texto"]: resposta_slm(e) for e in corpus}, tempos)
+        self.rtt_ms = rtt_ms
+        self.taxa_falhas = taxa_falhas
+        self.delta = None
+
+    def __enter__(self):
+        self.falso.iniciar()
+        os.environ["OLLAMA_HOST"] = self.falso.url
+        os.environ.setdefault("DELTA_BACKEND", "simulado")
+
+        import delta
+        import metricas_latencia
+
+        # Métricas do benchmark não vão para o log de produção
+        metricas_latencia.AGREGADOR = metricas_latencia.Agregador(tempfile.mkdtemp(prefix="delta-bench-"))
+        dispositivos.instalar(self.rtt_ms, self.taxa_falhas)
+        delta.sensores.iniciar_amostragem()
+        limite = time.monotonic() + ESPERA_SENSORES
+        while delta.sensores.fusao.resultado()["temp"] is None and time.monotonic() < limite:
+            time.sleep(0.05)
+        self.delta = delta
+        return self
+
+    def __exit__(self, *exc):
+        self.delta.fila_comandos.fechar()
+        self.delta.sensores.parar_amostragem()
+        if self.delta.led:
+            self.delta.led.parar()
+        self.falso.parar()
+        return False
+
+    def executar(self, entrada: dict, texto: str | None = None, inicio_ns: int | None = None):
+        """Um comando pelo pipeline do delta.py; retorna o Requisicao preenchido."""
+        import metricas_latencia
+
+        self.falso.resposta_padrao = resposta_slm(entrada)
+        req = metricas_latencia.Requisicao()
+        req.marcar_keyword()
+        if inicio_ns is not None:
+            req.marcas["keyword"] = inicio_ns
+        self.delta.metricas = req
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.delta.processar_comando_voz(texto or entrada["texto"])
+        return req
+
+
+class ExecutorAsync:
+    """
+    O mesmo comando pelo núcleo assíncrono (pipeline_async, sem captura/ASR):
+    um event loop numa thread, frases entregues com submeter(). Chamável como
+    Ambiente.executar, para medir() e medir_alocacoes().
+    """
+
+    def __init__(self, ambiente: Ambiente):
+        import pipeline_async
+
+        self.ambiente = ambiente
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name="benchmark-async", daemon=True)
+        self._thread.start()
+        self.pipeline = pipeline_async.PipelineAsync(ambiente.delta)
+        self._rodar(self.pipeline.iniciar(audio=False))
+
+    def _rodar(self, corrotina):
+        return asyncio.run_coroutine_threadsafe(corrotina, self.loop).result()
+
+    def __call__(self, entrada: dict, texto: str | None = None, inicio_ns: int | None = None):
+        import metricas_latencia
+
+        self.ambiente.falso.resposta_padrao = resposta_slm(entrada)
+        req = metricas_latencia.Requisicao()
+        req.marcar_keyword()
+        if inicio_ns is not None:
+            req.marcas["keyword"] = inicio_ns
+        with contextlib.redirect_stdout(io.StringIO()):
+            self._rodar(self.pipeline.submeter(texto or entrada["texto"], req))
+        return req
+
+    def fechar(self):
+        self._rodar(self.pipeline.parar())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+
+class Transcritor:
+    """Vosk sobre arquivos WAV (16 kHz mono), para entradas do corpus com "wav"."""
+
+    def __init__(self, modelo: str):
+        from vosk import Model, KaldiRecognizer
+
+        self._reconhecedor = lambda taxa: KaldiRecognizer(self._modelo, taxa)
+        self._modelo = Model(modelo)
+
+    def transcrever(self, caminho: str) -> str:
+        import wave
+
+        with wave.open(caminho, "rb") as wav:
+            rec = self._reconhecedor(wav.getframerate())
+            while True:
+                dados = wav.readframes(4000)
+                if not dados:
+                    break
+                rec.AcceptWaveform(dados)
+        return json.loads(rec.FinalResult()).get("text", "")
+
+
+def _texto(entrada: dict, transcritor: Transcritor | None):
+    """(texto, início da captura em ns ou None): com WAV a transcrição conta como captura."""
+    if transcritor is not None and "wav" in entrada:
+        inicio = time.perf_counter_ns()
+        return transcritor.transcrever(entrada["wav"]), inicio
+    return entrada["texto"], None
+
+
+def medir(ambiente: Ambiente, repeticoes: int = REPETICOES, aquecimento: int = AQUECIMENTO,
+          transcritor: Transcritor | None = None, executar=None) -> dict:
+    """
+    Roda o corpus `aquecimento + repeticoes` vezes. `executar(entrada, texto,
+    inicio_ns)` troca o pipeline medido (padrão: Ambiente.executar).
+    """
+    executar = executar or ambiente.executar
+    amostras, erros_rota, n = {}, [], 0
+    for _ in range(aquecimento):
+        for entrada in ambiente.corpus:
+            executar(entrada, *_texto(entrada, transcritor))
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for entrada in ambiente.corpus:
+            texto, inicio_ns = _texto(entrada, transcritor)
+            req = executar(entrada, texto, inicio_ns)
+            n += 1
+            if req.rota != entrada["rota"]:
+                erros_rota.append((entrada["texto"], entrada["rota"], req.rota))
+            etapas = req.etapas()
+            if inicio_ns is None:
+                etapas.pop("captura", None)  # Sem áudio não há captura para medir
+            for etapa, ms in etapas.items():
+                amostras.setdefault(f"{req.rota}/{etapa}", []).append(ms)
+    duracao = time.perf_counter() - inicio
+    return {"amostras": amostras, "comandos": n, "duracao_s": duracao, "erros_rota": erros_rota}
+
+
+def medir_alocacoes(ambiente: Ambiente, executar=None) -> dict:
+    """
+    Uma passada com tracemalloc (separada da medição de tempo, que ele
+    distorceria): pico e memória retida por comando, agrupados por rota.
+    """
+    executar = executar or ambiente.executar
+    por_rota = {}
+    tracemalloc.start()
+    try:
+        for entrada in ambiente.corpus:
+            antes = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            executar(entrada, entrada["texto"], None)
+            atual, pico = tracemalloc.get_traced_memory()
+            d = por_rota.setdefault(entrada["rota"], {"pico": [], "retido": []})
+            d["pico"].append(pico - antes)
+            d["retido"].append(atual - antes)
+    finally:
+        tracemalloc.stop()
+    return {
+        rota: {"pico_kib_p50": percentil(sorted(d["pico"]), 50) / 1024,
+               "pico_kib_max": max(d["pico"]) / 1024,
+               "retido_kib_p50": percentil(sorted(d["retido"]), 50) / 1024}
+        for rota, d in por_rota.items()
+    }
+
+
+def resumir(medicao: dict, alocacoes: dict | None = None) -> dict:
+    """Resumo serializável (é também o formato da linha de base)."""
+    etapas = {}
+    for chave, valores in sorted(medicao["amostras"].items()):
+        valores = sorted(valores)
+        etapas[chave] = {"n": len(valores), **{f"p{q}": percentil(valores, q) for q in PERCENTIS},
+                         "max": valores[-1]}
+    return {
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "maquina": os.uname().nodename,
+        "comandos": medicao["comandos"],
+        "vazao_cmd_s": medicao["comandos"] / medicao["duracao_s"] if medicao["duracao_s"] else None,
+        "etapas": etapas,
+        "alocacoes": alocacoes or {},
+        "erros_rota": medicao["erros_rota"],
+    }
+
+
+def comparar(resumo: dict, baseline: dict, limiar: float = LIMIAR_REGRESSAO, piso_ms: float = PISO_MS) -> list:
+    """Regressões de p50/p95 contra a linha de base, como linhas de texto."""
+    regressoes = []
+    for chave, base in baseline.get("etapas", {}).items():
+        atual = resumo["etapas"].get(chave)
+        if atual is None:
+            continue
+        for p in ("p50", "p95"):
+            if atual[p] > base[p] * (1 + limiar) and atual[p] - base[p] > piso_ms:
+                regressoes.append(f"{chave} {p}: {base[p]:.1f} -> {atual[p]:.1f} ms "
+                                  f"(+{(atual[p] / base[p] - 1) * 100:.0f}%)")
+    return regressoes
+
+
+def imprimir(resumo: dict, baseline: dict | None = None):
+    cabecalho = (f"{'rota/etapa':<28} {'n':>5} " + " ".join(f"{f'p{q}':>9}" for q in PERCENTIS)
+                 + f" {'max':>9}" + (f" {'base p95':>9}" if baseline else ""))
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    rota_anterior = None
+    for chave, e in resumo["etapas"].items():
+        rota = chave.split("/")[0]
+        if rota_anterior is not None and rota != rota_anterior:
+            print()
+        rota_anterior = rota
+        linha = f"{chave:<28} {e['n']:>5} " + " ".join(f"{e[f'p{q}']:>9.1f}" for q in PERCENTIS) + f" {e['max']:>9.1f}"
+        if baseline:
+            base = baseline.get("etapas", {}).get(chave)
+            linha += f" {base['p95']:>9.1f}" if base else f" {'-':>9}"
+        print(linha)
+    print("-" * len(cabecalho))
+    print(f"Vazao: {resumo['vazao_cmd_s']:.2f} comandos/s ({resumo['comandos']} comandos)")
+
+    if resumo["alocacoes"]:
+        print(f"\n{'rota':<17} {'pico p50 KiB':>13} {'pico max KiB':>13} {'retido p50 KiB':>15}")
+        for rota, a in sorted(resumo["alocacoes"].items()):
+            print(f"{rota:<17} {a['pico_kib_p50']:>13.1f} {a['pico_kib_max']:>13.1f} {a['retido_kib_p50']:>15.1f}")
+
+    for texto, esperada, obtida in resumo["erros_rota"]:
+        print(f"[AVISO] Roteamento: '{texto}' foi para {obtida} (esperado {esperada})")
+
+
+def imprimir_comparacao(sequencial: dict, assincrono: dict):
+    """Total por rota (keyword -> resposta), núcleo sequencial x assíncrono."""
+    cabecalho = (f"{'rota':<17} {'seq p50':>9} {'async p50':>10} {'ganho':>7} "
+                 f"{'seq p95':>9} {'async p95':>10} {'ganho':>7}")
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    for chave, antes in sequencial["etapas"].items():
+        rota, _, etapa = chave.partition("/")
+        depois = assincrono["etapas"].get(chave)
+        if etapa != "total" or depois is None:
+            continue
+        linha = f"{rota:<17}"
+        for p in ("p50", "p95"):
+            # Abaixo do piso a diferença é ruído, e a porcentagem engana
+            ganho = f"{(1 - depois[p] / antes[p]) * 100:>6.0f}%" if antes[p] > PISO_MS else f"{'-':>7}"
+            linha += f" {antes[p]:>9.1f} {depois[p]:>10.1f} {ganho}"
+        print(linha)
+    print("-" * len(cabecalho))
+    print(f"Vazao: {sequencial['vazao_cmd_s']:.2f} -> {assincrono['vazao_cmd_s']:.2f} comandos/s")
+
+
+def _argumentos(argv):
+    parser = argparse.ArgumentParser(prog="python3 -m benchmark",
+                                     description="Benchmark do pipeline do DELTA (Ollama falso + dispositivos simulados).")
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--repeticoes", type=int, default=REPETICOES)
+    parser.add_argument("--carga-ms", type=float, default=None, help="load_duration simulado por chamada")
+    parser.add_argument("--prefill-ms", type=float, default=None, help="ms por token de prompt")
+    parser.add_argument("--decode-ms", type=float, default=None, help="ms por token gerado")
+    parser.add_argument("--escala-tempo", type=float, default=1.0, help="multiplica todos os tempos do Ollama falso")
+    parser.add_argument("--falhas-tuya", type=float, default=0.0, help="probabilidade de falha das escritas simuladas")
+    parser.add_argument("--wav", metavar="MODELO_VOSK", help="transcreve as entradas com 'wav' usando este modelo")
+    parser.add_argument("--sem-alocacoes", action="store_true", help="pula a passada com tracemalloc")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--salvar-baseline", action="store_true")
+    parser.add_argument("--limiar", type=float, default=LIMIAR_REGRESSAO, help="regressão relativa tolerada (0.2 = 20%%)")
+    parser.add_argument("--json", metavar="ARQUIVO", help="grava o resumo em JSON")
+    parser.add_argument("--async", dest="pipeline_async", action="store_true",
+                        help="mede o nucleo assincrono (pipeline_async) em vez do sequencial")
+    parser.add_argument("--comparar", action="store_true",
+                        help="mede os dois nucleos e mostra o total por rota antes/depois")
+    return parser.parse_args(argv)
+
+
+def _tempos(args) -> Tempos:
+    padrao = Tempos()
+    return Tempos(padrao.carga_ms if args.carga_ms is None else args.carga_ms,
+                  padrao.prefill_ms if args.prefill_ms is None else args.prefill_ms,
+                  padrao.decode_ms if args.decode_ms is None else args.decode_ms,
+                  args.escala_tempo)
+
+
+def main(argv=None) -> int:
+    args = _argumentos(argv)
+    corpus = carregar_corpus(args.corpus)
+    transcritor = Transcritor(args.wav) if args.wav else None
+
+    with Ambiente(corpus, _tempos(args), taxa_falhas=args.falhas_tuya) as ambiente:
+        print(f"[INFO] {len(corpus)} frases x {args.repeticoes} repeticoes, Ollama falso em {ambiente.falso.url}")
+        if args.comparar:
+            sequencial = resumir(medir(ambiente, args.repeticoes, transcritor=transcritor))
+        executar = ExecutorAsync(ambiente) if args.pipeline_async or args.comparar else None
+        try:
+            medicao = medir(ambiente, args.repeticoes, transcritor=transcritor, executar=executar)
+            alocacoes = None if args.sem_alocacoes else medir_alocacoes(ambiente, executar)
+        finally:
+            if executar is not None:
+                executar.fechar()
+    resumo = resumir(medicao, alocacoes)
+    resumo["nucleo"] = "assincrono" if executar is not None else "sequencial"
+
+    if args.comparar:
+        imprimir_comparacao(sequencial, resumo)
+        return 0
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.salvar_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    imprimir(resumo, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+    if args.salvar_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(resumo, f, indent=2, ensure_ascii=False)
+        print(f"[INFO] Linha de base gravada em {args.baseline}")
+        return 0
+    if baseline is None:
+        print("[INFO] Sem linha de base; grave uma com --salvar-baseline")
+        return 0
+
+    regressoes = comparar(resumo, baseline, args.limiar)
+    for r in regressoes:
+        print(f"[ERRO] Regressao: {r}")
+    if regressoes:
+        return 1
+    print(f"[INFO] Sem regressoes acima de {args.limiar * 100:.0f}% em relacao a {baseline.get('data', '?')}")
+    return 0
@@ -0,0 +1,192 @@
+"""
+Servidor HTTP local que imita a API do Ollama (/api/chat, /api/tags).
+
+As respostas vêm de um roteiro {trecho do comando: resposta}: a primeira
+chave contida na última mensagem do usuário escolhe a resposta (texto ou
+tool_calls). O tempo é simulado a partir do número de tokens:
+
+    carga + tokens_prompt x prefill + tokens_gerados x decode
+
+e os campos load_duration, prompt_eval_*, eval_* e total_duration são
+preenchidos como o Ollama faria. Com stream=True os tokens saem um por
+chunk (NDJSON), no ritmo do decode.
+"""
+
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CARGA_MS = 0.0                # load_duration de cada chamada
+PREFILL_MS_POR_TOKEN = 0.2
+DECODE_MS_POR_TOKEN = 8.0
+CARACTERES_POR_TOKEN = 4      # Estimativa de tokens a partir do texto
+RESPOSTA_PADRAO = {"texto": "Certo."}
+
+
+def contar_tokens(texto: str) -> int:
+    return max(1, len(texto) // CARACTERES_POR_TOKEN)
+
+
+class Tempos:
+    """Ritmo simulado do modelo (ms); `escala` multiplica tudo."""
+
+    def __init__(self, carga_ms: float = CARGA_MS, prefill_ms: float = PREFILL_MS_POR_TOKEN,
+                 decode_ms: float = DECODE_MS_POR_TOKEN, escala: float = 1.0):
+        self.carga_ms = carga_ms * escala
+        self.prefill_ms = prefill_ms * escala
+        self.decode_ms = decode_ms * escala
+
+
+def _texto_prompt(corpo: dict) -> str:
+    partes = [m.get("content", "") for m in corpo.get("messages", [])]
+    if corpo.get("tools"):
+        partes.append(json.dumps(corpo["tools"]))
+    return "\n".join(partes)
+
+
+def _ultima_do_usuario(corpo: dict) -> str:
+    for m in reversed(corpo.get("messages", [])):
+        if m.get("role") == "user":
+            return m.get("content", "").lower()
+    return ""
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, como o Ollama
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, dados: dict, status: int = 200):
+        corpo = json.dumps(dados).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _chunk(self, dados: dict):
+        linha = (json.dumps(dados) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(linha):X}\r\n".encode() + linha + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._json({"models": [{"name": m, "model": m} for m in self.server.modelos]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-falso"})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        tamanho = int(self.headers.get("Content-Length", 0))
+        corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        if self.path != "/api/chat":
+            self._json({"error": "not found"}, 404)
+            return
+        self.server.chamadas += 1
+        self.server.ultima_requisicao = corpo
+
+        resposta = self.server.responder(corpo)
+        tempos = self.server.tempos
+        texto = resposta.get("texto", "")
+        tool_calls = resposta.get("tool_calls")
+        n_prompt = contar_tokens(_texto_prompt(corpo))
+        n_gerados = contar_tokens(json.dumps(tool_calls) if tool_calls else texto)
+        limite = (corpo.get("options") or {}).get("num_predict")
+        if limite and not tool_calls:
+            n_gerados = min(n_gerados, int(limite))
+            texto = texto[:n_gerados * CARACTERES_POR_TOKEN]
+
+        inicio = time.perf_counter_ns()
+        carga, prefill = tempos.carga_ms / 1000, n_prompt * tempos.prefill_ms / 1000
+        time.sleep(carga + prefill)
+        base = {"model": corpo.get("model", ""), "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}
+
+        def final(mensagem: dict) -> dict:
+            return {**base, "message": mensagem, "done": True, "done_reason": "stop",
+                    "total_duration": time.perf_counter_ns() - inicio,
+                    "load_duration": int(carga * 1e9),
+                    "prompt_eval_count": n_prompt, "prompt_eval_duration": int(prefill * 1e9),
+                    "eval_count": n_gerados, "eval_duration": int(n_gerados * tempos.decode_ms * 1e6)}
+
+        if not corpo.get("stream", True) or tool_calls:
+            time.sleep(n_gerados * tempos.decode_ms / 1000)
+            mensagem = {"role": "assistant", "content": "" if tool_calls else texto}
+            if tool_calls:
+                mensagem["tool_calls"] = tool_calls
+            if corpo.get("stream", True):
+                self._iniciar_stream()
+                self._chunk(final(mensagem))
+                self._fim_stream()
+            else:
+                self._json(final(mensagem))
+            return
+
+        self._iniciar_stream()
+        pedacos = [texto[i:i + CARACTERES_POR_TOKEN] for i in range(0, len(texto), CARACTERES_POR_TOKEN)] or [""]
+        for pedaco in pedacos:
+            time.sleep(tempos.decode_ms / 1000)
+            self._chunk({**base, "message": {"role": "assistant", "content": pedaco}, "done": False})
+        self._chunk(final({"role": "assistant", "content": ""}))
+        self._fim_stream()
+
+    def _iniciar_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _fim_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class OllamaFalso:
+    """Sobe o servidor numa porta livre de localhost; `url` vai para OLLAMA_HOST."""
+
+    def __init__(self, roteiro: dict | None = None, tempos: Tempos | None = None,
+                 modelos: tuple = ("llama3.2:3b",)):
+        self.roteiro = {k.lower(): v for k, v in (roteiro or {}).items()}
+        self.resposta_padrao = RESPOSTA_PADRAO
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._servidor.daemon_threads = True
+        self._servidor.responder = self.responder
+        self._servidor.tempos = tempos or Tempos()
+        self._servidor.modelos = list(modelos)
+        self._servidor.chamadas = 0
+        self._servidor.ultima_requisicao = None
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    @property
+    def chamadas(self) -> int:
+        return self._servidor.chamadas
+
+    @property
+    def ultima_requisicao(self) -> dict | None:
+        return self._servidor.ultima_requisicao
+
+    def responder(self, corpo: dict) -> dict:
+        """Resposta roteirizada para o comando contido na última mensagem do usuário."""
+        conteudo = _ultima_do_usuario(corpo)
+        # Chaves mais longas primeiro: "desliga o ar" não pode casar com "liga o ar"
+        for trecho in sorted(self.roteiro, key=len, reverse=True):
+            if trecho in conteudo:
+                return self.roteiro[trecho]
+        # Prompts que não repetem o comando (ex: clima) usam a resposta definida por quem roda
+        return self.resposta_padrao
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, name="ollama-falso", daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
@@ -0,0 +1,220 @@
+"""
+Captura de áudio com saúde do pipeline microfone -> Vosk.
+
+O PyAudio roda em modo callback: a thread do PortAudio só enfileira os
+blocos numa fila limitada e o loop principal decodifica. Assim um Vosk
+atrasado (Pi carregado) aparece como fila crescendo, em vez de overflow
+silencioso no `stream.read(..., exception_on_overflow=False)`. Contadores:
+
+    overflows       blocos que o PortAudio marcou com paInputOverflow
+    descartados     blocos jogados fora com a fila cheia (os mais antigos)
+    frames          capturados x decodificados
+    RTF             tempo do AcceptWaveform / duração do áudio do bloco
+    fila            blocos esperando decodificação (atraso em segundos)
+
+Cada frase (da palavra-chave ao FinalResult) vira um span "asr" no
+rastreamento, com os segundos de áudio decodificados e o RTF da frase.
+
+A cada INTERVALO_VERIFICACAO as janelas são comparadas com os limites; um
+alerta sai no terminal (com CPU e temperatura do host, para ligar palavras
+de ativação perdidas a falta de CPU) e em delta_audio_alerta no /metrics.
+"""
+
+import json
+import time
+import queue
+
+import metricas_http
+import rastreamento
+import telemetria_host
+
+TAMANHO_FILA = 40               # Blocos (10 s com blocos de 0,25 s)
+INTERVALO_VERIFICACAO = 10.0    # Janela de avaliação dos alertas (s)
+INTERVALO_ALERTA = 60.0         # Mínimo entre avisos repetidos no terminal (s)
+
+# Limites de alerta (por janela)
+LIMITE_RTF = 0.8                # p95 do fator de tempo real do Vosk
+LIMITE_FILA = 0.5               # Fração da fila ocupada
+LIMITE_OVERFLOWS = 0            # Overflows tolerados
+LIMITE_DESCARTADOS = 0          # Blocos descartados tolerados
+
+ALERTAS = ("rtf", "fila", "overflow", "descarte")
+
+RTF = metricas_http.Histograma(
+    "delta_audio_fator_tempo_real", "Tempo do AcceptWaveform dividido pela duracao do bloco de audio",
+    (), metricas_http.BUCKETS_RTF)
+
+
+class CapturaAudio:
+    """Stream de entrada em modo callback com fila limitada e contadores de saúde."""
+
+    def __init__(self, audio, taxa: int, bloco: int, tamanho_fila: int = TAMANHO_FILA):
+        import pyaudio
+
+        self._pyaudio = pyaudio
+        self.taxa = taxa
+        self.bloco = bloco
+        self.fila = queue.Queue(maxsize=tamanho_fila)
+        self.frames_capturados = 0
+        self.frames_decodificados = 0
+        self.overflows = 0
+        self.descartados = 0
+        self.limpos = 0             # Descartados de propósito ao retomar (áudio velho)
+        self.alertas = dict.fromkeys(ALERTAS, False)
+        self._janela = self._nova_janela()
+        self._ultimo_aviso = -float("inf")
+        self._frase = None          # [início (perf_counter_ns), frames, segundos decodificando]
+        self.stream = audio.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=taxa,
+            input=True,
+            frames_per_buffer=bloco,
+            stream_callback=self._callback,
+            start=False,
+        )
+
+    def _nova_janela(self) -> dict:
+        return {"inicio": time.monotonic(), "rtf": [], "fila_max": 0,
+                "overflows": self.overflows, "descartados": self.descartados}
+
+    # --- thread do PortAudio: só enfileira ---
+    def _callback(self, dados, frames, info_tempo, status):
+        self.frames_capturados += frames
+        if status & self._pyaudio.paInputOverflow:
+            self.overflows += 1
+        try:
+            self.fila.put_nowait(dados)
+        except queue.Full:
+            # Mantém o áudio mais recente: a palavra-chave está no fim, não no começo
+            try:
+                self.fila.get_nowait()
+                self.descartados += 1
+            except queue.Empty:
+                pass
+            self.fila.put_nowait(dados)
+        return None, self._pyaudio.paContinue
+
+    # --- loop principal ---
+    def ler(self, timeout: float | None = None) -> bytes | None:
+        """Próximo bloco (bloqueia até chegar; com `timeout`, None se nada chegou)."""
+        try:
+            dados = self.fila.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        profundidade = self.fila.qsize() + 1
+        if profundidade > self._janela["fila_max"]:
+            self._janela["fila_max"] = profundidade
+        return dados
+
+    def decodificar(self, reconhecedor, dados: bytes) -> bool:
+        """AcceptWaveform medido: frames decodificados e fator de tempo real."""
+        inicio = time.perf_counter()
+        resultado = reconhecedor.AcceptWaveform(dados)
+        frames = len(dados) // 2
+        self.frames_decodificados += frames
+        if frames:
+            gasto = time.perf_counter() - inicio
+            rtf = gasto / (frames / self.taxa)
+            RTF.observar(rtf)
+            self._janela["rtf"].append(rtf)
+            if self._frase is not None:
+                self._frase[1] += frames
+                self._frase[2] += gasto
+        return resultado
+
+    def iniciar_frase(self):
+        """Começa a contar o áudio de um comando (logo após a palavra-chave)."""
+        self._frase = [time.perf_counter_ns(), 0, 0.0]
+
+    def concluir_frase(self, reconhecedor) -> str:
+        """FinalResult do comando; grava o span "asr" da frase e devolve o texto."""
+        inicio = time.perf_counter()
+        texto = json.loads(reconhecedor.FinalResult()).get("text", "").strip()
+        frase, self._frase = self._frase, None
+        if frase is not None:
+            audio_s = frase[1] / self.taxa
+            gasto = frase[2] + time.perf_counter() - inicio
+            rastreamento.intervalo("asr", frase[0], audio_s=round(audio_s, 3),
+                                   decodificacao_s=round(gasto, 3),
+                                   rtf=round(gasto / audio_s, 4) if audio_s else None,
+                                   caracteres=len(texto))
+        return texto
+
+    def iniciar(self):
+        self.stream.start_stream()
+
+    def pausar(self):
+        """Para a captura enquanto um comando é processado."""
+        self.stream.stop_stream()
+
+    def retomar(self):
+        """Descarta o que sobrou na fila (fim do comando já transcrito) e volta a capturar."""
+        while True:
+            try:
+                self.fila.get_nowait()
+                self.limpos += 1
+            except queue.Empty:
+                break
+        self._janela = self._nova_janela()
+        self.stream.start_stream()
+
+    def fechar(self):
+        self.stream.stop_stream()
+        self.stream.close()
+
+    def atraso_s(self) -> float:
+        """Áudio capturado ainda não decodificado."""
+        return self.fila.qsize() * self.bloco / self.taxa
+
+    def verificar(self) -> list:
+        """Fecha a janela se já passou INTERVALO_VERIFICACAO; retorna os alertas ativos."""
+        janela = self._janela
+        if time.monotonic() - janela["inicio"] < INTERVALO_VERIFICACAO:
+            return [nome for nome, ativo in self.alertas.items() if ativo]
+        self._janela = self._nova_janela()
+
+        rtf = sorted(janela["rtf"])
+        rtf_p95 = rtf[min(len(rtf) - 1, int(len(rtf) * 0.95))] if rtf else 0.0
+        overflows = self.overflows - janela["overflows"]
+        descartados = self.descartados - janela["descartados"]
+        capacidade = self.fila.maxsize
+        self.alertas = {
+            "rtf": rtf_p95 > LIMITE_RTF,
+            "fila": janela["fila_max"] > LIMITE_FILA * capacidade,
+            "overflow": overflows > LIMITE_OVERFLOWS,
+            "descarte": descartados > LIMITE_DESCARTADOS,
+        }
+        ativos = [nome for nome, ativo in self.alertas.items() if ativo]
+        agora = time.monotonic()
+        if ativos and agora - self._ultimo_aviso >= INTERVALO_ALERTA:
+            self._ultimo_aviso = agora
+            host = telemetria_host.AMOSTRADOR.ultima() or {}
+            contexto = ", ".join(p for p in (
+                f"CPU {host['cpu_pct']:.0f}%" if "cpu_pct" in host else "",
+                f"{host['temp_c']:.1f} C" if "temp_c" in host else "",
+                f"{host['cpu_mhz']:.0f} MHz" if "cpu_mhz" in host else "",
+            ) if p)
+            print(f"[AVISO] Audio atrasado ({', '.join(ativos)}): RTF p95 {rtf_p95:.2f} (limite {LIMITE_RTF}), "
+                  f"fila max {janela['fila_max']}/{capacidade}, {overflows} overflows, {descartados} descartados"
+                  + (f"; host: {contexto}" if contexto else ""))
+        return ativos
+
+    def familias_metricas(self) -> list:
+        """Coletor do endpoint de metricas (metricas_http)."""
+        return [
+            ("delta_audio_frames_capturados_total", "counter", "Frames entregues pelo PortAudio",
+             [({}, self.frames_capturados)]),
+            ("delta_audio_frames_decodificados_total", "counter", "Frames passados ao Vosk",
+             [({}, self.frames_decodificados)]),
+            ("delta_audio_overflows_total", "counter", "Blocos com overflow de entrada no PortAudio",
+             [({}, self.overflows)]),
+            ("delta_audio_blocos_descartados_total", "counter", "Blocos descartados com a fila cheia",
+             [({}, self.descartados)]),
+            ("delta_audio_fila_blocos", "gauge", "Blocos esperando decodificacao",
+             [({}, self.fila.qsize())]),
+            ("delta_audio_atraso_segundos", "gauge", "Audio capturado ainda nao decodificado",
+             [({}, self.atraso_s())]),
+            ("delta_audio_alerta", "gauge", "Alerta de saude do audio ativo na ultima janela (1/0)",
+             [({"tipo": nome}, int(ativo)) for nome, ativo in self.alertas.items()]),
+        ]
@@ -0,0 +1,154 @@
+"""
+Cenas multi-dispositivo.
+
+As cenas de `cenas.json` são compiladas uma vez (pelos codecs do registro)
+em frames de DPS por dispositivo. Executar uma cena despacha todos os
+dispositivos em paralelo pela fila de comandos: uma frase vira um único
+despacho de aproximadamente um round trip.
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fila_comandos
+from escrita_pipeline import reconciliar
+from registro_dispositivos import REGISTRO
+
+CENAS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cenas.json")
+
+# Comando que liga o dispositivo e quanto esperar antes dos demais DPS (s),
+# mesmos tempos usados em device_tools
+ATRASO_APOS_LIGAR = {"ar": ("switch", 1.5)}
+
+# Relé que alimenta um dispositivo: a lâmpada RGB é energizada pelo DPS "lamp"
+# do interruptor (o mesmo que set_lamp_state usa)
+ALIMENTACAO = {"lampada": ("interruptor", "lamp")}
+
+
+def _compilar_dispositivo(cena: str, nome: str, comandos: dict) -> list:
+    """Retorna a lista de passos [(frame, atraso_depois)] de um dispositivo."""
+    frame = {}
+    for comando, valor in comandos.items():
+        codec = REGISTRO[nome].get(comando)
+        if codec is None:
+            raise ValueError(f"cena '{cena}': comando '{comando}' inexistente em {nome}")
+        final = codec.codificar(valor)
+        if final is None:
+            raise ValueError(f"cena '{cena}': valor '{valor}' inválido para {nome} {comando}")
+        if isinstance(final, dict):
+            frame.update(final)
+        else:
+            frame[codec.dps] = final
+
+    ligar = ATRASO_APOS_LIGAR.get(nome)
+    if ligar:
+        dps_ligar = REGISTRO[nome][ligar[0]].dps
+        if frame.get(dps_ligar) is True and len(frame) > 1:
+            resto = {k: v for k, v in frame.items() if k != dps_ligar}
+            return [({dps_ligar: True}, ligar[1]), (resto, 0.0)]
+    return [(frame, 0.0)]
+
+
+def _verificar_alimentacao(cena: str, acoes: dict):
+    """Dispositivos rodam em paralelo: uma cena não pode cortar a energia de quem ela configura."""
+    for nome, (fonte, comando) in ALIMENTACAO.items():
+        valor = acoes.get(fonte, {}).get(comando)
+        if nome in acoes and valor is not None and REGISTRO[fonte][comando].codificar(valor) is False:
+            raise ValueError(f"cena '{cena}': desliga {fonte} {comando}, que alimenta {nome}")
+
+
+def compilar(path: str = CENAS_PATH) -> dict:
+    """{cena: {"descricao", "frases", "passos": {dispositivo: [(frame, atraso)]}}}"""
+    with open(path, "r", encoding="utf-8") as f:
+        definicoes = json.load(f)
+    for cena, d in definicoes.items():
+        _verificar_alimentacao(cena, d["acoes"])
+    return {
+        cena: {
+            "descricao": d.get("descricao", ""),
+            "frases": [p.lower() for p in d.get("frases", [])],
+            "passos": {nome: _compilar_dispositivo(cena, nome, cmds) for nome, cmds in d["acoes"].items()},
+        }
+        for cena, d in definicoes.items()
+    }
+
+
+CENAS = compilar()
+
+
+def _executar_dispositivo(nome: str, passos: list) -> dict:
+    changes = {"frames": 0}
+    pendentes = []
+    for frame, atraso in passos:
+        resultado = fila_comandos.enviar(nome, frame)
+        changes["frames"] += 1
+        if resultado.get("coalescidas"):
+            changes["coalesced"] = changes.get("coalesced", 0) + resultado["coalescidas"]
+        # Mesma chave de falha que device_tools._enviar e reconciliar: changes["errors"]
+        erro = resultado.get("erro")
+        resposta = resultado.get("resposta")
+        if erro is None and isinstance(resposta, dict) and "Err" in resposta:
+            erro = f"Err {resposta['Err']}: {resposta.get('Error', '')}".rstrip(": ")
+        if erro is not None:
+            changes.setdefault("errors", []).append(f"{nome} DPS {sorted(frame)}: {erro}")
+        if "pendente" in resultado:
+            pendentes.append(resultado["pendente"])
+        if atraso:
+            time.sleep(atraso)
+    return reconciliar(changes, pendentes, fila_comandos.PRAZO_CONFIRMACAO)
+
+
+def executar_cena(nome: str) -> dict:
+    """Executa a cena em paralelo em todos os dispositivos envolvidos."""
+    cena = CENAS.get(str(nome).lower())
+    if cena is None:
+        return {"erro": f"cena desconhecida: {nome}"}
+    passos = cena["passos"]
+    with ThreadPoolExecutor(max_workers=len(passos)) as pool:
+        futuros = {dev: pool.submit(_executar_dispositivo, dev, p) for dev, p in passos.items()}
+        return {dev: f.result() for dev, f in futuros.items()}
+
+
+def falhas(resultado: dict) -> dict:
+    """{dispositivo: [erros]} de um resultado de executar_cena ("cena" se ela não existe)."""
+    if "erro" in resultado:
+        return {"cena": [resultado["erro"]]}
+    return {dev: r["errors"] for dev, r in resultado.items() if r.get("errors")}
+
+
+def passos_aplicados(nome: str, resultado: dict) -> dict:
+    """Passos da cena só dos dispositivos que aplicaram (o que o termostato deve adotar)."""
+    cena = CENAS.get(str(nome).lower())
+    if cena is None:
+        return {}
+    falhou = falhas(resultado)
+    return {dev: p for dev, p in cena["passos"].items() if dev not in falhou}
+
+
+def identificar(texto: str) -> str | None:
+    """Retorna a cena cuja frase-gatilho aparece no texto (caminho rápido, sem SLM)."""
+    for cena, d in CENAS.items():
+        if any(frase in texto for frase in d["frases"]):
+            return cena
+    return None
+
+
+def ferramenta() -> dict:
+    """Definição de tool (function calling) com uma entrada por cena."""
+    descricoes = "; ".join(f"{c}: {d['descricao']}" for c, d in CENAS.items())
+    return {
+        "type": "function",
+        "function": {
+            "name": "executar_cena",
+            "description": f"Executa uma cena com vários dispositivos de uma vez. {descricoes}",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "nome": {"type": "string", "enum": list(CENAS)},
+                },
+                "required": ["nome"],
+            },
+        },
+    }
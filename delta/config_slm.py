@@ -0,0 +1,76 @@
+"""
+Configuração do SLM escolhida pelo autotuner.py (config_slm.json).
+
+Guarda o modelo (com a quantização, que faz parte da tag do Ollama), as
+opções de inferência (num_ctx, num_predict...), o SYSTEM_PROMPT e o estilo
+do schema das ferramentas. O delta.py aplica na inicialização; sem o
+arquivo, valem as constantes do delta.py.
+"""
+
+import os
+import json
+
+CAMINHO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_slm.json")
+
+# Estilos do schema das ferramentas enviado ao Ollama (menos tokens de prompt
+# a cada passo, ao custo de menos orientação para o modelo)
+ESTILOS = ("completo", "compacto", "minimo")
+
+
+def _compactar(parametros: dict, manter_descricoes: bool) -> dict:
+    propriedades = {}
+    for nome, p in parametros.get("properties", {}).items():
+        q = {k: v for k, v in p.items() if k in ("type", "enum", "minimum", "maximum")}
+        if manter_descricoes and "description" in p:
+            q["description"] = p["description"]
+        propriedades[nome] = q
+    resultado = {"type": "object", "properties": propriedades}
+    if parametros.get("required"):
+        resultado["required"] = parametros["required"]
+    return resultado
+
+
+def estilizar_ferramentas(tools: list, estilo: str) -> list:
+    """
+    completo: como definido no delta.py
+    compacto: sem descrições dos parâmetros (mantém a da função)
+    minimo: sem descrições e sem limites numéricos, só tipos e enums
+    """
+    if estilo == "completo":
+        return tools
+    if estilo not in ESTILOS:
+        raise ValueError(f"estilo de ferramentas desconhecido: {estilo}")
+    resultado = []
+    for t in tools:
+        f = t["function"]
+        parametros = _compactar(f.get("parameters", {}), manter_descricoes=False)
+        funcao = {"name": f["name"], "parameters": parametros}
+        if estilo == "compacto":
+            funcao["description"] = f.get("description", "")
+        else:
+            for p in parametros["properties"].values():
+                p.pop("minimum", None)
+                p.pop("maximum", None)
+        resultado.append({"type": "function", "function": funcao})
+    return resultado
+
+
+def carregar(caminho: str = CAMINHO) -> dict | None:
+    """Configuração salva, ou None se não existir (ou estiver inválida)."""
+    if not os.path.exists(caminho):
+        return None
+    try:
+        with open(caminho, encoding="utf-8") as f:
+            config = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[AVISO] {caminho} ignorado: {e}")
+        return None
+    if config.get("estilo_ferramentas", "completo") not in ESTILOS:
+        print(f"[AVISO] {caminho} ignorado: estilo_ferramentas '{config['estilo_ferramentas']}' desconhecido")
+        return None
+    return config
+
+
+def salvar(config: dict, caminho: str = CAMINHO):
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2, ensure_ascii=False)
@@ -1,5 +1,8 @@
 import sys
 import tinytuya
+import descoberta_tuya
+import rastreamento
+from registro_dispositivos import REGISTRO, dps_map
 
 # Precisa editar os devices com os valores dos seus dispositivos
 # Exemplo:
@@ -26,214 +29,45 @@ DEVICES = {
     "lampada": {
         "id": "id_here",
         "ip": "ip_here",
-        "key": "key_here"~)",
+        "key": "key_here",
         "version": 3.5,
     },
 }
 
-DPS_MAP = {
-    "interruptor": {
-        "ventilador": "1",
-        "speed": "3",
-        "lamp": "5",
-    },
-    "ar": {
-        "switch": "1",
-        "temp": "2",
-        "mode": "4",
-        "wind": "5",
-        "eco": "8",
-        "light": "13",
-        "lock": "14",
-        "unit": "19",
-        "swing": "33",
-        "sleep": "102",
-        "health": "106",
-    },
-    "lampada": {
-        "modo": "multi",
-        "brilho": "22",
-        "temp": "23",
-    },
-}
+# DPS de cada comando, derivado do registro compilado (registro_dispositivos.py)
+DPS_MAP = dps_map()
+
+
+# Códigos de erro do tinytuya que indicam IP errado/dispositivo inacessível
+ERROS_CONEXAO = {"901", "902", "905"}
 
 
 def conectar_dispositivo(nome):
     cfg = DEVICES[nome]
-    dev = tinytuya.OutletDevice(cfg["id"], cfg["ip"], cfg["key"])
-    dev.set_version(cfg["version"])
+    with rastreamento.span("tuya.conectar", dispositivo=nome) as s:
+        ip, versao = descoberta_tuya.resolver(cfg["id"], cfg["ip"], cfg["version"])
+        dev = tinytuya.OutletDevice(cfg["id"], ip, cfg["key"])
+        dev.set_version(versao)
+        s.definir(ip=ip, versao=versao, retries=getattr(dev, "socketRetryLimit", None))
     return dev
 
 
-def parse_on_off(valor):
-    if valor in ("on", "ligar", "true", "1"):
-        return True
-    if valor in ("off", "desligar", "false", "0"):
-        return False
-    return None
-
-
-def processar_interruptor(comando, valor):
-    if comando in ("ventilador", "lamp"):
-        b = parse_on_off(valor)
-        if b is None:
-            print("Erro: use on/off.")
-        return b
-
-    if comando == "speed":
-        if valor in ("level_1", "level_2", "level_3", "level_4", "level_5"):
-            return valor
-        mapa = {
-            "1": "level_1",
-            "baixo": "level_1",
-            "low": "level_1",
-            "2": "level_2",
-            "medio_baixo": "level_2",
-            "3": "level_3",
-            "medio": "level_3",
-            "middle": "level_3",
-            "4": "level_4",
-            "medio_alto": "level_4",
-            "5": "level_5",
-            "alto": "level_5",
-            "high": "level_5",
-        }
-        if valor in mapa:
-            return mapa[valor]
-        print("Erro: velocidade inválida. Use 1-5.")
-        return None
-
-    print("Comando inválido para interruptor.")
-    return None
-
-
-def processar_ar(comando, valor):
-    if comando in ("switch", "eco", "light", "lock", "swing", "sleep", "health"):
-        b = parse_on_off(valor)
-        if b is None:
-            print("Erro: use on/off.")
-        return b
-
-    if comando == "temp":
-        try:
-            t = int(valor)
-        except ValueError:
-            print("Erro: temperatura inválida.")
-            return None
-        if 16 <= t <= 30:
-            return t * 10
-        print("Erro: temperatura deve estar entre 16 e 30 °C.")
-        return None
-
-    if comando == "mode":
-        modos = {
-            "frio": "cold",
-            "cold": "cold",
-            "cool": "cold",
-            "seco": "wet",
-            "wet": "wet",
-            "dry": "wet",
-            "ventilar": "wind",
-            "wind": "wind",
-            "fan": "wind",
-            "auto": "auto",
-            "automatico": "auto",
-        }
-        if valor in modos:
-            return modos[valor]
-        print("Erro: modos válidos: cold, wet, wind, auto.")
-        return None
-
-    if comando == "wind":
-        velocidades = {
-            "auto": "auto",
-            "automatico": "auto",
-            "mute": "mute",
-            "off": "mute",
-            "silencioso": "mute",
-            "quieto": "mute",
-            "low": "low",
-            "baixo": "low",
-            "mid": "mid",
-            "medio": "mid",
-            "high": "high",
-            "alto": "high",
-            "turbo": "high",
-            "maximo": "high",
-            "0": "mute",
-            "1": "low",
-            "2": "mid",
-            "3": "high",
-            "4": "high",
-        }
-        if valor in velocidades:
-            if valor == "off":
-                print("ar wind off -> mute (silencioso).")
-            if valor in ("turbo", "maximo", "4"):
-                print("Aviso: turbo no app equivale a high no protocolo local.")
-            return velocidades[valor]
-        print("Erro: use auto/mute/low/mid/high/off.")
-        return None
-
-    if comando == "unit":
-        if valor in ("c", "celsius"):
-            return "C"
-        if valor in ("f", "fahrenheit"):
-            return "F"
-        print("Erro: use C ou F.")
-        return None
-
-    print("Comando inválido para ar.")
-    return None
-
-
-def processar_lampada(comando, valor):
-    if comando == "modo":
-        if valor in ("dia", "day", "branco", "white"):
-            return {
-                "21": "white",
-                "22": 1000,
-                "23": 1000,
-            }
-        if valor in ("noite", "night", "amarelo", "laranja", "warm"):
-            return {
-                "21": "white",
-                "22": 450,
-                "23": 100,
-            }
-        print("Erro: modos válidos para lâmpada: dia, noite.")
-        return None
-
-    if comando == "brilho":
-        try:
-            v = int(valor)
-        except ValueError:
-            print("Erro: brilho inválido.")
-            return None
-        if 1 <= v <= 100:
-            v *= 10
-        if not 10 <= v <= 1000:
-            print("Erro: brilho deve estar entre 10-1000 ou 1-100%.")
-            return None
-        return v
-
-    if comando == "temp":
-        if valor in ("quente", "warm", "amarelo"):
-            return 0
-        if valor in ("frio", "cold", "branco"):
-            return 1000
-        try:
-            v = int(valor)
-        except ValueError:
-            print("Erro: use 0-1000 ou quente/frio.")
-            return None
-        if not 0 <= v <= 1000:
-            print("Erro: temperatura deve estar entre 0-1000.")
-            return None
-        return v
-
-    print("Comando inválido para lâmpada.")
-    return None
+def verificar_resposta(nome, resp):
+    """Invalida o IP em cache se a resposta indicar falha de conexão."""
+    if isinstance(resp, dict) and "Err" in resp:
+        rastreamento.definir(erro_tuya=str(resp.get("Err")), erro_msg=resp.get("Error"))
+        if str(resp.get("Err")) in ERROS_CONEXAO:
+            descoberta_tuya.invalidar(DEVICES[nome]["id"])
+    return resp
+
+
+def processar(nome, comando, valor):
+    """Valida e codifica `valor` para o protocolo usando o codec do registro."""
+    codec = REGISTRO[nome][comando]
+    final = codec.codificar(valor)
+    if final is None:
+        print(f"Erro: valor inválido para {nome} {comando}. Use {codec.descrever()}.")
+    return final
 
 
 def mostrar_ajuda():
@@ -263,12 +97,19 @@ def mostrar_ajuda():
     print("  python controle_tuya.py lampada temp quente")
     print("\nStatus")
     print("  python controle_tuya.py <interruptor|ar|lampada> status")
+    print("\nCenas (definidas em cenas.json)")
+    print("  python controle_tuya.py cena modo_cinema")
+    print("  python controle_tuya.py cena saindo_de_casa")
+    print("\nDescoberta de IPs")
+    print("  python descoberta_tuya.py                 # escuta broadcasts")
+    print("  python descoberta_tuya.py 192.168.0.0/24  # + sondagem da sub-rede")
     print("=" * 70)
 
 
 def consultar_status(nome):
     dev = conectar_dispositivo(nome)
-    resp = dev.status()
+    with rastreamento.span("tuya.status", dispositivo=nome):
+        resp = verificar_resposta(nome, dev.status())
     dps = resp.get("dps")
 
     if not isinstance(dps, dict):
@@ -305,6 +146,12 @@ def main():
         return
 
     nome = sys.argv[1].lower()
+    if nome == "cena" and len(sys.argv) == 3:
+        import cenas
+
+        print(cenas.executar_cena(sys.argv[2].lower()))
+        return
+
     if nome not in DEVICES:
         print("Dispositivo inválido. Use: interruptor, ar, lampada.")
         return
@@ -325,28 +172,24 @@ def main():
         print("Comandos válidos:", list(DPS_MAP[nome].keys()))
         return
 
-    if nome == "interruptor":
-        valor_final = processar_interruptor(comando, valor)
-    elif nome == "ar":
-        valor_final = processar_ar(comando, valor)
-    else:
-        valor_final = processar_lampada(comando, valor)
-
+    valor_final = processar(nome, comando, valor)
     if valor_final is None:
         return
 
     dev = conectar_dispositivo(nome)
 
-    if nome == "lampada" and isinstance(valor_final, dict):
+    if isinstance(valor_final, dict):
         for dps_id, v in valor_final.items():
             print(f"Enviando: DPS {dps_id} -> {v}")
-            dev.set_value(int(dps_id), v)
+            with rastreamento.span("tuya.set_value", dispositivo=nome, dps=dps_id):
+                verificar_resposta(nome, dev.set_value(dps_id, v))
         print("Comando concluído.")
         return
 
-    dps_id = DPS_MAP[nome][comando]
+    dps_id = REGISTRO[nome][comando].dps
     print(f"Enviando: DPS {dps_id} -> {valor_final}")
-    dev.set_value(int(dps_id), valor_final)
+    with rastreamento.span("tuya.set_value", dispositivo=nome, dps=dps_id):
+        verificar_resposta(nome, dev.set_value(dps_id, valor_final))
     print("Comando concluído.")
 
 
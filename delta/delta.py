@@ -6,15 +6,28 @@ Controla dispositivos inteligentes via função calling.
 
 import os
 import sys
-import pyaudio
 import json
 import time
-import audioop
+import signal
+import logging
+import argparse
 from ctypes import *
-from vosk import Model, KaldiRecognizer
 import ollama
 from device_tools import set_ac_state, set_fan_state, set_lamp_state, set_ceiling_lamp_state
+import cenas
+import descoberta_tuya
 from hardware import Sensores, GerenciadorLED
+import backend_hardware
+import log_sensores
+import metricas_http
+import fila_comandos
+import termostato
+import metricas_latencia
+import rastreamento
+import config_slm
+import telemetria_host
+import perfilador
+import captura_audio
 
 
 # Supressão de erros ALSA e C-libs
@@ -52,15 +65,64 @@ MODELO_LLM = "llama3.2:3b"
 
 # Configuração de captura de áudio
 TAXA = 16000
-BUFFER = 8000
+BUFFER = 4000  # Frames por bloco do callback de áudio (0,25 s)
 LIMIAR_RUIDO = 300
 TEMPO_SILENCIO = 2.0
 TEMPO_MAXIMO_CAPTURA = 15.0
 
-# Inicialização de hardware
+# Idade maxima aceita para leituras do amostrador de sensores (s)
+IDADE_MAXIMA_LEITURA = 10.0
+
+# Janela usada para calcular a tendência de temperatura (s)
+JANELA_TENDENCIA = 1800.0
+
+# Dias do log em disco (gravado por auxiliar/sensor/monitor.py) carregados no histórico
+DIAS_HISTORICO = 7
+
+# Núcleo assíncrono (pipeline_async.py): estágios sobrepostos em vez do loop
+# sequencial; também com --async
+PIPELINE_ASYNC = False
+
+# Log de depuração (prompt, resposta bruta do SLM, decisões de roteamento):
+# ligado com --debug ou alternado em execução com `kill -USR1 <pid>`
+log = logging.getLogger("delta")
+
+
+class FormatoDelta(logging.Formatter):
+    """"[DEBUG] mensagem chave=valor ...", com os campos passados em extra={"dados": {...}}."""
+
+    def format(self, record):
+        texto = f"[{record.levelname}] {record.getMessage()}"
+        dados = getattr(record, "dados", None)
+        if dados:
+            texto += " " + " ".join(f"{k}={v!r}" for k, v in dados.items())
+        if record.exc_info:
+            texto += "\n" + self.formatException(record.exc_info)
+        return texto
+
+
+def configurar_log(debug: bool = False):
+    saida = logging.StreamHandler(sys.stdout)
+    saida.setFormatter(FormatoDelta())
+    log.addHandler(saida)
+    log.propagate = False
+    log.setLevel(logging.DEBUG if debug else logging.INFO)
+
+
+def alternar_debug(signum=None, frame=None):
+    """Handler do SIGUSR1: liga/desliga o nível DEBUG sem reiniciar."""
+    ligar = not log.isEnabledFor(logging.DEBUG)
+    log.setLevel(logging.DEBUG if ligar else logging.INFO)
+    print(f"[INFO] Modo debug {'ativado' if ligar else 'desativado'}")
+
+
+# Inicialização de hardware (backend escolhido por DELTA_BACKEND, ver backend_hardware.py)
 sensores = Sensores()
 led = GerenciadorLED()
 
+# Controle automático de AC/ventilador pela temperatura (iniciado em main se termostato.ATIVO)
+controle_clima = termostato.Termostato(sensores)
+
 SYSTEM_PROMPT = """
 Você é Delta, uma IA residencial brasileira.
 Respostas: breves, objetivas, sem Markdown. Máximo 2 frases.
@@ -143,100 +205,42 @@ TOOLS = [
             },
         },
     },
+    cenas.ferramenta(),
 ]
 
+# Opções de inferência do Ollama (num_ctx, num_predict...) de config_slm.json
+OPCOES_SLM = {}
 
-class Metricas:
-    """Gerenciador de métricas de latência do sistema."""
-
-    def __init__(self):
-        self.reset()
-
-    def reset(self):
-        """Reinicia todos os marcadores de tempo."""
-        self.t_keyword = None
-        self.t_comando_inicio = None
-        self.t_comando_fim = None
-        self.t_slm_inicio = None
-        self.t_slm_fim = None
-        self.t_tools_inicio = None
-        self.t_tools_fim = None
-        self.t_resposta_fim = None
-
-    def marcar_keyword(self):
-        self.t_keyword = time.time()
-
-    def marcar_comando_inicio(self):
-        self.t_comando_inicio = time.time()
-
-    def marcar_comando_fim(self):
-        self.t_comando_fim = time.time()
-
-    def marcar_slm_inicio(self):
-        self.t_slm_inicio = time.time()
-
-    def marcar_slm_fim(self):
-        self.t_slm_fim = time.time()
-
-    def marcar_tools_inicio(self):
-        self.t_tools_inicio = time.time()
-
-    def marcar_tools_fim(self):
-        self.t_tools_fim = time.time()
-
-    def marcar_resposta_fim(self):
-        self.t_resposta_fim = time.time()
-
-    def imprimir(self):
-        """Exibe métricas de latência formatadas."""
-        print("\n" + "="*70)
-        print("METRICAS DE LATENCIA")
-        print("="*70)
-
-        if self.t_keyword and self.t_comando_fim:
-            latencia_voz = (self.t_comando_fim - self.t_keyword) * 1000
-            print(f"Captura de voz (keyword -> silencio):  {latencia_voz:>7.1f} ms")
-
-        if self.t_comando_fim and self.t_slm_inicio:
-            prep_slm = (self.t_slm_inicio - self.t_comando_fim) * 1000
-            print(f"Preparacao de prompt:                  {prep_slm:>7.1f} ms")
-
-        if self.t_slm_inicio and self.t_slm_fim:
-            latencia_slm = (self.t_slm_fim - self.t_slm_inicio) * 1000
-            print(f"Processamento SLM:                     {latencia_slm:>7.1f} ms")
-
-        if self.t_tools_inicio and self.t_tools_fim:
-            latencia_tools = (self.t_tools_fim - self.t_tools_inicio) * 1000
-            print(f"Execucao de ferramentas:               {latencia_tools:>7.1f} ms")
-
-        if self.t_slm_fim and self.t_resposta_fim:
-            latencia_resposta = (self.t_resposta_fim - self.t_slm_fim) * 1000
-            print(f"Geracao de resposta:                   {latencia_resposta:>7.1f} ms")
 
-        print("-"*70)
+def aplicar_config_slm(caminho: str = config_slm.CAMINHO) -> dict | None:
+    """Aplica modelo, opções, SYSTEM_PROMPT e estilo das tools escolhidos pelo autotuner.py."""
+    global MODELO_LLM, SYSTEM_PROMPT, TOOLS, OPCOES_SLM
+    config = config_slm.carregar(caminho)
+    if config:
+        MODELO_LLM = config.get("modelo", MODELO_LLM)
+        SYSTEM_PROMPT = config.get("system_prompt", SYSTEM_PROMPT)
+        TOOLS = config_slm.estilizar_ferramentas(TOOLS, config.get("estilo_ferramentas", "completo"))
+        OPCOES_SLM = dict(config.get("opcoes", {}))
+    return config
 
-        if self.t_keyword and self.t_resposta_fim:
-            latencia_total = (self.t_resposta_fim - self.t_keyword) * 1000
-            print(f"LATENCIA TOTAL (keyword -> resposta):  {latencia_total:>7.1f} ms")
-            print(f"Tempo total: {latencia_total/1000:.2f} segundos")
 
-        print("="*70 + "\n")
-
-
-metricas = Metricas()
+metricas = metricas_latencia.Requisicao()  # Substituído a cada palavra-chave (ver main)
 
 
 def ler_sensores():
-    """Lê dados dos sensores e calcula média de temperatura."""
-    leituras = sensores.ler_todos()
-    temps = []
-    for nome, dados in leituras.items():
-        t = dados.get("temp")
-        if t is not None:
-            temps.append(float(t))
-    media = sum(temps) / len(temps) if temps else None
+    """
+    Lê o último snapshot dos sensores (sem acessar o barramento) e a estimativa
+    fundida de temperatura/umidade (fusao_sensores: calibração, outliers, filtro).
+    """
+    with rastreamento.span("sensores.ler") as s:
+        leituras = sensores.latest(max_age=IDADE_MAXIMA_LEITURA).leituras
+        fusao = sensores.fusao.resultado()
+        s.definir(sensores=len(leituras), outliers=len(fusao["outliers"]))
     return {
-        "media_temp_c": media,
+        "media_temp_c": fusao["temp"],
+        "umidade": fusao["umid"],
+        "outliers": fusao["outliers"],
+        "saude": fusao["saude"],
         "leituras": leituras,
     }
 
@@ -268,25 +272,42 @@ def interpretar_clima(temp_media: float | None, umidade_media: float | None) ->
     return f"{faixa_temp}, com {faixa_umid}"
 
 
-def responder_clima_atual():
-    """Responde consultas sobre clima atual usando dados dos sensores."""
-    dados = ler_sensores()
+def carregar_historico():
+    """Pré-carrega o histórico em memória com o log persistente de sensores."""
+    agora = time.time()
+    por_minuto = log_sensores.ler_por_minuto(agora - DIAS_HISTORICO * 86400, agora - agora % 60)
+    brutos = log_sensores.ler(agora - 3600, agora)
+    sensores.historico.importar(por_minuto, brutos)
+    if por_minuto or brutos:
+        print(f"[INFO] Historico carregado: {len(por_minuto)} agregados, {len(brutos)} leituras recentes")
+
+
+def descrever_tendencia() -> str | None:
+    """Tendência de temperatura na última meia hora a partir do histórico dos sensores."""
+    inclinacao = sensores.historico.tendencia("temp", JANELA_TENDENCIA, time.time())
+    if inclinacao is None:
+        return None
+    if inclinacao > 0.3:
+        sentido = "esquentando"
+    elif inclinacao < -0.3:
+        sentido = "esfriando"
+    else:
+        sentido = "estavel"
+    return f"{inclinacao:+.1f}C/h nos ultimos {JANELA_TENDENCIA / 60:.0f} min ({sentido})"
+
+
+def montar_prompt_clima(dados: dict, tendencia: str | None) -> str:
+    """Prompt da rota de clima a partir de ler_sensores() (com média disponível) e da tendência."""
     media_temp = dados["media_temp_c"]
     leituras = dados["leituras"]
 
-    if media_temp is None:
-        print("[DELTA] Nao consegui ler os sensores agora.")
-        return
-
-    umids = []
     linhas = []
     for nome, d in leituras.items():
-        t = d.get("temp")
-        u = d.get("umid")
+        # Leituras descartadas pela fusao nao entram no contexto do modelo
+        t = d.get("temp") if f"{nome}.temp" not in dados["outliers"] else None
+        u = d.get("umid") if f"{nome}.umid" not in dados["outliers"] else None
         p = d.get("pressao")
         alt = d.get("altitude")
-        if u is not None:
-            umids.append(float(u))
         linha = f"{nome}: "
         if t is not None:
             linha += f"{t:.1f} C"
@@ -299,30 +320,47 @@ def responder_clima_atual():
         linhas.append(linha)
 
     texto_sensores = "\n".join(linhas)
-    umidade_media = sum(umids) / len(umids) if umids else None
+    umidade_media = dados["umidade"]
     interpretacao = interpretar_clima(media_temp, umidade_media)
+    linha_tendencia = f"\nTendencia: {tendencia}." if tendencia else ""
 
-    prompt = f"""
+    return f"""
 [DADOS REAIS]
 {texto_sensores}
-Media: {media_temp:.1f}C ({interpretacao}).
+Media: {media_temp:.1f}C ({interpretacao}).{linha_tendencia}
 
 [TAREFA]
 Responda ao usuario como esta o clima interno agora. Seja natural e curto.
 """.strip()
 
+
+def responder_clima_atual():
+    """Responde consultas sobre clima atual usando dados dos sensores."""
+    dados = ler_sensores()
+    if dados["media_temp_c"] is None:
+        print("[DELTA] Nao consegui ler os sensores agora.")
+        return
+    prompt = montar_prompt_clima(dados, descrever_tendencia())
+
+    log.debug("Prompt enviado para SLM:\n%s", prompt)
+
     if led:
         led.estado_processando_slm()
 
     metricas.marcar_slm_inicio()
-    resp = ollama.chat(
-        model=MODELO_LLM,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
-    )
-    metricas.marcar_slm_fim()
+    with rastreamento.span("ollama.chat", modelo=MODELO_LLM, rota="clima"):
+        resp = ollama.chat(
+            model=MODELO_LLM,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            options=OPCOES_SLM,
+        )
+        metricas.marcar_slm_fim()
+        metricas.registrar_ollama(resp)
+
+    log.debug("Resposta da SLM: %s", resp)
 
     resposta = resp["message"]["content"].strip()
     if led:
@@ -337,19 +375,51 @@ Responda ao usuario como esta o clima interno agora. Seja natural e curto.
 
 
 def processar_comando_voz(comando: str):
-    """Analisa e roteia comando de voz para o handler apropriado."""
+    """Analisa e roteia comando de voz para o handler apropriado (um span por comando)."""
+    log.debug("Comando recebido: %r", comando)
+    with rastreamento.span("comando", caracteres=len(comando)) as s:
+        rotear_comando(comando)
+        s.definir(rota=metricas.rota)
+
+
+PALAVRAS_PAUSA_TERMOSTATO = {
+    "desliga", "desligar", "desligue", "pausa", "pausar", "pause",
+    "suspende", "suspender", "desativa", "desativar", "parar", "pare",
+}
+PALAVRAS_RETOMA_TERMOSTATO = {
+    "liga", "ligar", "ligue", "religa", "retoma", "retomar", "retome",
+    "volta", "voltar", "ativa", "ativar", "ative", "reativa", "reativar",
+}
+
+
+def classificar_rota(comando: str) -> tuple:
+    """
+    (rota, cena ou None) pela frase: clima, termostato (retomar), termostato_pausa,
+    cena, dispositivos (tools) ou conversa (chat).
+    """
     texto_lower = comando.lower()
 
     palavras_consulta_clima = [
         "clima atual", "como esta o clima", "como esta o tempo",
         "qual o clima", "como esta o ambiente", "qual a temperatura",
-        "temperatura agora", "quantos graus"
+        "temperatura agora", "quantos graus",
+        "esquentando", "esfriando"
     ]
 
     if any(p in texto_lower for p in palavras_consulta_clima):
-        metricas.marcar_comando_fim()
-        responder_clima_atual()
-        return
+        return "clima", None
+
+    if "termostato" in texto_lower:
+        # Só frases explícitas; "desliga"/"pausa" contêm ou parecem "liga", então pausa vem antes
+        palavras = set(texto_lower.replace(",", " ").split())
+        if palavras & PALAVRAS_PAUSA_TERMOSTATO:
+            return "termostato_pausa", None
+        if palavras & PALAVRAS_RETOMA_TERMOSTATO:
+            return "termostato", None
+
+    cena = cenas.identificar(texto_lower)
+    if cena:
+        return "cena", cena
 
     palavras_dispositivos = [
         "ar", "ar-condicionado", "ar condicionado", "ac",
@@ -379,28 +449,156 @@ def processar_comando_voz(comando: str):
 
     tem_dispositivo = any(p in texto_lower for p in palavras_dispositivos)
     tem_acao = any(p in texto_lower for p in palavras_acoes)
+    log.debug("Roteamento por palavras", extra={"dados": {"tem_dispositivo": tem_dispositivo, "tem_acao": tem_acao}})
 
     if tem_dispositivo or tem_acao:
-        metricas.marcar_comando_fim()
-        processar_com_function_calling(comando)
-        return
+        return "tools", None
+    return "chat", None
 
+
+def rotear_comando(comando: str):
+    """Escolhe o handler pela frase: clima, termostato, cena, dispositivos ou conversa."""
+    rota, cena = classificar_rota(comando)
+    metricas.rota = rota
+    log.debug("Rota: %s", rota)
     metricas.marcar_comando_fim()
-    conversa_geral(comando)
 
+    if rota == "clima":
+        responder_clima_atual()
+    elif rota == "termostato":
+        controle_clima.retomar()
+        print("[DELTA] Termostato automatico retomado.")
+        metricas.marcar_resposta_fim()
+        metricas.imprimir()
+    elif rota == "termostato_pausa":
+        controle_clima.pausar()
+        print("[DELTA] Termostato automatico pausado.")
+        metricas.marcar_resposta_fim()
+        metricas.imprimir()
+    elif rota == "cena":
+        executar_cena_direta(cena)
+    elif rota == "tools":
+        processar_com_function_calling(comando)
+    else:
+        conversa_geral(comando)
 
-def processar_com_function_calling(comando: str):
-    """Processa comandos de controle de dispositivos usando function calling."""
-    dados = ler_sensores()
-    media = dados["media_temp_c"]
 
+def executar_cena_direta(cena: str):
+    """Executa uma cena reconhecida pela frase-gatilho, sem passar pelo SLM."""
+    metricas.marcar_tools_inicio()
+    with rastreamento.span("cena", nome=cena):
+        result = cenas.executar_cena(cena)
+        controle_clima.registrar_cena(cenas.passos_aplicados(cena, result))
+    metricas.marcar_tools_fim()
+    print(f"[DELTA][CENA] {result}")
+
+    if led:
+        led.estado_respondendo()
+    print(f"[DELTA] {resumo_cena(cena, result)}.")
+
+    metricas.marcar_resposta_fim()
+    metricas.imprimir()
+
+    if led:
+        led.estado_ouvindo_keyword()
+
+
+def _falhou(rotulo: str, result: dict, resultados: list) -> bool:
+    """Escritas que falharam (changes["errors"] do device_tools) viram falha na resposta, não sucesso."""
+    erros = result.get("errors") if isinstance(result, dict) else None
+    if erros:
+        print(f"[ERRO] Falha ao controlar {rotulo}: {'; '.join(erros)}")
+        resultados.append(f"Nao consegui controlar {rotulo}")
+    return bool(erros)
+
+
+def resumo_cena(cena: str, result: dict) -> str:
+    """Resposta de uma cena: "ativada" só se todos os dispositivos aplicaram (como _falhou nas tools)."""
+    rotulo = str(cena).replace("_", " ")
+    falhas = cenas.falhas(result)
+    if not falhas:
+        return f"Cena {rotulo} ativada"
+    print(f"[ERRO] Falha na cena {rotulo}: {'; '.join(e for erros in falhas.values() for e in erros)}")
+    if "cena" in falhas:
+        return f"Nao conheco a cena {rotulo}"
+    return f"Cena {rotulo} incompleta, falhou: {', '.join(falhas)}"
+
+
+def executar_ferramenta(fname: str, args: dict, media: float | None, resultados: list):
+    """Executa uma tool call do SLM e acrescenta a descrição do resultado em `resultados`."""
+    if fname == "set_ac_state":
+        if "target_temp_c" in args and args["target_temp_c"] is not None:
+            args["target_temp_c"] = float(args["target_temp_c"])
+        if args.get("power"):
+            controle_clima.liberar("ar")
+        result = set_ac_state(**args)
+        if _falhou("o AC", result, resultados):
+            return
+        controle_clima.registrar_comando("ar", args.get("power"))
+        estado = "ligado" if args.get("power") else "desligado"
+        temp = f" em {args.get('target_temp_c'):.0f}C" if args.get("target_temp_c") else ""
+
+        if media is not None:
+            resultados.append(f"AC {estado}{temp} (ambiente: {media:.1f}C)")
+        else:
+            resultados.append(f"AC {estado}{temp}")
+        print(f"[DELTA][AC] {result}")
+
+    elif fname == "set_fan_state":
+        if args.get("power"):
+            controle_clima.liberar("ventilador")
+        result = set_fan_state(**args)
+        if _falhou("o ventilador", result, resultados):
+            return
+        controle_clima.registrar_comando("ventilador", args.get("power"))
+        estado = "ligado" if args.get("power") else "desligado"
+        speed = f" velocidade {args.get('speed')}" if args.get("speed") else ""
+
+        if media is not None:
+            resultados.append(f"Ventilador {estado}{speed} (ambiente: {media:.1f}C)")
+        else:
+            resultados.append(f"Ventilador {estado}{speed}")
+        print(f"[DELTA][FAN] {result}")
+
+    elif fname == "set_ceiling_lamp_state":
+        result = set_ceiling_lamp_state(**args)
+        if _falhou("a lampada do teto", result, resultados):
+            return
+        estado = "ligada" if args.get("power") else "desligada"
+        resultados.append(f"Lampada teto {estado}")
+        print(f"[DELTA][LAMP_TETO] {result}")
+
+    elif fname == "set_lamp_state":
+        result = set_lamp_state(**args)
+        if _falhou("a lampada RGB", result, resultados):
+            return
+        detalhes = []
+        if args.get("power") is not None:
+            detalhes.append("ligada" if args["power"] else "desligada")
+        if args.get("mode"):
+            detalhes.append(f"modo {args['mode']}")
+        if args.get("brightness"):
+            detalhes.append(f"{args['brightness']}%")
+        resultados.append(f"Lampada RGB {' '.join(detalhes)}")
+        print(f"[DELTA][LAMP_RGB] {result}")
+
+    elif fname == "executar_cena":
+        nome = args.get("nome", "")
+        result = cenas.executar_cena(nome)
+        controle_clima.registrar_cena(cenas.passos_aplicados(nome, result))
+        print(f"[DELTA][CENA] {result}")
+        resultados.append(resumo_cena(nome, result))
+
+
+def montar_prompt_ferramentas(comando: str, media: float | None) -> str:
+    """Prompt do usuário para a rota de ferramentas (também usado pelo autotuner.py)."""
     if media is not None:
         sensacao = "Frio" if media < 20 else "Agradavel" if media < 25 else "Quente"
         context_temp = f"Temperatura atual: {media:.1f}C ({sensacao})"
     else:
         context_temp = "Temperatura: sensor indisponivel"
 
-    prompt_usuario = f"""
+    return f"""
 [CONTEXTO]
 {context_temp}
 
@@ -413,6 +611,7 @@ Analise o comando e escolha a tool correta:
 - "ar" ou "ar-condicionado" -> set_ac_state
 - "ventilador" -> set_fan_state  
 - "luz" ou "lampada" -> set_lamp_state ou set_ceiling_lamp_state
+- cenas com varios dispositivos -> executar_cena
 
 REGRAS IMPORTANTES:
 - LIGAR/ACENDER -> power: true
@@ -420,23 +619,37 @@ REGRAS IMPORTANTES:
 - AC e Ventilador NUNCA juntos
 """.strip()
 
+
+def processar_com_function_calling(comando: str):
+    """Processa comandos de controle de dispositivos usando function calling."""
+    dados = ler_sensores()
+    media = dados["media_temp_c"]
+    prompt_usuario = montar_prompt_ferramentas(comando, media)
+
+    log.debug("Prompt enviado para SLM:\n%s", prompt_usuario)
+
     if led:
         led.estado_processando_slm()
 
     metricas.marcar_slm_inicio()
-    resp = ollama.chat(
-        model=MODELO_LLM,
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt_usuario},
-        ],
-        tools=TOOLS,
-    )
-    metricas.marcar_slm_fim()
+    with rastreamento.span("ollama.chat", modelo=MODELO_LLM, rota="tools", ferramentas=len(TOOLS)):
+        resp = ollama.chat(
+            model=MODELO_LLM,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt_usuario},
+            ],
+            tools=TOOLS,
+            options=OPCOES_SLM,
+        )
+        metricas.marcar_slm_fim()
+        metricas.registrar_ollama(resp)
 
+    log.debug("Resposta da SLM: %s", resp)
     tool_calls = resp["message"].get("tool_calls") or resp["message"].get("toolcalls")
 
     if tool_calls:
+        log.debug("SLM chamou %d tool(s)", len(tool_calls))
         metricas.marcar_tools_inicio()
         resultados = []
 
@@ -446,47 +659,9 @@ REGRAS IMPORTANTES:
             if isinstance(args, str):
                 args = json.loads(args)
 
-            if fname == "set_ac_state":
-                if "target_temp_c" in args and args["target_temp_c"] is not None:
-                    args["target_temp_c"] = float(args["target_temp_c"])
-                result = set_ac_state(**args)
-                estado = "ligado" if args.get("power") else "desligado"
-                temp = f" em {args.get('target_temp_c'):.0f}C" if args.get("target_temp_c") else ""
-
-                if media is not None:
-                    resultados.append(f"AC {estado}{temp} (ambiente: {media:.1f}C)")
-                else:
-                    resultados.append(f"AC {estado}{temp}")
-                print(f"[DELTA][AC] {result}")
-
-            elif fname == "set_fan_state":
-                result = set_fan_state(**args)
-                estado = "ligado" if args.get("power") else "desligado"
-                speed = f" velocidade {args.get('speed')}" if args.get("speed") else ""
-
-                if media is not None:
-                    resultados.append(f"Ventilador {estado}{speed} (ambiente: {media:.1f}C)")
-                else:
-                    resultados.append(f"Ventilador {estado}{speed}")
-                print(f"[DELTA][FAN] {result}")
-
-            elif fname == "set_ceiling_lamp_state":
-                result = set_ceiling_lamp_state(**args)
-                estado = "ligada" if args.get("power") else "desligada"
-                resultados.append(f"Lampada teto {estado}")
-                print(f"[DELTA][LAMP_TETO] {result}")
-
-            elif fname == "set_lamp_state":
-                result = set_lamp_state(**args)
-                detalhes = []
-                if args.get("power") is not None:
-                    detalhes.append("ligada" if args["power"] else "desligada")
-                if args.get("mode"):
-                    detalhes.append(f"modo {args['mode']}")
-                if args.get("brightness"):
-                    detalhes.append(f"{args['brightness']}%")
-                resultados.append(f"Lampada RGB {' '.join(detalhes)}")
-                print(f"[DELTA][LAMP_RGB] {result}")
+            log.debug("Executando tool %s", fname, extra={"dados": args})
+            with rastreamento.span(f"tool.{fname}", argumentos=args):
+                executar_ferramenta(fname, args, media, resultados)
 
         metricas.marcar_tools_fim()
 
@@ -496,6 +671,7 @@ REGRAS IMPORTANTES:
         print(f"[DELTA] {msg}")
     else:
         resposta = resp["message"].get("content", "").strip()
+        log.debug("SLM nao chamou tools; respondeu com texto: %r", resposta)
         if resposta:
             if led:
                 led.estado_respondendo()
@@ -517,35 +693,59 @@ def conversa_geral(prompt):
     sys.stdout.flush()
 
     try:
-        stream = ollama.chat(
-            model=MODELO_LLM,
-            messages=[
-                {'role': 'system', 'content': SYSTEM_PROMPT},
-                {'role': 'user', 'content': prompt}
-            ],
-            options={'num_predict': 60, 'temperature': 0.1, 'top_k': 20},
-            stream=True,
-        )
-        texto_full = ""
-        for chunk in stream:
-            pedaco = chunk['message']['content'].replace('\n', ' ')
-            sys.stdout.write(pedaco)
-            sys.stdout.flush()
-            texto_full += pedaco
-        sys.stdout.write("\n")
-
-        metricas.marcar_slm_fim()
+        with rastreamento.span("ollama.chat", modelo=MODELO_LLM, rota="chat", stream=True) as s:
+            stream = ollama.chat(
+                model=MODELO_LLM,
+                messages=[
+                    {'role': 'system', 'content': SYSTEM_PROMPT},
+                    {'role': 'user', 'content': prompt}
+                ],
+                options={**OPCOES_SLM, 'num_predict': 60, 'temperature': 0.1, 'top_k': 20},
+                stream=True,
+            )
+            texto_full = ""
+            chunk = None
+            primeiro = True
+            for chunk in stream:
+                if primeiro:
+                    primeiro = False
+                    s.definir(primeiro_chunk_ms=(time.perf_counter_ns() - metricas.marcas["slm_inicio"]) / 1e6)
+                pedaco = chunk['message']['content'].replace('\n', ' ')
+                sys.stdout.write(pedaco)
+                sys.stdout.flush()
+                texto_full += pedaco
+            sys.stdout.write("\n")
+
+            metricas.marcar_slm_fim()
+            metricas.registrar_ollama(chunk)  # O último chunk traz contagens e tempos
+        log.debug("Ultimo chunk da SLM: %s", chunk)
         metricas.marcar_resposta_fim()
         metricas.imprimir()
 
         return texto_full
     except Exception as e:
         print(f"\n[ERRO] {e}")
+        log.debug("Falha na conversa geral", exc_info=True)
         return None
 
 
-def main():
+def main(argv=None):
     """Função principal do sistema."""
+    global metricas
+    parser = argparse.ArgumentParser(description="DELTA - assistente virtual residencial")
+    parser.add_argument("--debug", action="store_true",
+                        help="mostra prompts, respostas brutas do SLM e o roteamento (alterna com SIGUSR1)")
+    parser.add_argument("--async", dest="pipeline_async", action="store_true",
+                        help="usa o nucleo assincrono (pipeline_async.py)")
+    parser.add_argument("--pipeline-tuya", action="store_true",
+                        help="escritas Tuya em pipeline, confirmadas depois (ou DELTA_PIPELINE_TUYA=1)")
+    args = parser.parse_args(argv)
+    if args.pipeline_tuya:
+        fila_comandos.MODO_PIPELINE = True
+    configurar_log(args.debug)
+    signal.signal(signal.SIGUSR1, alternar_debug)
+    signal.signal(signal.SIGUSR2, perfilador.alternar)
+
     if not os.path.exists(MODELO_PATH):
         print(f"[ERRO] Modelo de voz '{MODELO_PATH}' nao encontrado.")
         return
@@ -554,25 +754,41 @@ def main():
     print("="*70)
     print("SISTEMA DELTA - ASSISTENTE VIRTUAL RESIDENCIAL")
     print("="*70)
-    print(f"Modelo de linguagem: {MODELO_LLM}")
+    config = aplicar_config_slm()
+    print(f"Modelo de linguagem: {MODELO_LLM}" + (f" (autotuner, {config.get('data', '?')})" if config else ""))
     print(f"Limite de captura: {TEMPO_MAXIMO_CAPTURA}s")
-    print(f"Sensores: DHT22, AHT20, BMP280")
+    print(f"Sensores: DHT22, AHT20, BMP280 (backend: {backend_hardware.BACKEND})")
+    print(f"Modo debug: {'ATIVADO' if args.debug else 'desativado'} (kill -USR1 {os.getpid()} alterna)")
+    print(f"Perfilador: kill -USR2 {os.getpid()} ou python3 perfilador.py iniciar 30")
+    usar_async = args.pipeline_async or PIPELINE_ASYNC
+    print(f"Nucleo: {'assincrono' if usar_async else 'sequencial'}")
     print("="*70)
 
+    # Dependências de áudio só na captura: o resto do DELTA importa em qualquer
+    # máquina (com DELTA_BACKEND=simulado/replay para os sensores)
+    import audioop
+    import pyaudio
+    from vosk import Model, KaldiRecognizer
+
     with SuppressErrorOutput():
         modelo_vosk = Model(MODELO_PATH)
         reconhecedor = KaldiRecognizer(modelo_vosk, TAXA)
         audio = pyaudio.PyAudio()
-        stream = audio.open(
-            format=pyaudio.paInt16,
-            channels=1,
-            rate=TAXA,
-            input=True,
-            frames_per_buffer=BUFFER,
-        )
-
-    stream.start_stream()
-    print(f"[STATUS] Aguardando palavra-chave: '{PALAVRA_CHAVE}'")
+        captura = captura_audio.CapturaAudio(audio, TAXA, BUFFER)
+
+    carregar_historico()
+    descoberta_tuya.iniciar_revalidacao()  # IPs dos dispositivos descobertos em segundo plano
+    sensores.iniciar_amostragem()
+    telemetria_host.AMOSTRADOR.iniciar()
+    perfilador.iniciar_socket()
+    metricas_http.registrar_coletor(sensores.familias_metricas)
+    metricas_http.registrar_coletor(fila_comandos.familias_metricas)
+    metricas_http.registrar_coletor(telemetria_host.familias_metricas)
+    metricas_http.registrar_coletor(captura.familias_metricas)
+    metricas_http.iniciar()
+    if termostato.ATIVO:
+        controle_clima.iniciar()
+    captura.iniciar()
     if led:
         led.estado_ouvindo_keyword()
 
@@ -581,26 +797,34 @@ def main():
     tempo_inicio_captura = 0.0
 
     try:
+        if usar_async:
+            import pipeline_async
+            pipeline_async.executar(sys.modules[__name__], captura, reconhecedor)
+            return
+
+        print(f"[STATUS] Aguardando palavra-chave: '{PALAVRA_CHAVE}'")
         while True:
-            dados = stream.read(4000, exception_on_overflow=False)
+            dados = captura.ler()
+            captura.verificar()
 
             if not ouvindo_comando:
-                if reconhecedor.AcceptWaveform(dados):
+                if captura.decodificar(reconhecedor, dados):
                     resultado = json.loads(reconhecedor.Result())
                     texto = resultado.get("text", "").lower()
                     if PALAVRA_CHAVE in texto:
                         print("[STATUS] Palavra-chave detectada. Aguardando comando...")
-                        metricas.reset()
+                        metricas = metricas_latencia.Requisicao()
                         metricas.marcar_keyword()
                         ouvindo_comando = True
                         ultimo_tempo_voz = time.time()
                         tempo_inicio_captura = time.time()
                         reconhecedor.Reset()
+                        captura.iniciar_frase()
                         if led:
                             led.estado_keyword_detectada()
                 continue
 
-            reconhecedor.AcceptWaveform(dados)
+            captura.decodificar(reconhecedor, dados)
 
             if audioop.rms(dados, 2) > LIMIAR_RUIDO:
                 ultimo_tempo_voz = time.time()
@@ -608,12 +832,11 @@ def main():
             tempo_decorrido = time.time() - tempo_inicio_captura
             if tempo_decorrido > TEMPO_MAXIMO_CAPTURA:
                 print(f"[INFO] Limite de tempo atingido ({TEMPO_MAXIMO_CAPTURA}s). Processando...")
-                resultado_final = json.loads(reconhecedor.FinalResult())
-                comando = resultado_final.get("text", "").strip()
+                comando = captura.concluir_frase(reconhecedor)
 
                 if comando:
                     print(f"[USER] {comando}")
-                    stream.stop_stream()
+                    captura.pausar()
 
                     if led:
                         led.estado_processando_slm()
@@ -622,7 +845,7 @@ def main():
 
                     if led:
                         led.estado_ouvindo_keyword()
-                    stream.start_stream()
+                    captura.retomar()
                 else:
                     print("[INFO] Nenhum comando detectado apos limite de tempo.")
                     print("-" * 40)
@@ -635,12 +858,11 @@ def main():
                 continue
 
             if (time.time() - ultimo_tempo_voz) > TEMPO_SILENCIO:
-                resultado_final = json.loads(reconhecedor.FinalResult())
-                comando = resultado_final.get("text", "").strip()
+                comando = captura.concluir_frase(reconhecedor)
 
                 if comando:
                     print(f"[USER] {comando}")
-                    stream.stop_stream()
+                    captura.pausar()
 
                     if led:
                         led.estado_processando_slm()
@@ -649,7 +871,7 @@ def main():
 
                     if led:
                         led.estado_ouvindo_keyword()
-                    stream.start_stream()
+                    captura.retomar()
                 else:
                     print("[INFO] Nenhum comando detectado. Cancelando.")
                     print("-" * 40)
@@ -665,8 +887,7 @@ def main():
     finally:
         with SuppressErrorOutput():
             try:
-                stream.stop_stream()
-                stream.close()
+                captura.fechar()
             except Exception:
                 pass
             try:
@@ -674,6 +895,11 @@ def main():
             except Exception:
                 pass
 
+        controle_clima.parar()
+        fila_comandos.fechar()
+        sensores.parar_amostragem()
+        metricas_http.parar()
+        metricas_latencia.AGREGADOR.fechar()
         if led:
             led.parar()
         print("[INFO] Sistema finalizado.")
@@ -0,0 +1,131 @@
+"""
+Percentis de latência do pipeline de voz numa janela de tempo, a partir dos
+logs gravados por metricas_latencia.py.
+
+    python3 delta_stats.py                    # últimas 24 h
+    python3 delta_stats.py 7d --rota tools
+    python3 delta_stats.py --desde "2025-01-01 08:00" --ate "2025-01-01 18:00"
+    python3 delta_stats.py --host normal      # só comandos sem throttling/saturação
+"""
+
+import sys
+import time
+import argparse
+from collections import Counter
+
+import metricas_latencia
+from metricas_latencia import ETAPAS, PERCENTIS, HistogramaStreaming
+
+UNIDADES = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _duracao(texto: str) -> float:
+    """'90m', '24h', '7d' -> segundos."""
+    try:
+        return float(texto[:-1]) * UNIDADES[texto[-1]]
+    except (KeyError, ValueError, IndexError):
+        raise argparse.ArgumentTypeError(f"janela invalida: '{texto}' (ex: 30m, 24h, 7d)")
+
+
+def _instante(texto: str) -> float:
+    """'2025-01-01', '2025-01-01 08:00' ou '2025-01-01 08:00:00' (hora local) -> epoch."""
+    for formato in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            return time.mktime(time.strptime(texto, formato))
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"data invalida: '{texto}' (ex: 2025-01-01 08:00)")
+
+
+# Campos de metricas_latencia.desempenho_ollama resumidos na segunda tabela
+CAMPOS_OLLAMA = ("carga_ms", "prompt_tokens", "prefill_ms", "prefill_ms_por_token",
+                 "gerados_tokens", "decode_tok_s", "sobrecarga_ms")
+
+
+def _condicao(registro: dict) -> str:
+    """Condição do host no comando (registros sem telemetria contam como "sem dados")."""
+    host = registro.get("host")
+    if not host:
+        return "sem dados"
+    return "limitado" if host.get("limitado") else "normal"
+
+
+def agregar(t0: float, t1: float, rota: str | None = None,
+            diretorio: str = metricas_latencia.DIRETORIO_LOG, host: str | None = None) -> tuple:
+    """
+    ({(rota, etapa): HistogramaStreaming}, {(rota, campo ollama): HistogramaStreaming},
+    {(rota, condição do host): HistogramaStreaming do total}, Counter de motivos) da janela.
+    """
+    etapas_h, ollama_h, host_h, motivos = {}, {}, {}, Counter()
+    for registro in metricas_latencia.registros(t0, t1, diretorio=diretorio):
+        r, etapas, ollama = registro["rota"], registro["etapas"], registro.get("ollama", {})
+        condicao = _condicao(registro)
+        if (rota and r != rota) or (host and condicao != host):
+            continue
+        for etapa, ms in etapas.items():
+            etapas_h.setdefault((r, etapa), HistogramaStreaming()).adicionar(ms)
+        for campo in CAMPOS_OLLAMA:
+            if campo in ollama:
+                ollama_h.setdefault((r, campo), HistogramaStreaming()).adicionar(ollama[campo])
+        if "total" in etapas:
+            host_h.setdefault((r, condicao), HistogramaStreaming()).adicionar(etapas["total"])
+        motivos.update(registro.get("host", {}).get("motivos", ()))
+    return etapas_h, ollama_h, host_h, motivos
+
+
+def _tabela(histogramas: dict, ordem: tuple, titulo: str):
+    posicao = {nome: i for i, nome in enumerate(ordem)}
+    cabecalho = f"{'rota':<17} {titulo:<21} {'n':>6} " + " ".join(f"{f'p{q}':>9}" for q in PERCENTIS) + f" {'max':>9}"
+    print(cabecalho)
+    print("-" * len(cabecalho))
+    rota_anterior = None
+    for (rota, nome), h in sorted(histogramas.items(), key=lambda kv: (kv[0][0], posicao.get(kv[0][1], 99))):
+        if rota_anterior is not None and rota != rota_anterior:
+            print()
+        rota_anterior = rota
+        valores = " ".join(f"{h.percentil(q):>9.2f}" for q in PERCENTIS)
+        print(f"{rota:<17} {nome:<21} {h.n:>6} {valores} {h.maximo:>9.2f}")
+
+
+def imprimir(etapas_h: dict, ollama_h: dict, host_h: dict, motivos: Counter, t0: float, t1: float):
+    formato = "%Y-%m-%d %H:%M"
+    print(f"Janela: {time.strftime(formato, time.localtime(t0))} -> {time.strftime(formato, time.localtime(t1))}")
+    if not etapas_h:
+        print("Nenhum comando registrado nessa janela.")
+        return
+
+    _tabela(etapas_h, ETAPAS, "etapa (ms)")
+    if ollama_h:
+        # Carga alta = modelo saindo da memória; prefill alto = prompt longo; decode baixo = CPU
+        print()
+        _tabela(ollama_h, CAMPOS_OLLAMA, "ollama")
+    if any(condicao != "sem dados" for _, condicao in host_h):
+        # Latência total separada pela condição do host: lentidão do modelo x máquina saturada
+        print()
+        _tabela(host_h, ("normal", "limitado", "sem dados"), "total por host (ms)")
+        if motivos:
+            print("Motivos de limitacao: " + ", ".join(f"{m} ({n})" for m, n in motivos.most_common()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Percentis de latencia do DELTA por rota e etapa.")
+    parser.add_argument("janela", nargs="?", type=_duracao, default=_duracao("24h"),
+                        help="ate agora (ou --ate), ex: 30m, 24h, 7d (padrao 24h)")
+    parser.add_argument("--desde", type=_instante, help="inicio da janela (hora local)")
+    parser.add_argument("--ate", type=_instante, help="fim da janela (hora local)")
+    parser.add_argument("--rota", choices=metricas_latencia.ROTAS + ("outros",))
+    parser.add_argument("--host", choices=("normal", "limitado"),
+                        help="so comandos com o host normal ou limitado (throttling, memoria, swap)")
+    parser.add_argument("--dir", default=metricas_latencia.DIRETORIO_LOG, help="diretorio dos logs")
+    args = parser.parse_args(argv)
+
+    t1 = args.ate if args.ate is not None else time.time()
+    t0 = args.desde if args.desde is not None else t1 - args.janela
+    if t0 >= t1:
+        parser.error("o inicio da janela precisa ser antes do fim")
+
+    imprimir(*agregar(t0, t1, args.rota, args.dir, args.host), t0, t1)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
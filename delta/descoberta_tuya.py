@@ -0,0 +1,252 @@
+"""
+Descoberta de dispositivos Tuya na rede local.
+
+Escuta os broadcasts UDP que os dispositivos Tuya enviam periodicamente
+(portas 6666/6667/7000) e, opcionalmente, faz uma sondagem paralela da
+sub-rede na porta 6668. O resultado (id -> ip/versão) é mantido num cache
+persistente consultado por `conectar_dispositivo`, de modo que uma troca
+de IP via DHCP não exige editar `DEVICES` nem esperar timeouts.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import select
+import ipaddress
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tinytuya
+
+# --- CONFIGURACOES ---
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_descoberta.json")
+PORTAS_BROADCAST = (6666, 6667, 7000)
+PORTA_TUYA = 6668
+TEMPO_ESCUTA = 6.0            # Dispositivos anunciam a cada ~5 s
+INTERVALO_REVALIDACAO = 300.0  # Revalidação do cache em segundo plano (s)
+TIMEOUT_SONDAGEM = 0.3
+WORKERS_SONDAGEM = 64
+
+_lock = threading.Lock()
+_cache = None
+_revalidacao = None
+_acordar = threading.Event()
+
+
+def _carregar_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(CACHE_PATH, "r", encoding="utf-8") as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _salvar_cache():
+    tmp = CACHE_PATH + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_cache, f, indent=2)
+        os.replace(tmp, CACHE_PATH)
+    except OSError as e:
+        print(f"[AVISO] Nao foi possivel salvar cache de descoberta: {e}")
+
+
+def _ip_valido(ip):
+    try:
+        ipaddress.ip_address(ip)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+
+def atualizar(encontrados: dict):
+    """Mescla {id: {"ip", "version"}} no cache e persiste se algo mudou."""
+    mudou = False
+    with _lock:
+        cache = _carregar_cache()
+        agora = time.time()
+        for dev_id, info in encontrados.items():
+            antigo = cache.get(dev_id, {})
+            novo = {"ip": info["ip"], "version": info["version"], "visto_em": agora}
+            if antigo.get("ip") != novo["ip"] or antigo.get("version") != novo["version"]:
+                mudou = True
+            cache[dev_id] = novo
+        if mudou:
+            _salvar_cache()
+    return mudou
+
+
+def invalidar(dev_id: str):
+    """Remove a entrada de um dispositivo e pede revalidação imediata."""
+    with _lock:
+        cache = _carregar_cache()
+        if cache.pop(dev_id, None) is not None:
+            _salvar_cache()
+    _acordar.set()
+
+
+def _decodificar_broadcast(dados: bytes):
+    try:
+        texto = tinytuya.decrypt_udp(dados)
+        info = json.loads(texto)
+    except Exception:
+        return None
+    dev_id = info.get("gwId") or info.get("id")
+    ip = info.get("ip")
+    if not dev_id or not _ip_valido(ip):
+        return None
+    versao = info.get("version") or "3.3"
+    return dev_id, {"ip": ip, "version": float(versao)}
+
+
+def escutar_broadcasts(tempo: float = TEMPO_ESCUTA, procurados: set | None = None) -> dict:
+    """
+    Escuta os broadcasts UDP por até `tempo` segundos.
+    Retorna antes se todos os ids em `procurados` forem encontrados.
+    """
+    socks = []
+    for porta in PORTAS_BROADCAST:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, "SO_REUSEPORT"):
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        try:
+            s.bind(("", porta))
+        except OSError as e:
+            print(f"[AVISO] Porta UDP {porta} indisponivel: {e}")
+            s.close()
+            continue
+        socks.append(s)
+
+    encontrados = {}
+    fim = time.monotonic() + tempo
+    try:
+        while socks:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                break
+            prontos, _, _ = select.select(socks, [], [], restante)
+            for s in prontos:
+                dados, _ = s.recvfrom(4096)
+                r = _decodificar_broadcast(dados)
+                if r:
+                    encontrados[r[0]] = r[1]
+            if procurados and procurados <= encontrados.keys():
+                break
+    finally:
+        for s in socks:
+            s.close()
+
+    if encontrados:
+        atualizar(encontrados)
+    return encontrados
+
+
+def _porta_aberta(ip: str) -> str | None:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.settimeout(TIMEOUT_SONDAGEM)
+        if s.connect_ex((ip, PORTA_TUYA)) == 0:
+            return ip
+    return None
+
+
+def sondar_subrede(rede: str) -> list:
+    """Sonda em paralelo todos os hosts de `rede` (ex: 192.168.0.0/24) na porta 6668."""
+    hosts = [str(h) for h in ipaddress.ip_network(rede, strict=False).hosts()]
+    with ThreadPoolExecutor(max_workers=WORKERS_SONDAGEM) as pool:
+        return [ip for ip in pool.map(_porta_aberta, hosts) if ip]
+
+
+def identificar(candidatos: list, dispositivos: dict) -> dict:
+    """
+    Para dispositivos que não anunciam via broadcast, tenta `status()` com a
+    chave local de cada um em cada IP candidato (em paralelo).
+    """
+    def tentar(par):
+        cfg, ip = par
+        dev = tinytuya.OutletDevice(cfg["id"], ip, cfg["key"])
+        dev.set_version(cfg["version"])
+        dev.set_socketTimeout(1.0)
+        dev.set_socketRetryLimit(1)
+        resp = dev.status()
+        if isinstance(resp, dict) and "dps" in resp:
+            return cfg["id"], {"ip": ip, "version": cfg["version"]}
+        return None
+
+    pares = [(cfg, ip) for cfg in dispositivos.values() for ip in candidatos]
+    encontrados = {}
+    with ThreadPoolExecutor(max_workers=min(WORKERS_SONDAGEM, max(1, len(pares)))) as pool:
+        for r in pool.map(tentar, pares):
+            if r and r[0] not in encontrados:
+                encontrados[r[0]] = r[1]
+    if encontrados:
+        atualizar(encontrados)
+    return encontrados
+
+
+def _loop_revalidacao():
+    # Primeira escuta logo na partida; depois a cada INTERVALO_REVALIDACAO ou
+    # quando um cache miss/invalidação acorda a thread
+    while True:
+        try:
+            escutar_broadcasts()
+        except Exception as e:
+            print(f"[AVISO] Revalidacao de IPs falhou: {e}")
+        _acordar.wait(INTERVALO_REVALIDACAO)
+        _acordar.clear()
+
+
+def iniciar_revalidacao():
+    """Inicia (uma única vez) a thread de revalidação do cache; a primeira escuta é imediata."""
+    global _revalidacao
+    with _lock:
+        if _revalidacao is None:
+            _revalidacao = threading.Thread(target=_loop_revalidacao, name="descoberta-tuya", daemon=True)
+            _revalidacao.start()
+
+
+def resolver(dev_id: str, ip_padrao: str, versao_padrao: float):
+    """
+    Retorna (ip, versão) para o dispositivo sem bloquear: cache -> IP
+    configurado em DEVICES. Num cache miss a escuta de broadcasts (TEMPO_ESCUTA)
+    roda na thread de revalidação, fora do caminho da escrita; as próximas
+    escritas já saem com o IP descoberto.
+    """
+    iniciar_revalidacao()
+    with _lock:
+        info = _carregar_cache().get(dev_id)
+    if info:
+        return info["ip"], info["version"]
+    _acordar.set()
+    return ip_padrao, versao_padrao
+
+
+def main():
+    from controle_tuya import DEVICES
+
+    print("Escutando broadcasts Tuya...")
+    ids = {cfg["id"] for cfg in DEVICES.values()}
+    encontrados = escutar_broadcasts(procurados=ids)
+
+    if len(sys.argv) > 1:
+        faltando = {n: cfg for n, cfg in DEVICES.items() if cfg["id"] not in encontrados}
+        if faltando:
+            print(f"Sondando sub-rede {sys.argv[1]}...")
+            candidatos = sondar_subrede(sys.argv[1])
+            encontrados.update(identificar(candidatos, faltando))
+
+    for nome, cfg in DEVICES.items():
+        info = encontrados.get(cfg["id"])
+        if info:
+            print(f"  {nome:<12} {info['ip']:<16} v{info['version']}")
+        else:
+            print(f"  {nome:<12} nao encontrado")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,54 @@
 import time
-from controle_tuya import conectar_dispositivo, DPS_MAP 
+import fila_comandos
+import rastreamento
+from escrita_pipeline import reconciliar
+from registro_dispositivos import REGISTRO
 
-# Modos e velocidades que realmente afetam o ar
-VALID_MODES = {"cold", "wet", "wind", "auto"}
-VALID_WIND  = {"auto", "mute", "low", "mid", "high"}
+# Codecs compilados (validação/codificação/limites vêm do registro)
+AR = REGISTRO["ar"]
+INTERRUPTOR = REGISTRO["interruptor"]
+LAMPADA = REGISTRO["lampada"]
 
-# Velocidades válidas para o ventilador de teto
-VALID_FAN_SPEEDS = {"level_1", "level_2", "level_3", "level_4", "level_5"}
+def _enviar(nome: str, frame: dict, changes: dict, pendentes: list):
+    """
+    Envia o frame pela fila do dispositivo (escritas concorrentes ao mesmo DPS
+    são mescladas, a última vence) e reporta quantas foram mescladas.
+    No modo pipeline a confirmação fica em `pendentes` para `_concluir`.
+    Falhas (exceção na fila ou "Err" do dispositivo) vão para changes["errors"]:
+    quem chama não deve reportar a escrita como feita.
+    """
+    if not frame:
+        return
+    with rastreamento.span("tuya.enviar", dispositivo=nome, dps=list(frame)) as s:
+        resultado = fila_comandos.enviar(nome, frame)
+        s.definir(coalescidas=resultado.get("coalescidas", 0))
+        erro = resultado.get("erro")
+        resposta = resultado.get("resposta")
+        if erro is None and isinstance(resposta, dict) and "Err" in resposta:
+            erro = f"Err {resposta['Err']}: {resposta.get('Error', '')}".rstrip(": ")
+        if erro is not None:
+            s.definir(erro=erro)
+            changes.setdefault("errors", []).append(f"{nome} DPS {sorted(frame)}: {erro}")
+    if resultado.get("coalescidas"):
+        changes["coalesced"] = changes.get("coalesced", 0) + resultado["coalescidas"]
+    if "pendente" in resultado:
+        pendentes.append(resultado["pendente"])
+
+def _concluir(changes: dict, pendentes: list) -> dict:
+    """Aguarda (uma única vez, com prazo) as confirmações das escritas em pipeline."""
+    if not pendentes:
+        return changes
+    with rastreamento.span("tuya.confirmar", frames=len(pendentes)) as s:
+        changes = reconciliar(changes, pendentes, fila_comandos.PRAZO_CONFIRMACAO)
+        s.definir(confirmado=changes.get("confirmed"))
+    return changes
 
+def _esperar(segundos: float, motivo: str):
+    """Espera fixa entre escritas (o dispositivo precisa de tempo após ligar)."""
+    with rastreamento.span("espera_fixa", segundos=segundos, motivo=motivo):
+        time.sleep(segundos)
+
+@rastreamento.rastrear()
 def set_ac_state(
     power: bool = True,
     target_temp_c = None,
@@ -22,41 +63,38 @@ def set_ac_state(
     Controla o ar-condicionado de forma geral.
     Só aplica os parâmetros que forem diferentes de None.
     """
-    dev = conectar_dispositivo("ar")
     changes: dict = {}
+    pendentes: list = []
+    frame: dict = {}
 
-    # Liga/desliga
+    # Liga/desliga (enviado sozinho: o AC precisa de tempo antes dos demais DPS)
     if power is not None:
         p = bool(power)
-        dev.set_value(int(DPS_MAP["ar"]["switch"]), p)
+        _enviar("ar", {AR["switch"].dps: p}, changes, pendentes)
         changes["power"] = p
-        
+
         if p is True:
-            time.sleep(1.5)
+            _esperar(1.5, "ar ligando")
 
-    # Temperatura alvo (16–30 °C, protocolo usa valor*10)
+    # Temperatura alvo (limitada à faixa do registro, protocolo usa valor*10)
     if target_temp_c is not None:
-        t = float(target_temp_c)
-        t = round(t)
-        if t < 16:
-            t = 16
-        if t > 30:
-            t = 30
-        dev.set_value(int(DPS_MAP["ar"]["temp"]), t * 10)
-        changes["target_temp_c"] = t
+        t = AR["temp"].limitar(target_temp_c)
+        if t is not None:
+            frame[AR["temp"].dps] = t
+            changes["target_temp_c"] = AR["temp"].decodificar(t)
 
     # Modo de operação
     if mode is not None:
-        m = str(mode).lower()
-        if m in VALID_MODES:
-            dev.set_value(int(DPS_MAP["ar"]["mode"]), m)
+        m = AR["mode"].codificar(mode)
+        if m is not None:
+            frame[AR["mode"].dps] = m
             changes["mode"] = m
 
     # Velocidade do vento
     if wind is not None:
-        w = str(wind).lower()
-        if w in VALID_WIND:
-            dev.set_value(int(DPS_MAP["ar"]["wind"]), w)
+        w = AR["wind"].codificar(wind)
+        if w is not None:
+            frame[AR["wind"].dps] = w
             changes["wind"] = w
 
     # Booleanos auxiliares
@@ -64,7 +102,7 @@ def set_ac_state(
         if value is None:
             return
         b = bool(value)
-        dev.set_value(int(DPS_MAP["ar"][dps_key]), b)
+        frame[AR[dps_key].dps] = b
         changes[field] = b
 
     _set_bool("eco",    eco,    "eco")
@@ -72,8 +110,12 @@ def set_ac_state(
     _set_bool("swing",  swing,  "swing")
     _set_bool("health", health, "health")
 
-    return changes
+    # Demais parâmetros num único frame
+    _enviar("ar", frame, changes, pendentes)
+
+    return _concluir(changes, pendentes)
 
+@rastreamento.rastrear()
 def set_fan_state(power: bool = True, speed: str | int | None = None) -> dict:
     """
     Liga/desliga o ventilador de teto (interruptor Tuya) e opcionalmente ajusta a velocidade.
@@ -85,57 +127,29 @@ def set_fan_state(power: bool = True, speed: str | int | None = None) -> dict:
     Returns:
         dict com as mudanças aplicadas
     """
-    dev = conectar_dispositivo("interruptor")
     changes: dict = {}
+    pendentes: list = []
 
     # Liga/desliga o ventilador
     if power is not None:
         p = bool(power)
-        dev.set_value(int(DPS_MAP["interruptor"]["ventilador"]), p)
+        _enviar("interruptor", {INTERRUPTOR["ventilador"].dps: p}, changes, pendentes)
         changes["power"] = p
 
         # Aguarda um pouco se estiver ligando para garantir que o comando seja processado
         if p is True and speed is not None:
-            time.sleep(0.5)
+            _esperar(0.5, "ventilador ligando")
 
-    # Ajusta a velocidade se fornecida
+    # Ajusta a velocidade se fornecida (aliases 1-5, baixo/medio/alto, level_N)
     if speed is not None:
-        # Mapeamento de valores para os níveis válidos
-        speed_map = {
-            # Números
-            1: "level_1", "1": "level_1",
-            2: "level_2", "2": "level_2",
-            3: "level_3", "3": "level_3",
-            4: "level_4", "4": "level_4",
-            5: "level_5", "5": "level_5",
-            # Strings descritivas em português
-            "baixo": "level_1", "low": "level_1",
-            "medio_baixo": "level_2",
-            "medio": "level_3", "middle": "level_3",
-            "medio_alto": "level_4",
-            "alto": "level_5", "high": "level_5",
-            # Já no formato correto
-            "level_1": "level_1",
-            "level_2": "level_2",
-            "level_3": "level_3",
-            "level_4": "level_4",
-            "level_5": "level_5",
-        }
-
-        # Converte para string se for int
-        speed_key = speed if isinstance(speed, str) else speed
-        speed_str = str(speed_key).lower()
-
-        if speed_str in speed_map:
-            final_speed = speed_map[speed_str]
-            dev.set_value(int(DPS_MAP["interruptor"]["speed"]), final_speed)
+        final_speed = INTERRUPTOR["speed"].codificar(speed)
+        if final_speed is not None:
+            _enviar("interruptor", {INTERRUPTOR["speed"].dps: final_speed}, changes, pendentes)
             changes["speed"] = final_speed
-        elif speed_str in VALID_FAN_SPEEDS:
-            dev.set_value(int(DPS_MAP["interruptor"]["speed"]), speed_str)
-            changes["speed"] = speed_str
 
-    return changes
-    
+    return _concluir(changes, pendentes)
+
+@rastreamento.rastrear()
 def set_ceiling_lamp_state(power: bool) -> dict:
     """
     Liga/desliga a lâmpada do ventilador de teto (luminária).
@@ -147,16 +161,17 @@ def set_ceiling_lamp_state(power: bool) -> dict:
     Returns:
         dict com as mudanças aplicadas
     """
-    dev = conectar_dispositivo("interruptor")
     changes: dict = {}
+    pendentes: list = []
 
     if power is not None:
         p = bool(power)
-        dev.set_value(int(DPS_MAP["interruptor"]["lamp"]), p)
+        _enviar("interruptor", {INTERRUPTOR["lamp"].dps: p}, changes, pendentes)
         changes["power"] = p
 
-    return changes
+    return _concluir(changes, pendentes)
 
+@rastreamento.rastrear()
 def set_lamp_state(
     power: bool | None = None,
     mode: str | None = None,
@@ -180,100 +195,53 @@ def set_lamp_state(
         dict com as mudanças aplicadas
     """
     changes: dict = {}
+    pendentes: list = []
 
     # Primeiro, controla a alimentação via interruptor se necessário
     if power is not None:
-        interruptor_dev = conectar_dispositivo("interruptor")
         p = bool(power)
-        interruptor_dev.set_value(int(DPS_MAP["interruptor"]["lamp"]), p)
+        _enviar("interruptor", {INTERRUPTOR["lamp"].dps: p}, changes, pendentes)
         changes["power"] = p
 
         # Aguarda para garantir que a lâmpada esteja energizada
         if p is True:
-            time.sleep(0.8)
+            _esperar(0.8, "lampada energizando")
 
-    # Agora controla os parâmetros da lâmpada RGB
-    dev = conectar_dispositivo("lampada")
+    # Agora controla os parâmetros da lâmpada RGB (tudo num único frame)
+    frame: dict = {}
+    work_mode = LAMPADA["work_mode"]
 
-    # Modo pré-configurado
+    # Modo pré-configurado (presets "dia"/"noite" do registro)
     if mode is not None:
-        mode_str = str(mode).lower()
-
-        # Modos pré-definidos
-        if mode_str in ("dia", "day", "branco", "white"):
-            # Modo dia: branco frio máximo
-            dev.set_value(21, "white")
-            dev.set_value(22, 1000)
-            dev.set_value(23, 1000)
-            changes["mode"] = "dia"
-            changes["brightness"] = 1000
-            changes["temperature"] = 1000
-
-        elif mode_str in ("noite", "night", "amarelo", "laranja", "warm"):
-            # Modo noite: amarelo médio
-            dev.set_value(21, "white")
-            dev.set_value(22, 450)
-            dev.set_value(23, 100)
-            changes["mode"] = "noite"
-            changes["brightness"] = 450
-            changes["temperature"] = 100
-
-    # Brilho individual
+        preset = LAMPADA["modo"].codificar(mode)
+        if preset is not None:
+            frame.update(preset)
+            changes["mode"] = LAMPADA["modo"].mapa[str(mode).lower()]
+            changes["brightness"] = preset[LAMPADA["brilho"].dps]
+            changes["temperature"] = preset[LAMPADA["temp"].dps]
+
+    # Brilho individual (1-100 vira %, limitado a 10-1000)
     if brightness is not None:
-        b = int(brightness)
-
-        # Se valor entre 1-100, considera porcentagem e multiplica por 10
-        if 1 <= b <= 100:
-            b = b * 10
-
-        # Valida range 10-1000
-        if b < 10:
-            b = 10
-        if b > 1000:
-            b = 1000
-
-        # Define work_mode como white se não estiver setado
-        if "mode" not in changes:
-            dev.set_value(21, "white")
+        b = LAMPADA["brilho"].limitar(brightness)
+        if b is not None:
+            # Define work_mode como white se não estiver setado
+            if "mode" not in changes:
+                frame[work_mode.dps] = "white"
 
-        dev.set_value(22, b)
-        changes["brightness"] = b
+            frame[LAMPADA["brilho"].dps] = b
+            changes["brightness"] = b
 
-    # Temperatura de cor
+    # Temperatura de cor (nomes ou 0-1000, limitado)
     if temperature is not None:
-        temp_map = {
-            "quente": 0,
-            "warm": 0,
-            "amarelo": 0,
-            "frio": 1000,
-            "cold": 1000,
-            "branco": 1000,
-        }
-
-        if isinstance(temperature, str):
-            temp_str = temperature.lower()
-            if temp_str in temp_map:
-                t = temp_map[temp_str]
-            else:
-                try:
-                    t = int(temperature)
-                except ValueError:
-                    t = None
-        else:
-            t = int(temperature)
-
+        t = LAMPADA["temp"].limitar(temperature)
         if t is not None:
-            # Valida range 0-1000
-            if t < 0:
-                t = 0
-            if t > 1000:
-                t = 1000
-
             # Define work_mode como white se não estiver setado
             if "mode" not in changes:
-                dev.set_value(21, "white")
+                frame[work_mode.dps] = "white"
 
-            dev.set_value(23, t)
+            frame[LAMPADA["temp"].dps] = t
             changes["temperature"] = t
 
-    return changes
\ No newline at end of file
+    _enviar("lampada", frame, changes, pendentes)
+
+    return _concluir(changes, pendentes)
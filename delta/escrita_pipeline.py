@@ -0,0 +1,195 @@
+"""
+Escrita em pipeline para dispositivos Tuya.
+
+Mantém uma conexão persistente por dispositivo: os frames são enviados sem
+esperar resposta (nowait) e uma thread leitora coleta as confirmações e os
+pushes de status, conciliando o valor reportado de cada DPS com o que foi
+enviado. Quem escreveu só espera uma vez, no final, por todas as
+confirmações (com prazo), em vez de um RTT por escrita.
+"""
+
+import time
+import select
+import threading
+
+from controle_tuya import conectar_dispositivo, verificar_resposta
+
+TIMEOUT_LEITURA = 1.0  # Timeout do receive() da thread leitora (s)
+COMANDOS_CONTROLE = (7, 13)  # CONTROL e CONTROL_NEW do protocolo Tuya: o ack ecoa o seqno enviado
+
+
+class Pendente:
+    """Frame enviado aguardando confirmação de cada DPS."""
+
+    __slots__ = ("seq", "frame", "faltando", "erro", "evento", "_lock")
+
+    def __init__(self, seq: int, frame: dict, lock: threading.Lock):
+        self.seq = seq
+        self.frame = frame
+        self.faltando = set(frame)
+        self.erro = None
+        self.evento = threading.Event()
+        self._lock = lock  # O da conexão, que protege `faltando`
+
+    def aguardar(self, prazo: float) -> set:
+        """Espera até `prazo` segundos; retorna os DPS ainda não confirmados."""
+        self.evento.wait(max(0.0, prazo))
+        with self._lock:
+            return set(self.faltando)
+
+
+class ConexaoPipeline:
+    """
+    Conexão persistente com envio sem espera e leitor de confirmações.
+
+    O socket do tinytuya não é thread-safe: envio e leitura passam pelo mesmo
+    lock, e o leitor só o pega depois que select() indica dados, para não
+    segurar os envios durante a espera. Como receive() não expõe o seqno, o
+    leitor usa _receive()/_process_message() do tinytuya (mensagem crua +
+    decodificação). Até o protocolo 3.4 só o ack do comando de controle,
+    casado pelo seqno, confirma um frame; pushes de status só atualizam o
+    estado reportado. No 3.5 o ack traz um seqno global e a confirmação é
+    por valor, cada DPS reportado valendo só para o frame mais antigo que o
+    espera (dois frames iguais em voo não se confirmam com uma mensagem só).
+    """
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self.dev = conectar_dispositivo(nome)
+        self.dev.set_socketPersistent(True)
+        self.dev.set_socketTimeout(TIMEOUT_LEITURA)
+        self._lock = threading.Lock()       # Pendentes e estado reportado
+        self._socket = threading.Lock()     # Acesso ao socket do dispositivo
+        self._conectado = threading.Event()
+        self._por_seq = float(getattr(self.dev, "version", 3.3)) < 3.5
+        self._pendentes = []
+        self.reportado = {}
+        self._ativo = True
+        self._leitor = threading.Thread(target=self._ler, name=f"pipeline-{nome}", daemon=True)
+        self._leitor.start()
+
+    def enviar(self, frame: dict) -> Pendente:
+        """Envia o frame sem esperar resposta e registra o número de sequência."""
+        with self._socket:
+            if len(frame) == 1:
+                dps, valor = next(iter(frame.items()))
+                resp = self.dev.set_value(dps, valor, nowait=True)
+            else:
+                resp = self.dev.set_multiple_values(frame, nowait=True)
+            # O seqno é incrementado ao codificar a mensagem (e pela negociação de
+            # sessão na primeira conexão): o do frame é o último usado
+            pendente = Pendente(self.dev.seqno - 1, frame, self._lock)
+            with self._lock:
+                self._pendentes.append(pendente)
+        self._conectado.set()
+        if isinstance(resp, dict) and "Err" in resp:
+            self._falhar(pendente, f"Err {resp['Err']}: {resp.get('Error', '')}".rstrip(": "))
+        verificar_resposta(self.nome, resp)
+        return pendente
+
+    def _falhar(self, pendente: Pendente, erro: str):
+        with self._lock:
+            pendente.erro = erro
+            if pendente in self._pendentes:
+                self._pendentes.remove(pendente)
+        pendente.evento.set()
+
+    def _confirmar_seq(self, seq: int, retcode):
+        with self._lock:
+            pendente = next((p for p in self._pendentes if p.seq == seq), None)
+            if pendente is None:
+                return
+            self._pendentes.remove(pendente)
+            if retcode:
+                pendente.erro = f"retcode {retcode}"
+            else:
+                pendente.faltando.clear()
+        pendente.evento.set()
+
+    def _conciliar(self, dps: dict):
+        with self._lock:
+            for k, v in dps.items():
+                k = int(k)
+                self.reportado[k] = v
+                if self._por_seq:
+                    continue
+                for p in self._pendentes:
+                    if k in p.faltando and p.frame[k] == v:
+                        p.faltando.discard(k)
+                        break
+            restantes = []
+            for p in self._pendentes:
+                if p.faltando:
+                    restantes.append(p)
+                else:
+                    p.evento.set()
+            self._pendentes = restantes
+
+    def _aguardar_dados(self) -> bool:
+        sock = getattr(self.dev, "socket", None)
+        if sock is None:
+            # Conexão persistente só abre no envio (o tinytuya zera o socket quando
+            # ela cai): espera o próximo envio em vez de girar no loop
+            self._conectado.clear()
+            if self._ativo and getattr(self.dev, "socket", None) is None:
+                self._conectado.wait(TIMEOUT_LEITURA)
+            return False
+        try:
+            prontos, _, _ = select.select([sock], [], [], TIMEOUT_LEITURA)
+        except (OSError, ValueError):
+            time.sleep(TIMEOUT_LEITURA)  # Socket fechado/reaberto pelo tinytuya
+            return False
+        return bool(prontos)
+
+    def _ler(self):
+        while self._ativo:
+            if not self._aguardar_dados():
+                continue
+            with self._socket:
+                try:
+                    msg = self.dev._receive()
+                    resposta = self.dev._process_message(msg)
+                except Exception:
+                    msg = None
+            if msg is None:
+                time.sleep(TIMEOUT_LEITURA)
+                continue
+            if self._por_seq and msg.cmd in COMANDOS_CONTROLE:
+                self._confirmar_seq(msg.seqno, msg.retcode)
+            if not isinstance(resposta, dict):
+                continue
+            dps = resposta.get("dps")
+            if not isinstance(dps, dict) and isinstance(resposta.get("data"), dict):
+                dps = resposta["data"].get("dps")
+            if isinstance(dps, dict):
+                self._conciliar(dps)
+            elif "Err" in resposta:
+                verificar_resposta(self.nome, resposta)
+                time.sleep(TIMEOUT_LEITURA)
+
+    def fechar(self):
+        """Encerra a leitora e fecha a conexão persistente."""
+        self._ativo = False
+        self._conectado.set()
+        with self._socket:
+            self.dev.close()
+        self._leitor.join(timeout=2 * TIMEOUT_LEITURA)
+
+
+def reconciliar(changes: dict, pendentes: list, prazo: float) -> dict:
+    """
+    Espera as confirmações de todos os frames até um prazo final único e
+    registra em `changes` se tudo foi confirmado (e quais DPS não foram).
+    """
+    if not pendentes:
+        return changes
+    fim = time.monotonic() + prazo
+    faltando = set()
+    for p in pendentes:
+        faltando |= p.aguardar(fim - time.monotonic())
+        if p.erro:
+            changes.setdefault("errors", []).append(f"DPS {sorted(p.frame)}: {p.erro}")
+    changes["confirmed"] = not faltando and "errors" not in changes
+    if faltando:
+        changes["unconfirmed_dps"] = sorted(faltando)
+    return changes
@@ -0,0 +1,195 @@
+"""
+Fila de comandos por dispositivo Tuya.
+
+Cada dispositivo tem uma única thread escritora, então escritas vindas de
+threads diferentes (voz, automações, cenas) nunca se cruzam no mesmo
+dispositivo. Escritas pendentes para o mesmo DPS são mescladas (a última
+vence) e o que estiver pendente é enviado num único frame.
+
+Só se mescla o que chega enquanto há escrita pendente (JANELA_COALESCENCIA
+ou o envio anterior em andamento); comandos sequenciais com ~1 s entre si
+vão os dois ao dispositivo.
+"""
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+
+import metricas_http
+import rastreamento
+from controle_tuya import conectar_dispositivo, verificar_resposta
+from escrita_pipeline import ConexaoPipeline
+
+# Tempo que o escritor espera, após a primeira escrita, por outras para mesclar (s)
+JANELA_COALESCENCIA = 0.02
+
+# Escrita em pipeline: envia sem esperar a resposta e confirma depois (escrita_pipeline.py);
+# também com DELTA_PIPELINE_TUYA=1 ou python3 delta.py --pipeline-tuya
+MODO_PIPELINE = os.environ.get("DELTA_PIPELINE_TUYA", "0") == "1"
+PRAZO_CONFIRMACAO = 2.0  # Prazo final para confirmar todas as escritas de um comando (s)
+
+
+class FilaDispositivo:
+    """Fila latest-wins de escritas de DPS para um dispositivo."""
+
+    def __init__(self, nome: str):
+        self.nome = nome
+        self._cond = threading.Condition()
+        self._pendente = {}
+        self._futuros = []
+        self._fluxos = []
+        self._coalescidas = 0
+        self.total_escritas = 0
+        self.total_coalescidas = 0
+        self.total_frames = 0
+        self._pipeline = None
+        self._dev = None                        # Conexão preparada por aquecer(), usada no próximo envio
+        self._lock_conexao = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name=f"fila-{nome}", daemon=True)
+        self._thread.start()
+
+    def enviar(self, frame: dict, esperar: bool = True):
+        """
+        Enfileira {dps: valor}. Com `esperar`, bloqueia até o frame mesclado ser
+        enviado e retorna o resultado; senão retorna o Future.
+        """
+        futuro = Future()
+        with self._cond:
+            for dps, valor in frame.items():
+                if dps in self._pendente:
+                    self._coalescidas += 1
+                    # Reinsere no fim para manter a ordem da escrita mais recente
+                    del self._pendente[dps]
+                self._pendente[dps] = valor
+            self.total_escritas += len(frame)
+            self._futuros.append(futuro)
+            fluxo = rastreamento.iniciar_fluxo()
+            if fluxo is not None:
+                self._fluxos.append(fluxo)
+            self._cond.notify()
+        return futuro.result() if esperar else futuro
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._pendente:
+                    self._cond.wait()
+            time.sleep(JANELA_COALESCENCIA)
+            with self._cond:
+                frame, futuros, coalescidas = self._pendente, self._futuros, self._coalescidas
+                fluxos = self._fluxos
+                self._pendente, self._futuros, self._coalescidas, self._fluxos = {}, [], 0, []
+                self.total_coalescidas += coalescidas
+                self.total_frames += 1
+
+            t0 = time.perf_counter()
+            with rastreamento.span("tuya.frame", dispositivo=self.nome, dps=list(frame),
+                                   coalescidas=coalescidas, pipeline=MODO_PIPELINE) as s:
+                for fluxo in fluxos:
+                    rastreamento.concluir_fluxo(fluxo)
+                if rastreamento.ativo():
+                    s.definir(bytes=len(json.dumps(frame)))
+                try:
+                    resultado = {"frame": frame, "coalescidas": coalescidas}
+                    if MODO_PIPELINE:
+                        resultado["pendente"] = self._enviar_pipeline(frame)
+                    else:
+                        resultado["resposta"] = self._flush(frame)
+                        if isinstance(resultado["resposta"], dict) and "Err" in resultado["resposta"]:
+                            metricas_http.ERROS_TUYA.inc(1, self.nome)
+                except Exception as e:
+                    resultado = {"frame": frame, "coalescidas": coalescidas, "erro": str(e)}
+                    metricas_http.ERROS_TUYA.inc(1, self.nome)
+                    s.definir(erro=str(e))
+            metricas_http.ESCRITA_TUYA.observar(time.perf_counter() - t0, self.nome)
+            for f in futuros:
+                f.set_result(resultado)
+
+    def aquecer(self):
+        """
+        Prepara a conexão (resolução do IP, objeto do dispositivo e, no modo
+        pipeline, a conexão persistente) antes da escrita, para rodar em
+        paralelo com o SLM em vez de no caminho do comando.
+        """
+        with rastreamento.span("tuya.aquecer", dispositivo=self.nome), self._lock_conexao:
+            if MODO_PIPELINE:
+                if self._pipeline is None:
+                    self._pipeline = ConexaoPipeline(self.nome)
+            elif self._dev is None:
+                self._dev = conectar_dispositivo(self.nome)
+
+    def _flush(self, frame: dict):
+        with self._lock_conexao:
+            dev, self._dev = self._dev, None
+        dev = dev or conectar_dispositivo(self.nome)
+        if len(frame) == 1:
+            dps, valor = next(iter(frame.items()))
+            resp = dev.set_value(dps, valor)
+        else:
+            resp = dev.set_multiple_values(frame)
+        return verificar_resposta(self.nome, resp)
+
+    def _enviar_pipeline(self, frame: dict):
+        with self._lock_conexao:
+            if self._pipeline is None:
+                self._pipeline = ConexaoPipeline(self.nome)
+        return self._pipeline.enviar(frame)
+
+    def fechar(self):
+        """Fecha a conexão persistente do modo pipeline, se houver."""
+        with self._lock_conexao:
+            pipeline, self._pipeline = self._pipeline, None
+        if pipeline is not None:
+            pipeline.fechar()
+
+
+_filas = {}
+_lock = threading.Lock()
+
+
+def fila(nome: str) -> FilaDispositivo:
+    with _lock:
+        if nome not in _filas:
+            _filas[nome] = FilaDispositivo(nome)
+        return _filas[nome]
+
+
+def enviar(nome: str, frame: dict, esperar: bool = True):
+    """Atalho: enfileira `frame` na fila do dispositivo `nome`."""
+    return fila(nome).enviar(frame, esperar)
+
+
+def aquecer(nome: str):
+    """Atalho: prepara a conexão do dispositivo `nome` (ver FilaDispositivo.aquecer)."""
+    fila(nome).aquecer()
+
+
+def fechar():
+    """Fecha as conexões persistentes de todos os dispositivos (fim do programa)."""
+    with _lock:
+        filas = list(_filas.values())
+    for f in filas:
+        f.fechar()
+
+
+def estatisticas() -> dict:
+    """Contadores por dispositivo: escritas recebidas, frames enviados e escritas mescladas."""
+    with _lock:
+        return {
+            nome: {"escritas": f.total_escritas, "frames": f.total_frames, "coalescidas": f.total_coalescidas}
+            for nome, f in _filas.items()
+        }
+
+
+def familias_metricas() -> list:
+    """Coletor do endpoint de metricas (metricas_http)."""
+    est = estatisticas()
+    return [
+        (f"delta_tuya_{campo}_total", "counter", ajuda,
+         [({"dispositivo": nome}, e[campo]) for nome, e in est.items()])
+        for campo, ajuda in (("escritas", "Escritas de DPS recebidas pela fila"),
+                             ("frames", "Frames enviados ao dispositivo"),
+                             ("coalescidas", "Escritas mescladas com uma pendente"))
+    ]
@@ -0,0 +1,155 @@
+"""
+Fusão das leituras dos sensores em uma estimativa única de temperatura e umidade.
+
+A cada leitura publicada pela amostragem:
+  1. aplica a calibração (viés) de cada sensor;
+  2. descarta outliers pela mediana/MAD entre os sensores;
+  3. faz a média ponderada (inverso da variância de cada sensor x saúde);
+  4. suaviza com um filtro de Kalman escalar por grandeza.
+
+Tudo é feito de uma vez sobre uma matriz grandezas x sensores (NaN = ausente),
+então o custo não depende da taxa de amostragem. A saúde de cada sensor
+(0 a 1) cai quando ele é descartado como outlier ou para de responder.
+
+Todas as leituras recentes servem de referência para os outliers, mas só as
+novas desde a fusão anterior entram no filtro: republicar a leitura parada de
+um sensor não conta como uma nova observação. Sem observação há mais de
+IDADE_MAXIMA, `resultado()` devolve temp/umid None em vez do último valor.
+"""
+
+import time
+import threading
+import numpy as np
+
+SENSORES = ("AHT20", "BMP280", "DHT22")
+GRANDEZAS = ("temp", "umid")
+
+# Viés de cada sensor (somado à leitura bruta), medido contra um termômetro/higrômetro de referência
+CALIBRACAO = {
+    "AHT20": {"temp": 0.0, "umid": 0.0},
+    "BMP280": {"temp": -0.5, "umid": 0.0},  # Esquenta com o próprio regulador
+    "DHT22": {"temp": 0.0, "umid": 0.0},
+}
+
+# Desvio padrão típico da medida de cada sensor (datasheet)
+RUIDO = {
+    "AHT20": {"temp": 0.3, "umid": 2.0},
+    "BMP280": {"temp": 0.5, "umid": np.nan},
+    "DHT22": {"temp": 0.5, "umid": 2.5},
+}
+
+LIMIAR_MAD = 3.5                           # Desvios robustos acima da mediana para descartar
+SIGMA_MINIMO = {"temp": 0.4, "umid": 3.0}  # Piso do desvio robusto (sensores concordando demais)
+RUIDO_PROCESSO = {"temp": 0.02, "umid": 0.1}  # Variação real esperada por segundo (Kalman Q)
+ALFA_SAUDE = 0.1                           # Peso de cada observação na saúde (média exponencial)
+IDADE_MAXIMA = 10.0                        # Leitura mais velha que isso (s) conta como falha
+
+_VIES = np.array([[CALIBRACAO[s][g] for s in SENSORES] for g in GRANDEZAS])
+_VARIANCIA = np.array([[RUIDO[s][g] for s in SENSORES] for g in GRANDEZAS]) ** 2
+_SIGMA_MINIMO = np.array([SIGMA_MINIMO[g] for g in GRANDEZAS])
+_Q = np.array([RUIDO_PROCESSO[g] for g in GRANDEZAS]) ** 2
+
+
+def _mediana(m: np.ndarray, n: np.ndarray) -> np.ndarray:
+    """Mediana por linha ignorando NaN (np.nanmedian é lento para matrizes pequenas)."""
+    ordenado = np.sort(m, axis=1)  # NaN vai para o fim
+    baixo = np.maximum((n - 1) // 2, 0)
+    alto = np.maximum(n // 2, 0)
+    return (np.take_along_axis(ordenado, baixo, axis=1) + np.take_along_axis(ordenado, alto, axis=1)) / 2
+
+
+class FusaoSensores:
+    """Estado do filtro e da saúde dos sensores; alimentado pela thread de amostragem."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.x = np.full(len(GRANDEZAS), np.nan)   # Estimativa filtrada
+        self.p = np.full(len(GRANDEZAS), np.inf)   # Variância da estimativa
+        self.saude = np.ones(len(SENSORES))
+        self._t = None
+        self._usado = dict.fromkeys(SENSORES, -np.inf)       # Instante da última leitura fundida
+        self._observado = np.full(len(GRANDEZAS), -np.inf)   # Última atualização real do filtro
+        self._resultado = {"temp": None, "umid": None, "outliers": (), "saude": dict.fromkeys(SENSORES, 1.0)}
+
+    def _matriz(self, leituras, instantes, agora: float):
+        """(valores recentes calibrados, sensores com leitura nova desde a última fusão)."""
+        m = np.full((len(GRANDEZAS), len(SENSORES)), np.nan)
+        nova = np.zeros(len(SENSORES), dtype=bool)
+        for j, s in enumerate(SENSORES):
+            d = leituras.get(s)
+            instante = instantes.get(s, -np.inf)
+            if d is None or agora - instante > IDADE_MAXIMA:
+                continue
+            nova[j] = instante > self._usado[s]
+            self._usado[s] = instante
+            for i, g in enumerate(GRANDEZAS):
+                v = d.get(g)
+                if v is not None:
+                    m[i, j] = v
+        return m + _VIES, nova
+
+    def atualizar(self, leituras, instantes, agora: float) -> dict:
+        """
+        Funde o snapshot atual ({sensor: {grandeza: valor}}, {sensor: instante}).
+        `agora` na mesma base de tempo de `instantes` (time.monotonic()).
+        """
+        with np.errstate(all="ignore"), self._lock:
+            m, nova = self._matriz(leituras, instantes, agora)
+            presente = ~np.isnan(m)
+            n = presente.sum(axis=1, keepdims=True)
+            mediana = _mediana(m, n)
+            desvio = np.abs(m - mediana)
+            sigma = np.maximum(1.4826 * _mediana(desvio, n)[:, 0], _SIGMA_MINIMO)
+            # Com só dois sensores não dá para saber qual está errado: não descarta
+            outlier = presente & (n >= 3) & (desvio > LIMIAR_MAD * sigma[:, None])
+            # Só leituras novas são observações; as demais servem só de referência
+            valido = presente & ~outlier & nova
+
+            # Saúde: 1 para leitura nova aceita, 0 para outlier ou sensor mudo/atrasado;
+            # leitura recente já contada não muda nada
+            medido = presente.any(axis=0)
+            ok = valido.any(axis=0) & ~outlier.any(axis=0)
+            alvo = np.where(medido & ok, 1.0, 0.0)
+            conta = nova | ~medido
+            self.saude += ALFA_SAUDE * np.where(conta, alvo - self.saude, 0.0)
+
+            peso = np.where(valido, self.saude / _VARIANCIA, 0.0)
+            soma_peso = peso.sum(axis=1)
+            tem = soma_peso > 0
+            z = np.where(tem, np.nansum(np.where(valido, m, 0.0) * peso, axis=1) / np.where(tem, soma_peso, 1.0), np.nan)
+            r = np.where(tem, 1.0 / np.where(tem, soma_peso, 1.0), np.inf)
+
+            dt = 0.0 if self._t is None else max(0.0, agora - self._t)
+            self._t = agora
+            novo = tem & np.isnan(self.x)
+            self.x = np.where(novo, z, self.x)
+            self.p = np.where(novo, r, self.p + _Q * dt)
+            atualiza = tem & ~novo
+            ganho = np.where(atualiza, self.p / (self.p + r), 0.0)
+            self.x = np.where(atualiza, self.x + ganho * (z - self.x), self.x)
+            self.p = np.where(atualiza, (1.0 - ganho) * self.p, self.p)
+            self._observado = np.where(tem, agora, self._observado)
+
+            self._resultado = {
+                "temp": None if np.isnan(self.x[0]) else float(self.x[0]),
+                "umid": None if np.isnan(self.x[1]) else float(self.x[1]),
+                "outliers": tuple(
+                    f"{SENSORES[j]}.{GRANDEZAS[i]}" for i, j in zip(*np.nonzero(outlier))
+                ),
+                "saude": {s: round(float(h), 3) for s, h in zip(SENSORES, self.saude)},
+            }
+            return self._resultado
+
+    def resultado(self, agora: float | None = None) -> dict:
+        """
+        Última fusão: {"temp", "umid", "outliers", "saude"}; sem tocar no hardware.
+        Grandeza sem observação nova há mais de IDADE_MAXIMA sai como None
+        (todos os sensores parados: nem atualizar() é chamado).
+        """
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            resultado, observado = self._resultado, self._observado
+        velhas = [g for g, t in zip(GRANDEZAS, observado) if agora - t > IDADE_MAXIMA]
+        if not velhas or all(resultado[g] is None for g in velhas):
+            return resultado
+        return {**resultado, **dict.fromkeys(velhas)}
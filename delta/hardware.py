@@ -1,63 +1,127 @@
 import time
-import board
+import queue
 import threading
 import colorsys
-import adafruit_dht
-import adafruit_ahtx0
-import adafruit_bmp280
-from gpiozero import RGBLED
+from collections import namedtuple
+from types import MappingProxyType
+import backend_hardware
+from historico_sensores import HistoricoSensores
+from fusao_sensores import FusaoSensores
+from agendador_sensores import AgendaSensor, ler_agendado
+import memoria_compartilhada
 
 # --- CONFIGURACOES GERAIS ---
 INTERVALO_LEITURA_SENSORES = 2.0  
-PRESSAO_NIVEL_MAR = 1013.25       
 
-# Ajuste Fino do LED (Mais suave agora)
-VELOCIDADE_RAINBOW = 0.005         # Aumentei o tempo de espera (era 0.002)
-PASSO_COR = 0.001                 # Mudança de cor mais gradual
+# Periodo base de amostragem de cada sensor na thread de fundo (s); a agenda
+# (agendador_sensores.py) ajusta conforme a variacao e as falhas.
+# DHT22 nao deve ser lido a menos de ~2 s; AHT20/BMP280 convertem em < 100 ms.
+PERIODO_SENSORES = {"AHT20": 1.0, "BMP280": 1.0, "DHT22": 2.5}
+
+# Processos que nao sao donos do hardware leem a memoria compartilhada neste periodo (s)
+# e assumem os sensores se o dono ficar este tempo sem publicar (s)
+PERIODO_ESPELHO = 0.5
+TEMPO_ASSUMIR = 15.0
+
+# Animacao do LED: uma volta completa no arco-iris a cada DURACAO_RAINBOW segundos,
+# desenhada a FPS_LED quadros por segundo a partir de uma tabela pre-calculada
+FPS_LED = 20
+DURACAO_RAINBOW = 5.0
+TAMANHO_LUT = 256
+LUT_RAINBOW = tuple(colorsys.hsv_to_rgb(i / TAMANHO_LUT, 1.0, 1.0) for i in range(TAMANHO_LUT))
 
 class GerenciadorLED:
+    """
+    Uma unica thread animadora (criada no primeiro estado) recebe os estados por uma fila.
+    Trocar de estado so enfileira e retorna; cor fixa nao acorda a thread, e o
+    arco-iris acorda FPS_LED vezes por segundo (antes: 200 vezes, com hsv_to_rgb).
+    """
+
     def __init__(self):
+        self.rodando = False
+        self.thread = None
+        self.quadros = 0
+        self._fila = queue.SimpleQueue()
         try:
-            self.led = RGBLED(red=13, green=19, blue=26, active_high=False)
-            self.rodando = False
-            self.thread = None
+            self.led = backend_hardware.atual().led()
         except Exception as e:
             print(f"[ERRO] Falha ao iniciar LED: {e}")
             self.led = None
+        self._lock = threading.Lock()
+
+    def _animar(self):
+        cor_atual = None
+        animacao = None   # LUT em loop, ou None para cor fixa
+        inicio = 0.0
+        while True:
+            try:
+                # Parado numa cor fixa: dorme ate o proximo estado
+                comando = self._fila.get(timeout=1.0 / FPS_LED if animacao else None)
+            except queue.Empty:
+                comando = None
+
+            if comando is not None:
+                # So o estado mais recente importa (mas um pedido de saida nunca e descartado)
+                while comando[0] != "sair":
+                    try:
+                        comando = self._fila.get_nowait()
+                    except queue.Empty:
+                        break
+                tipo, valor, aplicado = comando
+                if tipo == "sair":
+                    self.led.off()
+                    aplicado.set()
+                    return
+                if tipo == "animacao":
+                    animacao, inicio = valor, time.monotonic()
+                else:
+                    animacao = None
+                    if valor != cor_atual:
+                        cor_atual = valor
+                        self.led.color = valor
+                        self.quadros += 1
 
-    def _efeito_rainbow(self):
-        hue = 0
-        while self.rodando:
-            r, g, b = colorsys.hsv_to_rgb(hue, 1.0, 1.0)
-            if self.led:
-                self.led.color = (r, g, b)
-            hue += PASSO_COR
-            if hue > 1.0:
-                hue = 0
-            time.sleep(VELOCIDADE_RAINBOW)
+            if animacao:
+                fase = ((time.monotonic() - inicio) / DURACAO_RAINBOW) % 1.0
+                cor = animacao[int(fase * len(animacao))]
+                if cor != cor_atual:
+                    cor_atual = cor
+                    self.led.color = cor
+                    self.quadros += 1
+
+    def _enviar(self, tipo, valor):
+        if not self.led:
+            return
+        with self._lock:
+            if not self.rodando:
+                self.rodando = True
+                self.thread = threading.Thread(target=self._animar, name="led", daemon=True)
+                self.thread.start()
+        self._fila.put((tipo, valor, None))
 
     def iniciar_rainbow(self):
-        # garante que não terá duas threads rodando
-        self.parar()
-        if self.led and not self.rodando:
-            self.rodando = True
-            self.thread = threading.Thread(target=self._efeito_rainbow, daemon=True)
-            self.thread.start()
+        self._enviar("animacao", LUT_RAINBOW)
 
     def parar(self):
-        self.rodando = False
-        if self.thread:
-            self.thread.join()
-            self.thread = None
-        if self.led:
-            self.led.off()
+        """Apaga o LED e encerra a thread animadora (espera o LED apagar)."""
+        with self._lock:
+            if not self.rodando:
+                # Animadora nunca criada (ou ja encerrada): apaga direto
+                if self.led:
+                    self.led.off()
+                return
+            self.rodando = False
+            thread, self.thread = self.thread, None
+        aplicado = threading.Event()
+        self._fila.put(("sair", None, aplicado))
+        if not aplicado.wait(timeout=1.0):
+            self.led.off()  # Animadora travada: apaga mesmo assim
+        thread.join(timeout=1.0)
 
     # ---------- NOVOS MÉTODOS DE ESTADO ----------
     def _set_rgb(self, r: float, g: float, b: float):
-        """Define cor fixa e garante que o rainbow está parado."""
-        self.parar()
-        if self.led:
-            self.led.color = (r, g, b)
+        """Define cor fixa (para o rainbow, se estiver rodando). Nao bloqueia."""
+        self._enviar("cor", (r, g, b))
 
     def estado_ouvindo_keyword(self):
         # aguardando a palavra-chave -> vermelho
@@ -76,70 +140,180 @@ class GerenciadorLED:
         self._set_rgb(0.0, 0.0, 1.0)
 
 
+# Snapshot imutavel publicado pela thread de amostragem.
+# leituras: {sensor: {campo: valor}}; instantes: {sensor: time.monotonic() da leitura}
+Snapshot = namedtuple("Snapshot", ["timestamp", "leituras", "instantes"])
+SNAPSHOT_VAZIO = Snapshot(0.0, MappingProxyType({}), MappingProxyType({}))
+
+
 class Sensores:
+    """
+    Um unico processo (o dono, via flock em memoria_compartilhada) acessa o
+    I2C e o DHT22 e publica as leituras na memoria compartilhada; nos demais
+    a amostragem apenas espelha essa regiao, sem tocar no barramento.
+    """
+
     def __init__(self):
-        self.i2c = board.I2C()
-        self.dht = None
-        self.aht = None
-        self.bmp = None
-        self._iniciar_hardware()
+        self._leitores_backend = {}
+        self._snapshot = SNAPSHOT_VAZIO
+        self.historico = HistoricoSensores()
+        self.fusao = FusaoSensores()
+        self._amostrando = False
+        self._acordar = threading.Event()
+        self._thread_amostragem = None
+        self.agendas = {}
+        # Cada backend tem sua propria regiao: um teste simulado nao se mistura com os sensores reais
+        self._caminho_regiao = memoria_compartilhada.caminho(backend_hardware.BACKEND)
+        self._regiao = memoria_compartilhada.tentar_ser_dono(self._caminho_regiao)
+        self.dono = self._regiao is not None
+        if self.dono:
+            self._iniciar_hardware()
+        else:
+            print("[INFO] Sensores em uso por outro processo; lendo da memoria compartilhada.")
+            self._regiao = memoria_compartilhada.RegiaoSensores(self._caminho_regiao)
 
     def _iniciar_hardware(self):
-        # 1. DHT22
-        try:
-            self.dht = adafruit_dht.DHT22(board.D4, use_pulseio=False)
-        except Exception as e:
-            print(f"[AVISO] DHT22 off: {e}")
-
-        # 2. AHT20
-        try:
-            self.aht = adafruit_ahtx0.AHTx0(self.i2c)
-        except Exception as e:
-            print(f"[AVISO] AHT20 off: {e}")
+        # Sensores reais, simulados ou de replay (DELTA_BACKEND, backend_hardware.py)
+        self._leitores_backend = backend_hardware.atual().sensores()
+        self.agendas = {
+            nome: AgendaSensor(nome, PERIODO_SENSORES.get(nome, INTERVALO_LEITURA_SENSORES))
+            for nome in self._leitores_backend
+        }
 
-        # 3. BMP280 (Tentativa Automatica)
-        try:
-            # Tenta sem endereco forçado (padrao 0x77)
-            self.bmp = adafruit_bmp280.Adafruit_BMP280_I2C(self.i2c)
-            self.bmp.sea_level_pressure = PRESSAO_NIVEL_MAR
-        except ValueError:
-            # Se falhar, tenta o endereco alternativo (0x76)
-            try:
-                self.bmp = adafruit_bmp280.Adafruit_BMP280_I2C(self.i2c, address=0x76)
-                self.bmp.sea_level_pressure = PRESSAO_NIVEL_MAR
-            except Exception as e:
-                print(f"[AVISO] BMP280 off (0x76 falhou): {e}")
-        except Exception as e:
-            print(f"[AVISO] BMP280 off: {e}")
+    def _leitores(self):
+        """{nome: funcao de leitura} dos sensores que inicializaram."""
+        return dict(self._leitores_backend)
 
     def ler_todos(self):
+        """
+        Leitura sincrona de todos os sensores (acessa o barramento se for o dono).
+        Sensor lido ha menos que o intervalo minimo do hardware devolve a ultima leitura.
+        """
+        if not self.dono:
+            return {nome: d for nome, (_, d) in (self._regiao.ler() or {}).items()}
+        if self._amostrando:
+            # A thread de amostragem ja segue a agenda; nao disputa o barramento com ela
+            return {nome: dict(d) for nome, d in self._snapshot.leituras.items()}
         dados = {}
-        # AHT20
-        if self.aht:
-            try:
-                dados['AHT20'] = {'temp': self.aht.temperature, 'umid': self.aht.relative_humidity}
-            except: pass
-        
-        # BMP280
-        if self.bmp:
-            try:
-                dados['BMP280'] = {
-                    'temp': self.bmp.temperature,
-                    'pressao': self.bmp.pressure,
-                    'altitude': self.bmp.altitude
-                }
-            except: pass
-
-        # DHT22
-        if self.dht:
-            try:
-                t = self.dht.temperature
-                u = self.dht.humidity
-                if t is not None: dados['DHT22'] = {'temp': t, 'umid': u}
-            except RuntimeError: pass
-
+        agora = time.monotonic()
+        for nome, ler in self._leitores().items():
+            agenda = self.agendas[nome]
+            d = ler_agendado(agenda, ler) if agenda.pode_ler(agora) else agenda.ultimo
+            if d is not None: dados[nome] = d
         return dados
 
+    def estatisticas(self):
+        """Periodo atual, leituras, falhas e latencia de cada sensor."""
+        return {nome: agenda.resumo() for nome, agenda in self.agendas.items()}
+
+    def familias_metricas(self):
+        """Coletor do endpoint de metricas (metricas_http): valores atuais, idade e saude."""
+        snap = self._snapshot
+        agora = time.monotonic()
+        fusao = self.fusao.resultado()
+        valores = [
+            ({"sensor": nome, "grandeza": g}, v)
+            for nome, d in snap.leituras.items() for g, v in d.items()
+        ]
+        return [
+            ("delta_sensor_valor", "gauge", "Ultima leitura de cada sensor", valores),
+            ("delta_sensor_idade_segundos", "gauge", "Idade da ultima leitura",
+             [({"sensor": n}, agora - t) for n, t in snap.instantes.items()]),
+            ("delta_sensor_saude", "gauge", "Saude do sensor na fusao (0 a 1)",
+             [({"sensor": n}, h) for n, h in fusao["saude"].items()]),
+            ("delta_sensor_fundido", "gauge", "Estimativa fundida dos sensores",
+             [({"grandeza": "temp"}, fusao["temp"]), ({"grandeza": "umid"}, fusao["umid"])]),
+            ("delta_sensor_periodo_segundos", "gauge", "Periodo atual de amostragem",
+             [({"sensor": n}, a.periodo) for n, a in self.agendas.items()]),
+        ]
+
+    # ---------- AMOSTRAGEM EM SEGUNDO PLANO ----------
+    def _publicar(self, nome, dados, instante, agora=None):
+        # Copia-e-troca: leitores pegam a referencia atual sem lock
+        atual = self._snapshot
+        leituras = dict(atual.leituras)
+        instantes = dict(atual.instantes)
+        leituras[nome] = MappingProxyType(dict(dados))
+        instantes[nome] = instante
+        agora = time.time() if agora is None else agora
+        self._snapshot = Snapshot(agora, MappingProxyType(leituras), MappingProxyType(instantes))
+        self.historico.registrar(nome, dados, agora, instante)
+        self.fusao.atualizar(leituras, instantes, time.monotonic())
+        if self.dono:
+            self._regiao.publicar(nome, dados, agora)
+
+    def _loop_amostragem(self):
+        leitores = self._leitores()
+        while self._amostrando and leitores:
+            agora = time.monotonic()
+            for nome, ler in leitores.items():
+                agenda = self.agendas[nome]
+                if agora < agenda.proxima or not agenda.pode_ler(agora):
+                    continue
+                d = ler_agendado(agenda, ler)
+                if d is not None:  # Em falha mantem a ultima leitura boa
+                    self._publicar(nome, d, time.monotonic())
+            proxima = min(a.proxima for a in self.agendas.values())
+            self._acordar.wait(max(0.0, proxima - time.monotonic()))
+
+    def _loop_espelho(self):
+        # Copia para o snapshot local as leituras novas publicadas pelo dono
+        vistos = {}
+        ultima_novidade = time.monotonic()
+        while self._amostrando:
+            for nome, (instante, d) in (self._regiao.ler() or {}).items():
+                if vistos.get(nome) != instante:
+                    vistos[nome] = instante
+                    ultima_novidade = time.monotonic()
+                    idade = max(0.0, time.time() - instante)
+                    self._publicar(nome, d, time.monotonic() - idade, instante)
+
+            if time.monotonic() - ultima_novidade > TEMPO_ASSUMIR:
+                regiao = memoria_compartilhada.tentar_ser_dono(self._caminho_regiao)
+                if regiao is not None:
+                    print("[INFO] Dono dos sensores parou; assumindo o hardware.")
+                    self._regiao, self.dono = regiao, True
+                    self._iniciar_hardware()
+                    self._loop_amostragem()
+                    return
+                ultima_novidade = time.monotonic()
+            self._acordar.wait(PERIODO_ESPELHO)
+
+    def iniciar_amostragem(self):
+        """Inicia a thread que le cada sensor no seu proprio periodo (ou espelha o dono)."""
+        if self._amostrando:
+            return
+        self._amostrando = True
+        self._acordar.clear()
+        alvo = self._loop_amostragem if self.dono else self._loop_espelho
+        self._thread_amostragem = threading.Thread(target=alvo, daemon=True)
+        self._thread_amostragem.start()
+
+    def parar_amostragem(self):
+        self._amostrando = False
+        self._acordar.set()
+        if self._thread_amostragem:
+            self._thread_amostragem.join()
+            self._thread_amostragem = None
+
+    def latest(self, max_age=None):
+        """
+        Ultimo snapshot publicado, sem tocar no hardware.
+        Com `max_age` (s), descarta leituras de sensores mais antigas que isso.
+        """
+        snap = self._snapshot
+        if max_age is None:
+            return snap
+        limite = time.monotonic() - max_age
+        frescos = [n for n, t in snap.instantes.items() if t >= limite]
+        if len(frescos) == len(snap.instantes):
+            return snap
+        return Snapshot(
+            snap.timestamp,
+            MappingProxyType({n: snap.leituras[n] for n in frescos}),
+            MappingProxyType({n: snap.instantes[n] for n in frescos}),
+        )
+
 def main():
     print("--- MONITORAMENTO AMBIENTAL PRO ---")
     led = GerenciadorLED()
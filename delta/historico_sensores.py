@@ -0,0 +1,211 @@
+"""
+Histórico de leituras dos sensores em memória fixa.
+
+Cada série ("AHT20.temp", "DHT22.umid", ...) tem três anéis circulares de
+arrays estruturados NumPy:
+  - bruto:  amostras da última hora
+  - 1 min:  min/média/max por minuto (7 dias)
+  - 15 min: min/média/max a cada 15 minutos (90 dias)
+
+A memória é alocada na criação da série e não cresce. As consultas
+(média, inclinação, min/max numa janela) são vetorizadas e escolhem
+sozinhas o nível de resolução adequado à janela pedida.
+
+Os instantes gravados seguem o relógio monotônico (convertido para a época
+uma vez, na criação): um passo do NTP não fecha baldes fora de hora nem
+deixa os anéis fora de ordem, só desloca a linha do tempo pelo tamanho do
+passo em relação a time.time().
+"""
+
+import time
+import threading
+import numpy as np
+
+JANELA_BRUTA = 3600.0          # Amostras brutas mantidas (s)
+CAPACIDADE_BRUTA = 4096        # >= JANELA_BRUTA / menor período de amostragem
+CAPACIDADE_1MIN = 7 * 24 * 60
+CAPACIDADE_15MIN = 90 * 24 * 4
+
+DTYPE_BRUTO = np.dtype([("t", "f8"), ("v", "f4")])
+DTYPE_AGREGADO = np.dtype([("t", "f8"), ("min", "f4"), ("mean", "f4"), ("max", "f4"), ("n", "u4")])
+
+
+class AnelCircular:
+    """Buffer circular de tamanho fixo sobre um array estruturado."""
+
+    __slots__ = ("dados", "pos", "cheio")
+
+    def __init__(self, capacidade: int, dtype: np.dtype):
+        self.dados = np.zeros(capacidade, dtype=dtype)
+        self.pos = 0
+        self.cheio = False
+
+    def adicionar(self, linha: tuple):
+        self.dados[self.pos] = linha
+        self.pos += 1
+        if self.pos == len(self.dados):
+            self.pos = 0
+            self.cheio = True
+
+    def janela(self, t0: float) -> np.ndarray:
+        """Linhas com t >= t0 em ordem cronológica (visão quando possível)."""
+        if self.cheio:
+            ordenado = np.concatenate((self.dados[self.pos:], self.dados[:self.pos]))
+        else:
+            ordenado = self.dados[:self.pos]
+        inicio = np.searchsorted(ordenado["t"], t0)
+        return ordenado[inicio:]
+
+
+class _Balde:
+    """Acumulador do intervalo de agregação em andamento."""
+
+    __slots__ = ("inicio", "minimo", "maximo", "soma", "n")
+
+    def __init__(self):
+        self.inicio = None
+
+    def somar(self, inicio, minimo, maximo, soma, n):
+        if self.inicio is None:
+            self.inicio, self.minimo, self.maximo, self.soma, self.n = inicio, minimo, maximo, soma, n
+        else:
+            self.minimo = min(self.minimo, minimo)
+            self.maximo = max(self.maximo, maximo)
+            self.soma += soma
+            self.n += n
+
+    def fechar(self) -> tuple:
+        linha = (self.inicio, self.minimo, self.soma / self.n, self.maximo, self.n)
+        self.inicio = None
+        return linha
+
+
+class Serie:
+    """Uma grandeza de um sensor, com os três níveis de resolução."""
+
+    def __init__(self):
+        self.bruto = AnelCircular(CAPACIDADE_BRUTA, DTYPE_BRUTO)
+        self.min1 = AnelCircular(CAPACIDADE_1MIN, DTYPE_AGREGADO)
+        self.min15 = AnelCircular(CAPACIDADE_15MIN, DTYPE_AGREGADO)
+        self._balde1 = _Balde()
+        self._balde15 = _Balde()
+
+    def adicionar(self, t: float, v: float):
+        self.bruto.adicionar((t, v))
+
+        minuto = t - t % 60
+        if self._balde1.inicio is not None and minuto != self._balde1.inicio:
+            linha = self._balde1.fechar()
+            self.min1.adicionar(linha)
+            self._rolar_15(linha)
+        self._balde1.somar(minuto, v, v, v, 1)
+
+    def importar_minuto(self, linha: tuple):
+        """Insere um agregado de 1 min já pronto (ex: vindo do log em disco)."""
+        self.min1.adicionar(linha)
+        self._rolar_15(linha)
+
+    def _rolar_15(self, linha: tuple):
+        inicio, minimo, media, maximo, n = linha
+        quarto = inicio - inicio % 900
+        if self._balde15.inicio is not None and quarto != self._balde15.inicio:
+            self.min15.adicionar(self._balde15.fechar())
+        self._balde15.somar(quarto, minimo, maximo, media * n, n)
+
+    def janela(self, t0: float, duracao: float):
+        """
+        (tempos, médias, mínimos, máximos, amostras por linha) desde t0, do
+        nível mais fino que cobre `duracao`.
+        """
+        if duracao <= JANELA_BRUTA:
+            linhas = self.bruto.janela(t0)
+            return linhas["t"], linhas["v"], linhas["v"], linhas["v"], np.ones(len(linhas), dtype="u4")
+        anel = self.min1 if duracao <= CAPACIDADE_1MIN * 60 else self.min15
+        linhas = anel.janela(t0)
+        return linhas["t"], linhas["mean"], linhas["min"], linhas["max"], linhas["n"]
+
+
+class HistoricoSensores:
+    """Séries por "SENSOR.grandeza", alimentadas pela thread de amostragem."""
+
+    GRANDEZAS = ("temp", "umid", "pressao")
+
+    def __init__(self):
+        self.series = {}
+        self._lock = threading.Lock()
+        self._origem = time.time() - time.monotonic()  # monotônico -> época, fixado uma vez
+
+    def registrar(self, sensor: str, dados, t: float, monotonico: float | None = None):
+        """
+        `t` é a época da leitura; com `monotonico` (time.monotonic() da
+        leitura) o instante gravado e os baldes vêm do relógio monotônico.
+        """
+        if monotonico is not None:
+            t = self._origem + monotonico
+        with self._lock:
+            for g in self.GRANDEZAS:
+                v = dados.get(g)
+                if v is None:
+                    continue
+                self._serie(f"{sensor}.{g}").adicionar(t, float(v))
+
+    def _serie(self, chave: str) -> Serie:
+        serie = self.series.get(chave)
+        if serie is None:
+            serie = self.series[chave] = Serie()
+        return serie
+
+    def importar(self, por_minuto: list, brutos: list):
+        """
+        Pré-carrega o histórico a partir do log em disco (log_sensores):
+        agregados por minuto para os níveis de 1/15 min e amostras brutas recentes.
+        """
+        with self._lock:
+            for minuto, chave, minimo, media, maximo, n in por_minuto:
+                self._serie(chave).importar_minuto((minuto, minimo, media, maximo, n))
+            for t, chave, v in brutos:
+                self._serie(chave).bruto.adicionar((t, v))
+
+    def _janela(self, chave: str, janela_s: float, agora: float):
+        serie = self.series.get(chave)
+        if serie is None:
+            return None
+        with self._lock:
+            t, media, minimo, maximo, n = serie.janela(agora - janela_s, janela_s)
+            return t.copy(), media.copy(), minimo.copy(), maximo.copy(), n.copy()
+
+    def media(self, chave: str, janela_s: float, agora: float) -> float | None:
+        """Média na janela; nos níveis agregados cada balde pesa pelo seu número de amostras."""
+        r = self._janela(chave, janela_s, agora)
+        if r is None or not len(r[0]) or not r[4].sum():
+            return None
+        return float(np.average(r[1].astype("f8"), weights=r[4]))
+
+    def extremos(self, chave: str, janela_s: float, agora: float):
+        """(min, max) na janela, ou None."""
+        r = self._janela(chave, janela_s, agora)
+        if r is None or not len(r[0]):
+            return None
+        return float(r[2].min()), float(r[3].max())
+
+    def inclinacao(self, chave: str, janela_s: float, agora: float) -> float | None:
+        """Tendência por mínimos quadrados, em unidades por hora."""
+        r = self._janela(chave, janela_s, agora)
+        if r is None or len(r[0]) < 3:
+            return None
+        t, v = r[0] - r[0][0], r[1].astype("f8")
+        tc = t - t.mean()
+        den = float((tc * tc).sum())
+        if den == 0.0:
+            return None
+        return float((tc * (v - v.mean())).sum() / den) * 3600.0
+
+    def tendencia(self, grandeza: str, janela_s: float, agora: float) -> float | None:
+        """Mediana das inclinações de todos os sensores que medem `grandeza`."""
+        inclinacoes = [
+            self.inclinacao(chave, janela_s, agora)
+            for chave in list(self.series)
+            if chave.endswith("." + grandeza)
+        ]
+        inclinacoes = [i for i in inclinacoes if i is not None]
+        return float(np.median(inclinacoes)) if inclinacoes else None
@@ -0,0 +1,154 @@
+"""
+Log persistente de leituras dos sensores (SQLite em modo WAL).
+
+As leituras ficam em memória e são gravadas em lotes (uma transação por
+lote, sem fsync por amostra: synchronous=NORMAL no WAL), o que poupa o
+cartão SD e ainda é seguro contra quedas: um lote ou entra inteiro ou não
+entra. Os arquivos giram por tamanho/idade e os mais antigos são apagados.
+
+    logs/sensores-20250101-120000.db   (um arquivo por período)
+"""
+
+import os
+import glob
+import time
+import sqlite3
+
+DIRETORIO_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+LOTE = 64                         # Leituras por transação
+INTERVALO_COMMIT = 60.0           # Grava o lote pendente pelo menos a cada N segundos
+TAMANHO_MAX = 16 * 1024 * 1024    # Gira o arquivo acima deste tamanho (bytes)
+IDADE_MAX = 7 * 24 * 3600         # ... ou após este tempo (s)
+RETENCAO = 12                     # Quantos arquivos manter
+
+GRANDEZAS = ("temp", "umid", "pressao", "altitude")
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS series (id INTEGER PRIMARY KEY, nome TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS leituras (t REAL NOT NULL, serie INTEGER NOT NULL, valor REAL NOT NULL);
+CREATE INDEX IF NOT EXISTS idx_leituras_t ON leituras (t);
+"""
+
+
+def _inicio_do_arquivo(caminho: str) -> float:
+    nome = os.path.basename(caminho)[len("sensores-"):-len(".db")]
+    return time.mktime(time.strptime(nome, "%Y%m%d-%H%M%S"))
+
+
+def arquivos(diretorio: str = DIRETORIO_LOG) -> list:
+    """Arquivos de log em ordem cronológica."""
+    return sorted(glob.glob(os.path.join(diretorio, "sensores-*.db")))
+
+
+class LogSensores:
+    """Escritor do log (um processo escritor; leitores usam `ler`)."""
+
+    def __init__(self, diretorio: str = DIRETORIO_LOG):
+        self.diretorio = diretorio
+        os.makedirs(diretorio, exist_ok=True)
+        self._pendentes = []
+        self._ultimo_commit = time.monotonic()
+        self._series = {}
+        self._conn = None
+        existentes = arquivos(diretorio)
+        self._abrir(existentes[-1] if existentes else self._novo_caminho())
+
+    def _novo_caminho(self) -> str:
+        return os.path.join(self.diretorio, time.strftime("sensores-%Y%m%d-%H%M%S.db"))
+
+    def _abrir(self, caminho: str):
+        self.caminho = caminho
+        self._conn = sqlite3.connect(caminho)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_ESQUEMA)
+        self._series = dict(self._conn.execute("SELECT nome, id FROM series"))
+        self._inicio = _inicio_do_arquivo(caminho)
+
+    def _id_serie(self, nome: str) -> int:
+        sid = self._series.get(nome)
+        if sid is None:
+            sid = self._conn.execute("INSERT INTO series (nome) VALUES (?)", (nome,)).lastrowid
+            self._series[nome] = sid
+        return sid
+
+    def registrar(self, sensor: str, dados, t: float | None = None):
+        """Enfileira as grandezas de uma leitura; grava quando o lote enche ou o tempo vence."""
+        t = time.time() if t is None else t
+        for g in GRANDEZAS:
+            v = dados.get(g)
+            if v is not None:
+                self._pendentes.append((t, f"{sensor}.{g}", float(v)))
+        if len(self._pendentes) >= LOTE or time.monotonic() - self._ultimo_commit >= INTERVALO_COMMIT:
+            self.flush()
+
+    def flush(self):
+        if self._pendentes:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO leituras (t, serie, valor) VALUES (?, ?, ?)",
+                    [(t, self._id_serie(nome), v) for t, nome, v in self._pendentes],
+                )
+            self._pendentes = []
+        self._ultimo_commit = time.monotonic()
+        self._girar_se_preciso()
+
+    def _girar_se_preciso(self):
+        tamanho = sum(os.path.getsize(p) for p in (self.caminho, self.caminho + "-wal") if os.path.exists(p))
+        if tamanho < TAMANHO_MAX and time.time() - self._inicio < IDADE_MAX:
+            return
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self._conn.close()
+        self._abrir(self._novo_caminho())
+        for antigo in arquivos(self.diretorio)[:-RETENCAO]:
+            for sufixo in ("", "-wal", "-shm"):
+                try:
+                    os.remove(antigo + sufixo)
+                except OSError:
+                    pass
+
+    def fechar(self):
+        self.flush()
+        self._conn.close()
+
+
+def _consultar(sql: str, t0: float, t1: float | None, series: tuple | None, diretorio: str) -> list:
+    """Roda `sql` (com filtro de tempo/séries) só nos arquivos cujo período cruza a janela."""
+    t1 = time.time() if t1 is None else t1
+    params = [t0, t1]
+    filtro = ""
+    if series:
+        filtro = f" AND s.nome IN ({','.join('?' * len(series))})"
+        params += list(series)
+    todos = arquivos(diretorio)
+    resultado = []
+    for i, caminho in enumerate(todos):
+        inicio = _inicio_do_arquivo(caminho)
+        fim = _inicio_do_arquivo(todos[i + 1]) if i + 1 < len(todos) else float("inf")
+        if fim < t0 or inicio >= t1:
+            continue
+        conn = sqlite3.connect(f"file:{caminho}?mode=ro", uri=True)
+        try:
+            resultado.extend(conn.execute(sql.format(filtro=filtro), params))
+        except sqlite3.OperationalError:
+            pass  # Arquivo recém-criado ainda sem tabelas
+        finally:
+            conn.close()
+    return resultado
+
+
+def ler(t0: float, t1: float | None = None, series: tuple | None = None,
+        diretorio: str = DIRETORIO_LOG) -> list:
+    """Leituras [(t, "SENSOR.grandeza", valor)] com t0 <= t < t1, em ordem de tempo."""
+    sql = ("SELECT l.t, s.nome, l.valor FROM leituras l JOIN series s ON s.id = l.serie "
+           "WHERE l.t >= ? AND l.t < ?{filtro} ORDER BY l.t")
+    return _consultar(sql, t0, t1, series, diretorio)
+
+
+def ler_por_minuto(t0: float, t1: float | None = None, series: tuple | None = None,
+                   diretorio: str = DIRETORIO_LOG) -> list:
+    """Agregados [(minuto, serie, min, media, max, n)] calculados pelo SQLite."""
+    sql = ("SELECT CAST(l.t / 60 AS INTEGER) * 60 AS m, s.nome, MIN(l.valor), AVG(l.valor), "
+           "MAX(l.valor), COUNT(*) FROM leituras l JOIN series s ON s.id = l.serie "
+           "WHERE l.t >= ? AND l.t < ?{filtro} GROUP BY m, s.nome ORDER BY m")
+    return _consultar(sql, t0, t1, series, diretorio)
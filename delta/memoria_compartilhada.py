@@ -0,0 +1,115 @@
+"""
+Snapshot dos sensores em memória compartilhada.
+
+Só um processo (o "dono", quem conseguir o flock) acessa o barramento I2C e
+a linha do DHT22; ele publica as leituras numa região mmap em /dev/shm
+protegida por seqlock. Os demais processos (delta.py, monitor.py) leem a
+região diretamente, sem lock e sem tocar no hardware. Se o dono morrer, o
+flock é liberado pelo kernel e um leitor pode assumir.
+
+Layout: cabeçalho (magic, versão, seq) + um slot fixo por sensor com o
+instante da leitura e os valores (NaN = campo ausente).
+"""
+
+import os
+import mmap
+import math
+import fcntl
+import struct
+import tempfile
+
+_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+CAMINHO = os.path.join(_DIR, "delta_sensores")
+
+SENSORES = ("AHT20", "BMP280", "DHT22")
+CAMPOS = ("temp", "umid", "pressao", "altitude")
+
+MAGIC = b"DLTS"
+VERSAO = 1
+_CABECALHO = struct.Struct("<4sIQ")          # magic, versão, seq
+_SEQ = struct.Struct("<Q")
+_OFFSET_SEQ = 8
+_SLOT = struct.Struct("<d" + "d" * len(CAMPOS))  # instante (time.time()), valores
+TAMANHO = _CABECALHO.size + len(SENSORES) * _SLOT.size
+TENTATIVAS_LEITURA = 100
+
+
+class RegiaoSensores:
+    """Região mmap com seqlock: um escritor, vários leitores."""
+
+    def __init__(self, caminho: str = CAMINHO):
+        fd = os.open(caminho, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            if os.fstat(fd).st_size != TAMANHO:
+                os.ftruncate(fd, TAMANHO)
+            self.mm = mmap.mmap(fd, TAMANHO)
+        finally:
+            os.close(fd)
+
+    def _seq(self) -> int:
+        return _SEQ.unpack_from(self.mm, _OFFSET_SEQ)[0]
+
+    def inicializar(self):
+        """Chamado pelo dono: zera os slots e grava o cabeçalho."""
+        vazio = _SLOT.pack(0.0, *([math.nan] * len(CAMPOS)))
+        seq = self._seq() | 1
+        _SEQ.pack_into(self.mm, _OFFSET_SEQ, seq)
+        for i in range(len(SENSORES)):
+            self.mm[_CABECALHO.size + i * _SLOT.size:_CABECALHO.size + (i + 1) * _SLOT.size] = vazio
+        _CABECALHO.pack_into(self.mm, 0, MAGIC, VERSAO, seq + 1)
+
+    def publicar(self, nome: str, dados, instante: float):
+        """Escritor: seq ímpar durante a escrita, par quando consistente."""
+        i = SENSORES.index(nome)
+        valores = [float(dados[c]) if dados.get(c) is not None else math.nan for c in CAMPOS]
+        seq = self._seq()
+        _SEQ.pack_into(self.mm, _OFFSET_SEQ, seq + 1)
+        _SLOT.pack_into(self.mm, _CABECALHO.size + i * _SLOT.size, instante, *valores)
+        _SEQ.pack_into(self.mm, _OFFSET_SEQ, seq + 2)
+
+    def ler(self) -> dict | None:
+        """
+        {sensor: (instante, {campo: valor})} consistente, lido direto do mmap.
+        Retorna None se a região ainda não foi inicializada ou o escritor não parou.
+        """
+        for _ in range(TENTATIVAS_LEITURA):
+            magic, versao, s1 = _CABECALHO.unpack_from(self.mm, 0)
+            if magic != MAGIC or versao != VERSAO:
+                return None
+            if s1 & 1:
+                continue
+            slots = [_SLOT.unpack_from(self.mm, _CABECALHO.size + i * _SLOT.size) for i in range(len(SENSORES))]
+            if self._seq() != s1:
+                continue
+            resultado = {}
+            for nome, (instante, *valores) in zip(SENSORES, slots):
+                if instante:
+                    resultado[nome] = (instante, {c: v for c, v in zip(CAMPOS, valores) if not math.isnan(v)})
+            return resultado
+        return None
+
+
+def caminho(backend: str = "rpi") -> str:
+    """Região do backend de hardware (os simulados não dividem a região dos sensores reais)."""
+    return CAMINHO if backend == "rpi" else f"{CAMINHO}-{backend}"
+
+
+_locks = {}
+
+
+def tentar_ser_dono(caminho: str = CAMINHO) -> RegiaoSensores | None:
+    """
+    Tenta virar o processo dono dos sensores (flock não bloqueante, mantido
+    até o fim do processo). Retorna a região para escrita, ou None.
+    """
+    if caminho not in _locks:
+        fd = os.open(caminho + ".lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return None
+        _locks[caminho] = fd
+    regiao = RegiaoSensores(caminho)
+    regiao.inicializar()
+    return regiao
@@ -0,0 +1,244 @@
+"""
+Endpoint local de métricas no formato texto do Prometheus.
+
+    curl http://127.0.0.1:9464/metrics
+
+Contadores e histogramas são agregados no momento da observação, em shards
+por thread: o caminho quente só incrementa números da própria thread, sem
+lock, e o scrape soma os shards. Valores "ao vivo" (leituras dos sensores,
+contadores de outras partes) entram por coletores chamados só no scrape.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+HOST = "127.0.0.1"
+PORTA = 9464
+
+# Limites dos buckets (s)
+BUCKETS_RAPIDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BUCKETS_PIPELINE = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+BUCKETS_TOKENS = (1, 2, 4, 6, 8, 10, 15, 20, 30, 50, 100)  # tokens/s
+BUCKETS_RTF = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 4.0)  # fator de tempo real
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes: tuple, valores: tuple) -> str:
+    if not nomes:
+        return ""
+    return "{" + ",".join(f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)) + "}"
+
+
+class _Metrica:
+    """Base: shards por thread de {rótulos: estado}."""
+
+    tipo = ""
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = ()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = rotulos
+        self._local = threading.local()
+        self._shards = []
+        self._lock_shards = threading.Lock()  # Só na primeira observação de cada thread
+        _registro.append(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock_shards:
+                self._shards.append(shard)
+        return shard
+
+    def _somados(self) -> dict:
+        raise NotImplementedError
+
+    def expor(self) -> list:
+        linhas = [f"# HELP {self.nome} {self.ajuda}", f"# TYPE {self.nome} {self.tipo}"]
+        for chave, valor in sorted(self._somados().items()):
+            linhas.extend(self._linhas(chave, valor))
+        return linhas
+
+
+class Contador(_Metrica):
+    tipo = "counter"
+
+    def inc(self, valor: float = 1.0, *rotulos):
+        shard = self._shard()
+        shard[rotulos] = shard.get(rotulos, 0.0) + valor
+
+    def _somados(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            for chave, v in list(shard.items()):
+                total[chave] = total.get(chave, 0.0) + v
+        return total
+
+    def _linhas(self, chave, valor):
+        return [f"{self.nome}{_rotulos(self.rotulos, chave)} {valor:g}"]
+
+
+class Histograma(_Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nome: str, ajuda: str, rotulos: tuple = (), buckets: tuple = BUCKETS_RAPIDOS):
+        super().__init__(nome, ajuda, rotulos)
+        self.buckets = tuple(buckets)
+
+    def observar(self, valor: float, *rotulos):
+        shard = self._shard()
+        estado = shard.get(rotulos)
+        if estado is None:
+            # [contagem por bucket (+Inf no fim), soma]
+            estado = shard[rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+        estado[0][bisect.bisect_left(self.buckets, valor)] += 1
+        estado[1] += valor
+
+    def _somados(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            for chave, (contagens, soma) in list(shard.items()):
+                acumulado = total.setdefault(chave, [[0] * (len(self.buckets) + 1), 0.0])
+                acumulado[0] = [a + b for a, b in zip(acumulado[0], contagens)]
+                acumulado[1] += soma
+        return total
+
+    def _linhas(self, chave, valor):
+        contagens, soma = valor
+        nomes = self.rotulos + ("le",)
+        linhas = []
+        acumulado = 0
+        for limite, n in zip(self.buckets + (float("inf"),), contagens):
+            acumulado += n
+            le = "+Inf" if limite == float("inf") else f"{limite:g}"
+            linhas.append(f"{self.nome}_bucket{_rotulos(nomes, chave + (le,))} {acumulado}")
+        linhas.append(f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {soma:g}")
+        linhas.append(f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}")
+        return linhas
+
+
+_registro = []
+_coletores = []
+
+
+def registrar_coletor(coletor):
+    """
+    `coletor()` é chamado a cada scrape e retorna uma lista de
+    (nome, tipo, ajuda, [(dict de rótulos, valor), ...]).
+    """
+    _coletores.append(coletor)
+
+
+def texto() -> str:
+    """Todas as métricas no formato de exposição do Prometheus."""
+    linhas = []
+    for metrica in list(_registro):
+        linhas.extend(metrica.expor())
+    for coletor in list(_coletores):
+        try:
+            familias = coletor()
+        except Exception as e:
+            print(f"[AVISO] Coletor de metricas falhou: {e}")
+            continue
+        for nome, tipo, ajuda, amostras in familias:
+            linhas.append(f"# HELP {nome} {ajuda}")
+            linhas.append(f"# TYPE {nome} {tipo}")
+            for rotulos, valor in amostras:
+                if valor is None:
+                    continue
+                linhas.append(f"{nome}{_rotulos(tuple(rotulos), tuple(rotulos.values()))} {float(valor):g}")
+    return "\n".join(linhas) + "\n"
+
+
+# ---------- Métricas do DELTA ----------
+LATENCIA_SENSOR = Histograma(
+    "delta_sensor_leitura_segundos", "Latencia de leitura de cada sensor", ("sensor",))
+FALHAS_SENSOR = Contador(
+    "delta_sensor_falhas_total", "Leituras de sensor que falharam", ("sensor",))
+ETAPA_PIPELINE = Histograma(
+    "delta_pipeline_etapa_segundos", "Duracao de cada etapa do pipeline de voz", ("rota", "etapa"), BUCKETS_PIPELINE)
+ESCRITA_TUYA = Histograma(
+    "delta_tuya_escrita_segundos", "Latencia de escrita de um frame Tuya", ("dispositivo",))
+ERROS_TUYA = Contador(
+    "delta_tuya_erros_total", "Escritas Tuya que falharam", ("dispositivo",))
+REQUISICOES_OLLAMA = Contador(
+    "delta_ollama_requisicoes_total", "Chamadas ao Ollama", ("rota",))
+TOKENS_OLLAMA = Contador(
+    "delta_ollama_tokens_total", "Tokens processados pelo Ollama", ("rota", "tipo"))
+TEMPO_OLLAMA = Contador(
+    "delta_ollama_segundos_total", "Tempo reportado pelo Ollama por fase", ("rota", "fase"))
+DECODE_OLLAMA = Histograma(
+    "delta_ollama_decode_tokens_por_segundo", "Velocidade de decode do Ollama", ("rota",), BUCKETS_TOKENS)
+SOBRECARGA_OLLAMA = Histograma(
+    "delta_ollama_sobrecarga_segundos", "Tempo de parede da chamada fora do total_duration do Ollama (fila, HTTP)",
+    ("rota",), BUCKETS_RAPIDOS)
+
+
+def campo_ollama(resp, nome: str):
+    try:
+        return resp[nome]
+    except (KeyError, TypeError, AttributeError):
+        return None
+
+
+def registrar_ollama(rota: str, resp):
+    """Contabiliza a resposta do ollama.chat (ou o último chunk do stream, que traz os totais)."""
+    REQUISICOES_OLLAMA.inc(1, rota)
+    for campo, tipo in (("prompt_eval_count", "prompt"), ("eval_count", "gerados")):
+        n = campo_ollama(resp, campo)
+        if n:
+            TOKENS_OLLAMA.inc(n, rota, tipo)
+    for campo, fase in (("load_duration", "load"), ("prompt_eval_duration", "prompt_eval"),
+                        ("eval_duration", "eval"), ("total_duration", "total")):
+        ns = campo_ollama(resp, campo)
+        if ns:
+            TEMPO_OLLAMA.inc(ns / 1e9, rota, fase)
+
+
+# ---------- Servidor ----------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        corpo = texto().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass  # Sem uma linha no terminal por scrape
+
+
+_servidor = None
+
+
+def iniciar(host: str = HOST, porta: int = PORTA):
+    """Sobe o endpoint numa thread de fundo (só escuta em localhost por padrão)."""
+    global _servidor
+    if _servidor is not None:
+        return _servidor
+    try:
+        _servidor = ThreadingHTTPServer((host, porta), _Handler)
+    except OSError as e:
+        print(f"[AVISO] Metricas HTTP indisponiveis em {host}:{porta}: {e}")
+        return None
+    _servidor.daemon_threads = True
+    threading.Thread(target=_servidor.serve_forever, name="metricas-http", daemon=True).start()
+    print(f"[INFO] Metricas em http://{host}:{porta}/metrics")
+    return _servidor
+
+
+def parar():
+    global _servidor
+    if _servidor is not None:
+        _servidor.shutdown()
+        _servidor.server_close()
+        _servidor = None
@@ -0,0 +1,380 @@
+"""
+Latência por etapa do pipeline de voz.
+
+Cada comando tem o seu `Requisicao`, que marca os instantes com
+time.perf_counter_ns (monotônico: não salta com o NTP). Ao terminar, o
+comando entra no agregador do processo, que mantém um histograma
+contínuo por (rota, etapa) e grava uma linha JSON por comando:
+
+    logs/metricas-20250101-120000.jsonl
+    {"t": 1735743600.1, "rota": "tools", "etapas": {"slm": 1234.5, ...},
+     "ollama": {"carga_ms": 3.1, "prefill_ms": 820.4, "decode_tok_s": 11.8, ...},
+     "host": {"temp_c": 81.2, "cpu_mhz": 1500.0, "limitado": true, "motivos": ["throttling"], ...}}
+
+Os arquivos giram por tamanho e os mais antigos são apagados. Os
+percentis de qualquer janela saem desses arquivos com delta_stats.py.
+"""
+
+import os
+import glob
+import json
+import math
+import time
+import threading
+
+import metricas_http
+import telemetria_host
+
+DIRETORIO_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+TAMANHO_MAX = 4 * 1024 * 1024   # Gira o arquivo acima deste tamanho (bytes)
+RETENCAO = 12                   # Quantos arquivos manter
+RAZAO_BUCKETS = 1.05            # Buckets log: percentil com erro relativo de ~2.5%
+
+ROTAS = ("clima", "tools", "chat", "cena", "termostato", "termostato_pausa")
+ETAPAS = ("captura", "preparacao", "slm", "tools", "resposta", "total")
+PERCENTIS = (50, 95, 99)
+
+# (etapa, marca inicial, marca final)
+_PARES = (
+    ("captura", "keyword", "comando_fim"),
+    ("preparacao", "comando_fim", "slm_inicio"),
+    ("slm", "slm_inicio", "slm_fim"),
+    ("tools", "tools_inicio", "tools_fim"),
+    ("resposta", "slm_fim", "resposta_fim"),
+    ("total", "keyword", "resposta_fim"),
+)
+
+
+class HistogramaStreaming:
+    """Histograma com buckets logarítmicos: memória constante, percentis aproximados."""
+
+    __slots__ = ("buckets", "n", "soma", "minimo", "maximo")
+
+    _LOG_RAZAO = math.log(RAZAO_BUCKETS)
+
+    def __init__(self):
+        self.buckets = {}
+        self.n = 0
+        self.soma = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def adicionar(self, valor: float):
+        i = math.floor(math.log(valor) / self._LOG_RAZAO) if valor > 0 else None
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.n += 1
+        self.soma += valor
+        self.minimo = min(self.minimo, valor)
+        self.maximo = max(self.maximo, valor)
+
+    def percentil(self, p: float) -> float | None:
+        if not self.n:
+            return None
+        alvo = max(1, math.ceil(self.n * p / 100))
+        acumulado = 0
+        # O bucket None (valores <= 0) vem primeiro
+        for i in sorted(self.buckets, key=lambda k: -math.inf if k is None else k):
+            acumulado += self.buckets[i]
+            if acumulado >= alvo:
+                if i is None:
+                    return max(self.minimo, 0.0)
+                # Meio geométrico do bucket, limitado ao que foi de fato observado
+                valor = RAZAO_BUCKETS ** (i + 0.5)
+                return min(max(valor, self.minimo), self.maximo)
+        return self.maximo
+
+    def media(self) -> float | None:
+        return self.soma / self.n if self.n else None
+
+
+def desempenho_ollama(resp, parede_s: float | None = None) -> dict:
+    """
+    Decompõe uma resposta do ollama.chat (ou o último chunk do stream) em
+    carga do modelo, prefill do prompt e decode, mais a sobrecarga fora do
+    Ollama (fila, HTTP, cliente): tempo de parede menos total_duration.
+    Tempos em ms; campos ausentes na resposta ficam de fora.
+    """
+    campo = metricas_http.campo_ollama
+    ns = {nome: campo(resp, nome) for nome in ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")}
+    prompt, gerados = campo(resp, "prompt_eval_count"), campo(resp, "eval_count")
+    d = {}
+    if ns["load_duration"] is not None:
+        d["carga_ms"] = ns["load_duration"] / 1e6
+    if ns["prompt_eval_duration"] is not None:
+        d["prefill_ms"] = ns["prompt_eval_duration"] / 1e6
+        if prompt:
+            d["prompt_tokens"] = prompt
+            d["prefill_ms_por_token"] = d["prefill_ms"] / prompt
+            if ns["prompt_eval_duration"]:
+                d["prefill_tok_s"] = prompt / (ns["prompt_eval_duration"] / 1e9)
+    if ns["eval_duration"] is not None:
+        d["decode_ms"] = ns["eval_duration"] / 1e6
+        if gerados:
+            d["gerados_tokens"] = gerados
+            if ns["eval_duration"]:
+                d["decode_tok_s"] = gerados / (ns["eval_duration"] / 1e9)
+    if ns["total_duration"] is not None:
+        d["ollama_ms"] = ns["total_duration"] / 1e6
+        if parede_s is not None:
+            d["parede_ms"] = parede_s * 1000
+            d["sobrecarga_ms"] = max(0.0, d["parede_ms"] - d["ollama_ms"])
+    partes = {"carga": d.get("carga_ms"), "prefill": d.get("prefill_ms"),
+              "decode": d.get("decode_ms"), "sobrecarga": d.get("sobrecarga_ms")}
+    partes = {k: v for k, v in partes.items() if v is not None}
+    if partes:
+        d["gargalo"] = max(partes, key=partes.get)
+    return d
+
+
+class Requisicao:
+    """Marcas de tempo de um comando de voz, da palavra-chave até a resposta."""
+
+    def __init__(self, rota: str | None = None):
+        self.rota = rota
+        self.marcas = {}
+        self.ollama = None
+        self.host = None
+        self._registrada = False
+
+    def marcar(self, evento: str):
+        self.marcas[evento] = time.perf_counter_ns()
+
+    def marcar_keyword(self):
+        self.marcar("keyword")
+
+    def marcar_comando_inicio(self):
+        self.marcar("comando_inicio")
+
+    def marcar_comando_fim(self):
+        self.marcar("comando_fim")
+
+    def marcar_slm_inicio(self):
+        self.marcar("slm_inicio")
+
+    def marcar_slm_fim(self):
+        self.marcar("slm_fim")
+
+    def marcar_tools_inicio(self):
+        self.marcar("tools_inicio")
+
+    def marcar_tools_fim(self):
+        self.marcar("tools_fim")
+
+    def marcar_resposta_fim(self):
+        self.marcar("resposta_fim")
+
+    def registrar_ollama(self, resp):
+        """
+        Guarda os tempos e contagens da resposta do Ollama (chamar logo após
+        marcar_slm_fim; em stream, com o último chunk, que traz os totais).
+        """
+        rota = self.rota or "outros"
+        metricas_http.registrar_ollama(rota, resp)
+        inicio, fim = self.marcas.get("slm_inicio"), self.marcas.get("slm_fim")
+        parede = (fim - inicio) / 1e9 if inicio and fim else None
+        self.ollama = desempenho_ollama(resp, parede)
+        if "decode_tok_s" in self.ollama:
+            metricas_http.DECODE_OLLAMA.observar(self.ollama["decode_tok_s"], rota)
+        if "sobrecarga_ms" in self.ollama:
+            metricas_http.SOBRECARGA_OLLAMA.observar(self.ollama["sobrecarga_ms"] / 1000, rota)
+
+    def etapas(self) -> dict:
+        """Duração (ms) de cada etapa concluída."""
+        m = self.marcas
+        return {
+            etapa: (m[fim] - m[inicio]) / 1e6
+            for etapa, inicio, fim in _PARES
+            if inicio in m and fim in m
+        }
+
+    def _imprimir_ollama(self):
+        """Decomposição do tempo do SLM: carga do modelo, prefill, decode e fila."""
+        o = self.ollama
+        linhas = []
+        if "carga_ms" in o:
+            linhas.append(("  carga do modelo:", o["carga_ms"], ""))
+        if "prefill_ms" in o:
+            por_token = f" ({o['prefill_ms_por_token']:.2f} ms/token)" if "prefill_ms_por_token" in o else ""
+            linhas.append((f"  prefill ({o.get('prompt_tokens', 0)} tokens de prompt):", o["prefill_ms"], por_token))
+        if "decode_ms" in o:
+            taxa = f" ({o['decode_tok_s']:.1f} tokens/s)" if "decode_tok_s" in o else ""
+            linhas.append((f"  decode ({o.get('gerados_tokens', 0)} tokens gerados):", o["decode_ms"], taxa))
+        if "sobrecarga_ms" in o:
+            linhas.append(("  fila/HTTP fora do Ollama:", o["sobrecarga_ms"], ""))
+        for rotulo, ms, extra in linhas:
+            print(f"{rotulo:<39}{ms:>7.1f} ms{extra}")
+        if "gargalo" in o:
+            print(f"  maior parcela do SLM: {o['gargalo']}")
+
+    def registrar_host(self):
+        """Resumo da telemetria do host entre a palavra-chave e agora (se o amostrador estiver ativo)."""
+        amostrador = telemetria_host.AMOSTRADOR
+        if amostrador.ativo():
+            self.host = amostrador.resumo(self.marcas.get("keyword"))
+            amostrador.contar(self.host)
+
+    def _imprimir_host(self):
+        h = self.host
+        partes = [f"{h['temp_c']:.1f} C" if "temp_c" in h else None,
+                  f"{h['cpu_mhz']:.0f} MHz" if "cpu_mhz" in h else None,
+                  f"CPU {h['cpu_pct']:.0f}%" if "cpu_pct" in h else None,
+                  f"mem livre {h['mem_disp_pct']:.0f}%" if "mem_disp_pct" in h else None,
+                  f"swap {h['swap_mb']:.0f} MB" if "swap_mb" in h else None]
+        linha = "Host: " + ", ".join(p for p in partes if p)
+        if h.get("limitado"):
+            linha += f"  [LIMITADO: {', '.join(h['motivos'])}]"
+        print(linha)
+
+    def imprimir(self):
+        """Exibe a latência do comando e o registra no agregador (uma vez por comando)."""
+        etapas = self.etapas()
+        if not self._registrada:
+            self._registrada = True
+            self.registrar_host()
+            AGREGADOR.registrar(self.rota or "outros", etapas, ollama=self.ollama, host=self.host)
+
+        print("\n" + "="*70)
+        print("METRICAS DE LATENCIA")
+        print("="*70)
+
+        rotulos = (
+            ("captura", "Captura de voz (keyword -> silencio):  "),
+            ("preparacao", "Preparacao de prompt:                  "),
+            ("slm", "Processamento SLM:                     "),
+            ("tools", "Execucao de ferramentas:               "),
+            ("resposta", "Geracao de resposta:                   "),
+        )
+        for etapa, rotulo in rotulos:
+            if etapa in etapas:
+                print(f"{rotulo}{etapas[etapa]:>7.1f} ms")
+            if etapa == "slm" and self.ollama:
+                self._imprimir_ollama()
+
+        print("-"*70)
+
+        if "total" in etapas:
+            print(f"LATENCIA TOTAL (keyword -> resposta):  {etapas['total']:>7.1f} ms")
+            print(f"Tempo total: {etapas['total']/1000:.2f} segundos")
+            h = AGREGADOR.histograma(self.rota or "outros", "total")
+            if h is not None and h.n > 1:
+                p = "  ".join(f"p{q} {h.percentil(q):.0f}" for q in PERCENTIS)
+                print(f"Rota {self.rota or 'outros'} (n={h.n}, ms): {p}")
+        if self.host:
+            self._imprimir_host()
+
+        print("="*70 + "\n")
+
+
+def _inicio_do_arquivo(caminho: str) -> float:
+    nome = os.path.basename(caminho)[len("metricas-"):-len(".jsonl")]
+    return time.mktime(time.strptime(nome, "%Y%m%d-%H%M%S"))
+
+
+def arquivos(diretorio: str = DIRETORIO_LOG) -> list:
+    """Arquivos de métricas em ordem cronológica."""
+    return sorted(glob.glob(os.path.join(diretorio, "metricas-*.jsonl")))
+
+
+class Agregador:
+    """Histogramas por (rota, etapa) do processo e o log JSON lines em disco."""
+
+    def __init__(self, diretorio: str = DIRETORIO_LOG):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._arquivo = None
+        self.caminho = None
+
+    def histograma(self, rota: str, etapa: str) -> HistogramaStreaming | None:
+        return self._histogramas.get((rota, etapa))
+
+    def resumo(self) -> dict:
+        """{(rota, etapa): {"n", "media", "p50", "p95", "p99"}} desde o início do processo."""
+        with self._lock:
+            return {
+                chave: {"n": h.n, "media": h.media(), **{f"p{q}": h.percentil(q) for q in PERCENTIS}}
+                for chave, h in self._histogramas.items()
+            }
+
+    def registrar(self, rota: str, etapas: dict, t: float | None = None, ollama: dict | None = None,
+                  host: dict | None = None):
+        t = time.time() if t is None else t
+        with self._lock:
+            for etapa, ms in etapas.items():
+                self._histogramas.setdefault((rota, etapa), HistogramaStreaming()).adicionar(ms)
+                metricas_http.ETAPA_PIPELINE.observar(ms / 1000, rota, etapa)
+            registro = {"t": round(t, 3), "rota": rota,
+                        "etapas": {e: round(ms, 3) for e, ms in etapas.items()}}
+            if ollama:
+                registro["ollama"] = {k: round(v, 3) if isinstance(v, float) else v for k, v in ollama.items()}
+            if host:
+                registro["host"] = host
+            linha = json.dumps(registro)
+            try:
+                self._escrever(linha)
+            except OSError as e:
+                print(f"[AVISO] Nao foi possivel gravar as metricas: {e}")
+
+    def _escrever(self, linha: str):
+        if self._arquivo is None:
+            os.makedirs(self.diretorio, exist_ok=True)
+            existentes = arquivos(self.diretorio)
+            self.caminho = existentes[-1] if existentes else self._novo_caminho()
+            self._arquivo = open(self.caminho, "a", encoding="utf-8")
+        self._arquivo.write(linha + "\n")
+        self._arquivo.flush()
+        if self._arquivo.tell() >= TAMANHO_MAX:
+            self._girar()
+
+    def _novo_caminho(self) -> str:
+        return os.path.join(self.diretorio, time.strftime("metricas-%Y%m%d-%H%M%S.jsonl"))
+
+    def _girar(self):
+        self._arquivo.close()
+        self.caminho = self._novo_caminho()
+        self._arquivo = open(self.caminho, "a", encoding="utf-8")
+        for antigo in arquivos(self.diretorio)[:-RETENCAO]:
+            try:
+                os.remove(antigo)
+            except OSError:
+                pass
+
+    def fechar(self):
+        with self._lock:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+
+
+AGREGADOR = Agregador()
+
+
+def registros(t0: float, t1: float | None = None, diretorio: str = DIRETORIO_LOG):
+    """Gera os registros (dicts) dos comandos com t0 <= t < t1, lendo só os arquivos da janela."""
+    t1 = time.time() if t1 is None else t1
+    todos = arquivos(diretorio)
+    for i, caminho in enumerate(todos):
+        inicio = _inicio_do_arquivo(caminho)
+        fim = _inicio_do_arquivo(todos[i + 1]) if i + 1 < len(todos) else math.inf
+        if fim < t0 or inicio >= t1:
+            continue
+        with open(caminho, encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    continue  # Linha cortada por uma queda de energia
+                if t0 <= registro["t"] < t1:
+                    yield registro
+
+
+def ler(t0: float, t1: float | None = None, diretorio: str = DIRETORIO_LOG, ollama: bool = False):
+    """
+    Gera (t, rota, {etapa: ms}) dos comandos com t0 <= t < t1; com
+    ollama=True, (t, rota, etapas, desempenho_ollama ou {}).
+    """
+    for registro in registros(t0, t1, diretorio):
+        if ollama:
+            yield registro["t"], registro["rota"], registro["etapas"], registro.get("ollama", {})
+        else:
+            yield registro["t"], registro["rota"], registro["etapas"]
@@ -0,0 +1,213 @@
+"""
+Perfilador por amostragem para o DELTA em execução, sem reiniciar.
+
+Ligado, uma thread lê a pilha de todas as threads (loop principal, LED,
+filas dos dispositivos, sensores...) a cada INTERVALO segundos via
+sys._current_frames e, ao final, grava as pilhas no formato "collapsed"
+(uma linha "thread;f1;f2;f3 N" por pilha), que abre direto em
+https://www.speedscope.app ou vira SVG com flamegraph.pl / inferno. A
+amostragem é por tempo de parede: threads esperando (rede, Ollama, sleep)
+aparecem, o que é o que interessa para latência.
+
+Desligado não há thread amostrando: o custo é zero. Liga e desliga por:
+
+    kill -USR2 <pid>                        # alterna (liga por DURACAO segundos)
+    python3 perfilador.py iniciar 30        # pelo socket local
+    python3 perfilador.py parar
+    python3 perfilador.py estado
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+from collections import Counter
+
+DIRETORIO_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+INTERVALO = 0.005   # Período de amostragem (s): 200 Hz
+DURACAO = 30.0      # Duração padrão de uma captura (s)
+SOCKET = f"/tmp/delta-perfilador-{os.getuid()}.sock"
+
+_lock = threading.Lock()
+_captura = None
+
+
+def _rotulo(codigo) -> str:
+    return f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}"
+
+
+class Captura:
+    """Uma sessão de amostragem; grava o arquivo ao terminar."""
+
+    def __init__(self, duracao: float, caminho: str | None = None, intervalo: float = INTERVALO):
+        if caminho is None:
+            os.makedirs(DIRETORIO_LOG, exist_ok=True)
+            caminho = os.path.join(DIRETORIO_LOG, time.strftime("perfil-%Y%m%d-%H%M%S.folded"))
+        self.caminho = caminho
+        self.duracao = duracao
+        self.intervalo = intervalo
+        self.pilhas = Counter()
+        self.amostras = 0
+        self.custo_s = 0.0
+        self.inicio = time.monotonic()
+        self._parar = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="perfilador", daemon=True)
+
+    def _amostrar(self, nomes: dict):
+        proprio = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == proprio:
+                continue
+            pilha = []
+            while frame is not None:
+                pilha.append(_rotulo(frame.f_code))
+                frame = frame.f_back
+            pilha.append(nomes.get(ident, f"thread-{ident}"))
+            self.pilhas[";".join(reversed(pilha))] += 1
+        self.amostras += 1
+
+    def _loop(self):
+        fim = self.inicio + self.duracao
+        while not self._parar.is_set() and time.monotonic() < fim:
+            t0 = time.perf_counter()
+            # Threads nascem e morrem (timers, pipelines): nomes relidos a cada amostra
+            self._amostrar({t.ident: t.name for t in threading.enumerate()})
+            self.custo_s += time.perf_counter() - t0
+            self._parar.wait(self.intervalo)
+        self._gravar()
+
+    def _gravar(self):
+        global _captura
+        try:
+            with open(self.caminho, "w", encoding="utf-8") as f:
+                for pilha, n in self.pilhas.most_common():
+                    f.write(f"{pilha} {n}\n")
+            custo = self.custo_s / self.amostras * 1e6 if self.amostras else 0.0
+            print(f"[INFO] Perfil gravado em {self.caminho} ({self.amostras} amostras, "
+                  f"{custo:.0f} us por amostra)")
+        except OSError as e:
+            print(f"[AVISO] Nao foi possivel gravar o perfil: {e}")
+        with _lock:
+            if _captura is self:
+                _captura = None
+
+    def iniciar(self):
+        self._thread.start()
+
+    def parar(self, esperar: bool = False):
+        self._parar.set()
+        if esperar:
+            self._thread.join()
+
+
+def iniciar(duracao: float = DURACAO, caminho: str | None = None) -> Captura:
+    """Começa uma captura (ou devolve a que já está rodando)."""
+    global _captura
+    with _lock:
+        if _captura is None:
+            _captura = Captura(duracao, caminho)
+            _captura.iniciar()
+            print(f"[INFO] Perfilador ligado por {duracao:.0f} s")
+        return _captura
+
+
+def parar(esperar: bool = False) -> Captura | None:
+    """Encerra a captura em andamento; o arquivo é gravado pela thread do perfilador."""
+    with _lock:
+        captura = _captura
+    if captura is not None:
+        captura.parar(esperar)
+    return captura
+
+
+def ativo() -> bool:
+    return _captura is not None
+
+
+def alternar(signum=None, frame=None):
+    """Handler do SIGUSR2: liga por DURACAO segundos ou encerra a captura em andamento."""
+    if ativo():
+        parar()
+    else:
+        iniciar()
+
+
+# ---------- Controle por socket local ----------
+
+def _atender(conexao: socket.socket):
+    with conexao:
+        partes = conexao.recv(256).decode("utf-8", "replace").split()
+        comando = partes[0] if partes else ""
+        if comando == "iniciar":
+            try:
+                duracao = float(partes[1]) if len(partes) > 1 else DURACAO
+            except ValueError:
+                conexao.sendall(b"erro: duracao invalida\n")
+                return
+            captura = iniciar(duracao)
+            resposta = f"ligado ({captura.duracao:.0f} s) -> {captura.caminho}"
+        elif comando == "parar":
+            captura = parar(esperar=True)
+            resposta = f"gravado {captura.caminho} ({captura.amostras} amostras)" if captura else "nao estava ligado"
+        elif comando == "estado":
+            captura = _captura
+            resposta = (f"ligado ha {time.monotonic() - captura.inicio:.0f} s, {captura.amostras} amostras"
+                        if captura else "desligado")
+        else:
+            resposta = "comandos: iniciar [segundos] | parar | estado"
+        conexao.sendall((resposta + "\n").encode("utf-8"))
+
+
+def _servir(servidor: socket.socket):
+    while True:
+        try:
+            conexao, _ = servidor.accept()
+        except OSError:
+            return
+        try:
+            _atender(conexao)
+        except OSError:
+            pass
+
+
+def iniciar_socket(caminho: str = SOCKET) -> bool:
+    """Escuta comandos em um socket Unix (só o próprio usuário acessa)."""
+    try:
+        if os.path.exists(caminho):
+            os.remove(caminho)  # Sobra de uma execução anterior
+        servidor = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        servidor.bind(caminho)
+        os.chmod(caminho, 0o600)
+        servidor.listen(1)
+    except OSError as e:
+        print(f"[AVISO] Socket do perfilador indisponivel ({caminho}): {e}")
+        return False
+    threading.Thread(target=_servir, args=(servidor,), name="perfilador-socket", daemon=True).start()
+    return True
+
+
+def enviar(comando: str, caminho: str = SOCKET, timeout: float = 60.0) -> str:
+    """Cliente: manda um comando para o DELTA em execução e devolve a resposta."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as cliente:
+        cliente.settimeout(timeout)
+        cliente.connect(caminho)
+        cliente.sendall(comando.encode("utf-8"))
+        return cliente.recv(4096).decode("utf-8").strip()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("iniciar", "parar", "estado"):
+        print("uso: python3 perfilador.py iniciar [segundos] | parar | estado")
+        return 2
+    try:
+        print(enviar(" ".join(argv)))
+    except OSError as e:
+        print(f"[ERRO] DELTA nao esta ouvindo em {SOCKET}: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+"""
+Núcleo assíncrono do DELTA: estágios ligados por filas limitadas.
+
+    captura -> ASR -> roteamento -> inferência -> execução
+    PortAudio  Vosk   classificar   Ollama       Tuya, LED, resposta
+
+Cada estágio é uma tarefa asyncio. O que bloqueia (leitura da fila do
+PortAudio, Vosk, sensores, tinytuya) roda em executores; o Ollama vai pelo
+AsyncClient, então um comando que estoura PRAZO_COMANDO é cancelado de
+verdade (a requisição HTTP é abortada). Uma fila cheia segura o estágio
+anterior (back-pressure); na ponta, a fila do PortAudio descarta o áudio
+mais antigo e conta (captura_audio).
+
+Dentro de um comando, o que é independente anda junto: as conexões Tuya
+dos dispositivos citados na frase são preparadas enquanto o prompt é
+montado e o SLM responde, a leitura dos sensores e a tendência saem em
+paralelo, e tool calls para dispositivos diferentes executam em paralelo.
+Como no loop síncrono, o DELTA não escuta enquanto responde.
+
+    python3 delta.py --async
+"""
+
+import re
+import json
+import time
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import ollama
+
+import cenas
+import rastreamento
+import metricas_latencia
+
+FILA_AUDIO = 8          # Blocos entre captura e ASR (2 s)
+FILA_COMANDOS = 2       # Frases esperando roteamento
+FILA_INFERENCIA = 1
+FILA_EXECUCAO = 1
+PRAZO_COMANDO = 60.0    # Tempo máximo de inferência de um comando (s)
+WORKERS_IO = 4          # Threads para sensores, Tuya e ferramentas
+TIMEOUT_LEITURA = 0.5   # Espera máxima por um bloco de áudio, para a captura ser cancelável (s)
+
+# Palavras da frase -> dispositivos cujas conexões vale preparar durante o SLM
+PREVISAO_DISPOSITIVOS = {
+    "ar": {"ar", "ac", "condicionado", "esfria", "esfriar", "refresca", "refrescar"},
+    "interruptor": {"ventilador", "ventoinha", "teto", "luz", "lampada"},
+    "lampada": {"lampada", "luz", "brilho"},
+}
+
+# Dispositivos tocados por cada ferramenta: chamadas que não compartilham
+# dispositivo rodam em paralelo; as que compartilham, em ordem
+DISPOSITIVOS_FERRAMENTA = {
+    "set_ac_state": {"ar"},
+    "set_fan_state": {"interruptor"},
+    "set_ceiling_lamp_state": {"interruptor"},
+    "set_lamp_state": {"interruptor", "lampada"},
+}
+TODOS = {"ar", "interruptor", "lampada"}
+
+
+def dispositivos_previstos(texto: str) -> set:
+    palavras = set(re.findall(r"\w+", texto.lower()))
+    return {nome for nome, chaves in PREVISAO_DISPOSITIVOS.items() if palavras & chaves}
+
+
+def agrupar_chamadas(chamadas: list) -> list:
+    """Listas de (índice, nome, args); grupos diferentes não compartilham dispositivo."""
+    grupos = []  # [(dispositivos, [(i, nome, args)])]
+    for i, (nome, args) in enumerate(chamadas):
+        alvo = DISPOSITIVOS_FERRAMENTA.get(nome, TODOS)
+        juntos = [g for g in grupos if g[0] & alvo]
+        dispositivos, itens = set(alvo), []
+        for g in juntos:
+            grupos.remove(g)
+            dispositivos |= g[0]
+            itens += g[1]
+        grupos.append((dispositivos, sorted(itens) + [(i, nome, args)]))
+    return [itens for _, itens in grupos]
+
+
+class Comando:
+    """Uma frase atravessando o pipeline."""
+
+    __slots__ = ("texto", "req", "rota", "cena", "media", "tool_calls", "resposta",
+                 "erro", "aquecimento", "concluido")
+
+    def __init__(self, texto: str, req: metricas_latencia.Requisicao):
+        self.texto = texto
+        self.req = req
+        self.rota = None
+        self.cena = None
+        self.media = None
+        self.tool_calls = None
+        self.resposta = None
+        self.erro = None
+        self.aquecimento = None
+        self.concluido = asyncio.get_running_loop().create_future()
+
+
+class PipelineAsync:
+    """
+    `delta` é o módulo do núcleo (delta.py): roteamento, prompts, ferramentas,
+    LED e configuração do SLM vêm dele, os mesmos do loop síncrono.
+    """
+
+    def __init__(self, delta, captura=None, reconhecedor=None):
+        self.delta = delta
+        self.captura = captura
+        self.reconhecedor = reconhecedor
+        self.cliente = None
+        self.filas = {}
+        self._tarefas = []
+        self._io = ThreadPoolExecutor(WORKERS_IO, thread_name_prefix="pipeline-io")
+        self._asr = ThreadPoolExecutor(1, thread_name_prefix="pipeline-asr")  # Vosk não é thread-safe
+        self._leitor = ThreadPoolExecutor(1, thread_name_prefix="pipeline-captura")
+
+    async def _bloqueante(self, executor, funcao, *args, **kwargs):
+        # Como asyncio.to_thread: o span corrente (ContextVar) segue para a thread
+        contexto = contextvars.copy_context()
+        chamada = functools.partial(contexto.run, funcao, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(executor, chamada)
+
+    async def io(self, funcao, *args, **kwargs):
+        return await self._bloqueante(self._io, funcao, *args, **kwargs)
+
+    # ---------- ciclo de vida ----------
+
+    async def iniciar(self, audio: bool = True):
+        """Sobe os estágios (sem captura/ASR com audio=False: frases via submeter)."""
+        self.cliente = ollama.AsyncClient()
+        self.filas = {
+            "audio": asyncio.Queue(FILA_AUDIO),
+            "comandos": asyncio.Queue(FILA_COMANDOS),
+            "inferencia": asyncio.Queue(FILA_INFERENCIA),
+            "execucao": asyncio.Queue(FILA_EXECUCAO),
+        }
+        estagios = [self._rotear, self._inferir, self._executar]
+        if audio:
+            estagios = [self._capturar, self._reconhecer] + estagios
+        self._tarefas = [asyncio.create_task(e(), name=e.__name__.strip("_")) for e in estagios]
+
+    async def parar(self):
+        """Cancela os estágios e libera os executores (threads em andamento terminam sozinhas)."""
+        for tarefa in self._tarefas:
+            tarefa.cancel()
+        await asyncio.gather(*self._tarefas, return_exceptions=True)
+        self._tarefas = []
+        for executor in (self._io, self._asr, self._leitor):
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def rodar(self):
+        """Pipeline completo até ser cancelado (Ctrl+C) ou um estágio falhar."""
+        await self.iniciar()
+        try:
+            feitas, _ = await asyncio.wait(self._tarefas, return_when=asyncio.FIRST_EXCEPTION)
+            for tarefa in feitas:
+                tarefa.result()
+        finally:
+            await self.parar()
+
+    async def submeter(self, texto: str, req: metricas_latencia.Requisicao) -> Comando:
+        """Entrega uma frase ao roteamento e espera o comando terminar."""
+        self.delta.metricas = req
+        cmd = Comando(texto, req)
+        with rastreamento.span("comando", caracteres=len(texto)) as s:
+            await self.filas["comandos"].put(cmd)
+            await cmd.concluido
+            s.definir(rota=cmd.rota)
+        return cmd
+
+    # ---------- estágios ----------
+
+    async def _capturar(self):
+        while True:
+            dados = await self._bloqueante(self._leitor, self.captura.ler, TIMEOUT_LEITURA)
+            if dados is not None:
+                await self.filas["audio"].put(dados)
+
+    def _descartar_audio(self):
+        fila = self.filas["audio"]
+        while not fila.empty():
+            fila.get_nowait()
+
+    async def _reconhecer(self):
+        """Palavra-chave e captura do comando (mesma máquina de estados do loop síncrono)."""
+        import audioop
+
+        d, rec, led = self.delta, self.reconhecedor, self.delta.led
+        ouvindo, ultimo_voz, inicio, req = False, 0.0, 0.0, None
+        print(f"[STATUS] Aguardando palavra-chave: '{d.PALAVRA_CHAVE}'")
+        while True:
+            dados = await self.filas["audio"].get()
+            self.captura.verificar()
+            aceito = await self._bloqueante(self._asr, self.captura.decodificar, rec, dados)
+
+            if not ouvindo:
+                if aceito and d.PALAVRA_CHAVE in json.loads(rec.Result()).get("text", "").lower():
+                    print("[STATUS] Palavra-chave detectada. Aguardando comando...")
+                    req = metricas_latencia.Requisicao()
+                    req.marcar_keyword()
+                    ouvindo = True
+                    ultimo_voz = inicio = time.time()
+                    rec.Reset()
+                    self.captura.iniciar_frase()
+                    if led:
+                        led.estado_keyword_detectada()
+                continue
+
+            if audioop.rms(dados, 2) > d.LIMIAR_RUIDO:
+                ultimo_voz = time.time()
+            estourou = time.time() - inicio > d.TEMPO_MAXIMO_CAPTURA
+            if not estourou and time.time() - ultimo_voz <= d.TEMPO_SILENCIO:
+                continue
+
+            if estourou:
+                print(f"[INFO] Limite de tempo atingido ({d.TEMPO_MAXIMO_CAPTURA}s). Processando...")
+            comando = self.captura.concluir_frase(rec)
+            ouvindo = False
+            rec.Reset()
+            if comando:
+                print(f"[USER] {comando}")
+                self.captura.pausar()
+                if led:
+                    led.estado_processando_slm()
+                try:
+                    await self.submeter(comando, req)
+                finally:
+                    self._descartar_audio()
+                    self.captura.retomar()
+            else:
+                print("[INFO] Nenhum comando detectado. Cancelando." if not estourou
+                      else "[INFO] Nenhum comando detectado apos limite de tempo.")
+                print("-" * 40)
+            if led:
+                led.estado_ouvindo_keyword()
+            print(f"[STATUS] Aguardando palavra-chave: '{d.PALAVRA_CHAVE}'")
+
+    async def _rotear(self):
+        while True:
+            cmd = await self.filas["comandos"].get()
+            cmd.rota, cmd.cena = self.delta.classificar_rota(cmd.texto)
+            cmd.req.rota = cmd.rota
+            self.delta.log.debug("Rota: %s", cmd.rota)
+            cmd.req.marcar_comando_fim()
+            if cmd.rota == "tools":
+                # Conexões Tuya preparadas já aqui, em paralelo com prompt e SLM
+                cmd.aquecimento = asyncio.ensure_future(self._aquecer(dispositivos_previstos(cmd.texto)))
+            await self.filas["inferencia"].put(cmd)
+
+    async def _aquecer(self, dispositivos: set):
+        import fila_comandos
+
+        await asyncio.gather(*(self.io(fila_comandos.aquecer, nome) for nome in dispositivos),
+                             return_exceptions=True)
+
+    async def _inferir(self):
+        while True:
+            cmd = await self.filas["inferencia"].get()
+            try:
+                await asyncio.wait_for(self._inferir_comando(cmd), PRAZO_COMANDO)
+            except asyncio.TimeoutError:
+                cmd.erro = f"tempo esgotado ({PRAZO_COMANDO:g} s)"
+            except Exception as e:
+                cmd.erro = str(e)
+                self.delta.log.debug("Falha na inferencia", exc_info=True)
+            await self.filas["execucao"].put(cmd)
+
+    async def _chat(self, req, rota: str, prompt: str, **kwargs):
+        d = self.delta
+        req.marcar_slm_inicio()
+        with rastreamento.span("ollama.chat", modelo=d.MODELO_LLM, rota=rota):
+            resp = await self.cliente.chat(
+                model=d.MODELO_LLM,
+                messages=[{"role": "system", "content": d.SYSTEM_PROMPT}, {"role": "user", "content": prompt}],
+                **kwargs,
+            )
+            req.marcar_slm_fim()
+            req.registrar_ollama(resp)
+        d.log.debug("Resposta da SLM: %s", resp)
+        return resp
+
+    async def _inferir_comando(self, cmd: Comando):
+        d, req = self.delta, cmd.req
+        if cmd.rota in ("cena", "termostato", "termostato_pausa"):
+            return
+
+        if cmd.rota == "clima":
+            dados, tendencia = await asyncio.gather(self.io(d.ler_sensores), self.io(d.descrever_tendencia))
+            if dados["media_temp_c"] is None:
+                cmd.resposta = "Nao consegui ler os sensores agora."
+                return
+            prompt = d.montar_prompt_clima(dados, tendencia)
+            d.log.debug("Prompt enviado para SLM:\n%s", prompt)
+            resp = await self._chat(req, "clima", prompt, options=d.OPCOES_SLM)
+            cmd.resposta = resp["message"]["content"].strip()
+
+        elif cmd.rota == "tools":
+            dados = await self.io(d.ler_sensores)
+            cmd.media = dados["media_temp_c"]
+            prompt = d.montar_prompt_ferramentas(cmd.texto, cmd.media)
+            d.log.debug("Prompt enviado para SLM:\n%s", prompt)
+            resp = await self._chat(req, "tools", prompt, tools=d.TOOLS, options=d.OPCOES_SLM)
+            cmd.tool_calls = resp["message"].get("tool_calls") or resp["message"].get("toolcalls")
+            cmd.resposta = (resp["message"].get("content") or "").strip()
+
+        else:
+            # Conversa: os tokens vão para o terminal conforme chegam
+            print("[DELTA] ", end="", flush=True)
+            req.marcar_slm_inicio()
+            partes, chunk = [], None
+            with rastreamento.span("ollama.chat", modelo=d.MODELO_LLM, rota="chat", stream=True):
+                async for chunk in await self.cliente.chat(
+                    model=d.MODELO_LLM,
+                    messages=[{"role": "system", "content": d.SYSTEM_PROMPT}, {"role": "user", "content": cmd.texto}],
+                    options={**d.OPCOES_SLM, "num_predict": 60, "temperature": 0.1, "top_k": 20},
+                    stream=True,
+                ):
+                    pedaco = chunk["message"]["content"].replace("\n", " ")
+                    print(pedaco, end="", flush=True)
+                    partes.append(pedaco)
+                print()
+                req.marcar_slm_fim()
+                req.registrar_ollama(chunk)  # O último chunk traz contagens e tempos
+            cmd.resposta = "".join(partes)
+
+    async def _executar(self):
+        while True:
+            cmd = await self.filas["execucao"].get()
+            try:
+                await self._executar_comando(cmd)
+            except Exception as e:
+                print(f"[ERRO] {e}")
+                self.delta.log.debug("Falha na execucao", exc_info=True)
+            finally:
+                if cmd.aquecimento is not None and not cmd.aquecimento.done():
+                    cmd.aquecimento.cancel()
+                if not cmd.concluido.done():
+                    cmd.concluido.set_result(cmd)
+
+    async def _executar_ferramentas(self, cmd: Comando) -> list:
+        chamadas = []
+        for call in cmd.tool_calls:
+            args = call["function"]["arguments"]
+            if isinstance(args, str):
+                args = json.loads(args)
+            chamadas.append((call["function"]["name"], args))
+
+        def executar_grupo(itens):
+            saida = []
+            for i, nome, args in itens:
+                self.delta.log.debug("Executando tool %s", nome, extra={"dados": args})
+                resultados = []
+                with rastreamento.span(f"tool.{nome}", argumentos=args):
+                    self.delta.executar_ferramenta(nome, args, cmd.media, resultados)
+                saida.append((i, resultados))
+            return saida
+
+        grupos = await asyncio.gather(*(self.io(executar_grupo, g) for g in agrupar_chamadas(chamadas)))
+        return [r for _, resultados in sorted(item for g in grupos for item in g) for r in resultados]
+
+    async def _executar_comando(self, cmd: Comando):
+        d, req, led = self.delta, cmd.req, self.delta.led
+        if cmd.erro:
+            print(("\n" if cmd.rota == "chat" else "") + f"[ERRO] {cmd.erro}")
+            return
+
+        if cmd.rota == "termostato":
+            await self.io(d.controle_clima.retomar)
+            print("[DELTA] Termostato automatico retomado.")
+
+        elif cmd.rota == "termostato_pausa":
+            await self.io(d.controle_clima.pausar)
+            print("[DELTA] Termostato automatico pausado.")
+
+        elif cmd.rota == "cena":
+            req.marcar_tools_inicio()
+            with rastreamento.span("cena", nome=cmd.cena):
+                resultado = await self.io(cenas.executar_cena, cmd.cena)
+                d.controle_clima.registrar_cena(cenas.passos_aplicados(cmd.cena, resultado))
+            req.marcar_tools_fim()
+            print(f"[DELTA][CENA] {resultado}")
+            if led:
+                led.estado_respondendo()
+            print(f"[DELTA] {d.resumo_cena(cmd.cena, resultado)}.")
+
+        elif cmd.rota == "tools" and cmd.tool_calls:
+            d.log.debug("SLM chamou %d tool(s)", len(cmd.tool_calls))
+            req.marcar_tools_inicio()
+            resultados = await self._executar_ferramentas(cmd)
+            req.marcar_tools_fim()
+            if led:
+                led.estado_respondendo()
+            print(f"[DELTA] {'. '.join(resultados)}.")
+
+        elif cmd.rota != "chat":
+            if led:
+                led.estado_respondendo()
+            print(f"[DELTA] {cmd.resposta or 'Comando processado.'}")
+
+        req.marcar_resposta_fim()
+        req.imprimir()
+
+
+def executar(delta, captura, reconhecedor):
+    """Roda o pipeline com áudio até Ctrl+C (chamado pelo main do delta.py)."""
+    asyncio.run(PipelineAsync(delta, captura, reconhecedor).rodar())
@@ -0,0 +1,221 @@
+"""
+Rastreamento leve do pipeline: spans aninhados com atributos, exportados no
+formato Trace Event do Chrome (abre em https://ui.perfetto.dev ou
+chrome://tracing).
+
+    DELTA_TRACE=1 python3 delta.py           # grava logs/trace-20250101-120000.json
+    DELTA_TRACE=/tmp/delta.json python3 delta.py
+
+    with rastreamento.span("tuya.frame", dispositivo="ar", dps=[1, 2]) as s:
+        ...
+        s.definir(bytes=42)
+
+Desligado (padrão), `span()` devolve sempre o mesmo objeto vazio: o custo é
+uma checagem de flag por chamada. O span corrente fica num ContextVar, então
+o aninhamento vale por thread (e por tarefa asyncio). Escritas entregues a
+outra thread (fila_comandos) são ligadas ao span de origem por eventos de
+fluxo, que o visualizador desenha como setas.
+"""
+
+import os
+import json
+import time
+import atexit
+import functools
+import itertools
+import threading
+import contextvars
+
+DIRETORIO_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs")
+LOTE = 256  # Eventos acumulados antes de gravar no arquivo
+
+_ativo = False
+_arquivo = None
+_lock = threading.Lock()
+_buffer = []
+_primeiro = True
+_threads_nomeadas = set()
+_ids = itertools.count(1)
+_pid = os.getpid()
+_corrente = contextvars.ContextVar("span_corrente", default=None)
+
+
+class _SpanNulo:
+    """Span do modo desligado: não mede nem guarda nada."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def definir(self, **atributos):
+        pass
+
+
+_NULO = _SpanNulo()
+
+
+class Span:
+    __slots__ = ("nome", "atributos", "inicio", "_token")
+
+    def __init__(self, nome: str, atributos: dict):
+        self.nome = nome
+        self.atributos = atributos
+        self.inicio = 0
+        self._token = None
+
+    def definir(self, **atributos):
+        self.atributos.update(atributos)
+
+    def __enter__(self):
+        self._token = _corrente.set(self)
+        self.inicio = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, tipo, erro, tb):
+        fim = time.perf_counter_ns()
+        _corrente.reset(self._token)
+        if tipo is not None:
+            self.atributos["erro"] = f"{tipo.__name__}: {erro}"
+        _registrar({
+            "name": self.nome, "ph": "X", "pid": _pid, "tid": _tid(),
+            "ts": self.inicio / 1000, "dur": (fim - self.inicio) / 1000,
+            "args": self.atributos,
+        })
+        return False
+
+
+def _tid() -> int:
+    tid = threading.get_native_id()
+    if tid not in _threads_nomeadas:
+        _threads_nomeadas.add(tid)
+        _registrar({"name": "thread_name", "ph": "M", "pid": _pid, "tid": tid,
+                    "args": {"name": threading.current_thread().name}})
+    return tid
+
+
+def span(nome: str, /, **atributos):
+    """Context manager de um span; no modo desligado, um objeto vazio compartilhado."""
+    if not _ativo:
+        return _NULO
+    return Span(nome, atributos)
+
+
+def rastrear(nome: str | None = None):
+    """Decorador: cada chamada da função vira um span (nome padrão: modulo.funcao)."""
+    def decorador(funcao):
+        rotulo = nome or f"{funcao.__module__}.{funcao.__name__}"
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _ativo:
+                return funcao(*args, **kwargs)
+            with Span(rotulo, {}):
+                return funcao(*args, **kwargs)
+
+        return envolvida
+    return decorador
+
+
+def intervalo(nome: str, inicio_ns: int, /, **atributos):
+    """
+    Grava um span já terminado, de `inicio_ns` (perf_counter_ns) até agora: para
+    trabalho espalhado por várias iterações de um loop (o ASR de uma frase).
+    """
+    if not _ativo:
+        return
+    fim = time.perf_counter_ns()
+    _registrar({
+        "name": nome, "ph": "X", "pid": _pid, "tid": _tid(),
+        "ts": inicio_ns / 1000, "dur": (fim - inicio_ns) / 1000,
+        "args": atributos,
+    })
+
+
+def definir(**atributos):
+    """Acrescenta atributos ao span corrente (se houver e se o rastreamento estiver ligado)."""
+    if _ativo:
+        atual = _corrente.get()
+        if atual is not None:
+            atual.atributos.update(atributos)
+
+
+def iniciar_fluxo() -> int | None:
+    """Marca, no span corrente, a origem de um trabalho entregue a outra thread."""
+    if not _ativo:
+        return None
+    fluxo = next(_ids)
+    _registrar({"name": "fluxo", "cat": "fluxo", "ph": "s", "id": fluxo, "pid": _pid,
+                "tid": _tid(), "ts": time.perf_counter_ns() / 1000})
+    return fluxo
+
+
+def concluir_fluxo(fluxo: int | None):
+    """Liga o span corrente (na thread que fez o trabalho) à origem marcada por iniciar_fluxo."""
+    if fluxo is None or not _ativo:
+        return
+    _registrar({"name": "fluxo", "cat": "fluxo", "ph": "f", "bp": "e", "id": fluxo, "pid": _pid,
+                "tid": _tid(), "ts": time.perf_counter_ns() / 1000})
+
+
+def _registrar(evento: dict):
+    with _lock:
+        _buffer.append(evento)
+        cheio = len(_buffer) >= LOTE
+    if cheio:
+        gravar()
+
+
+def gravar():
+    """Grava os eventos acumulados (o arquivo é um array JSON aberto, válido mesmo sem o fim)."""
+    global _buffer, _primeiro
+    with _lock:
+        if _arquivo is None:
+            return
+        eventos, _buffer = _buffer, []
+        for evento in eventos:
+            _arquivo.write(("" if _primeiro else ",\n") + json.dumps(evento, default=str))
+            _primeiro = False
+        _arquivo.flush()
+
+
+def ativar(caminho: str | None = None) -> str:
+    """Liga o rastreamento gravando em `caminho` (padrão logs/trace-<data>.json)."""
+    global _ativo, _arquivo, _primeiro
+    with _lock:
+        if _arquivo is None:
+            if caminho is None:
+                os.makedirs(DIRETORIO_LOG, exist_ok=True)
+                caminho = os.path.join(DIRETORIO_LOG, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+            _arquivo = open(caminho, "w", encoding="utf-8")
+            _arquivo.write("[\n")
+            _primeiro = True
+            _threads_nomeadas.clear()
+        _ativo = True
+    return _arquivo.name
+
+
+def desativar():
+    """Desliga o rastreamento e fecha o arquivo."""
+    global _ativo, _arquivo
+    _ativo = False
+    gravar()
+    with _lock:
+        if _arquivo is not None:
+            _arquivo.write("\n]\n")
+            _arquivo.close()
+            _arquivo = None
+
+
+def ativo() -> bool:
+    return _ativo
+
+
+atexit.register(desativar)
+
+_ambiente = os.environ.get("DELTA_TRACE", "")
+if _ambiente and _ambiente != "0":
+    print(f"[INFO] Rastreamento em {ativar(None if _ambiente == '1' else _ambiente)}")
@@ -0,0 +1,258 @@
+"""
+Registro de dispositivos compilado a partir dos dumps Tuya.
+
+Combina auxiliar/tuya/guidelines.json (nomes de comando, aliases, faixas em
+unidades do usuário) com auxiliar/tuya/devices.json (tipos, escala e enums do
+protocolo) numa tabela compacta de codecs por dispositivo. O resultado é
+salvo em `registro_cache.json` com a versão do compilador e um hash das
+fontes, e recarregado na inicialização; é recompilado quando o compilador
+muda (VERSAO_COMPILADOR) ou quando o conteúdo das fontes não bate.
+
+    python registro_dispositivos.py      # recompila e mostra o resumo
+"""
+
+import os
+import json
+import hashlib
+
+_BASE = os.path.dirname(os.path.abspath(__file__))
+FONTE_DEVICES = os.path.join(_BASE, "..", "auxiliar", "tuya", "devices.json")
+FONTE_GUIDELINES = os.path.join(_BASE, "..", "auxiliar", "tuya", "guidelines.json")
+CACHE_PATH = os.path.join(_BASE, "registro_cache.json")
+# Incrementar a cada mudança que altere a tabela gerada (invalida caches antigos)
+# 2: casamento de esquema por categoria, ids placeholder ignorados (escala do ar)
+VERSAO_COMPILADOR = 2
+
+VALORES_TRUE = frozenset(("on", "ligar", "true", "1"))
+VALORES_FALSE = frozenset(("off", "desligar", "false", "0"))
+
+
+class Codec:
+    """Valida, codifica e limita valores de um comando (um DPS ou um preset)."""
+
+    __slots__ = ("comando", "dps", "tipo", "mapa", "minimo", "maximo", "escala", "alt", "frames")
+
+    def __init__(self, comando: str, entrada: dict):
+        self.comando = comando
+        self.tipo = entrada["tipo"]
+        self.dps = int(entrada["dps"]) if entrada["dps"].isdigit() else None
+        self.mapa = entrada.get("mapa", {})
+        self.minimo = entrada.get("min")
+        self.maximo = entrada.get("max")
+        self.escala = entrada.get("escala", 1)
+        self.alt = tuple(entrada["alt"]) if "alt" in entrada else None
+        self.frames = {k: {int(d): v for d, v in f.items()} for k, f in entrada.get("frames", {}).items()}
+
+    def _inteiro(self, valor):
+        """Converte para a unidade do usuário; aplica faixa alternativa (ex: 1-100%)."""
+        if isinstance(valor, str):
+            v = valor.lower()
+            if v in self.mapa:
+                return None, self.mapa[v]
+        try:
+            n = round(float(valor))
+        except (TypeError, ValueError):
+            return None, None
+        if self.alt and self.alt[0] <= n <= self.alt[1]:
+            n *= self.alt[2]
+        return n, None
+
+    def codificar(self, valor):
+        """Valor do protocolo, ou None se inválido/fora da faixa."""
+        if self.tipo == "bool":
+            if isinstance(valor, bool):
+                return valor
+            v = str(valor).lower()
+            if v in VALORES_TRUE:
+                return True
+            if v in VALORES_FALSE:
+                return False
+            return None
+        if self.tipo == "enum":
+            return self.mapa.get(str(valor).lower())
+        if self.tipo == "preset":
+            nome = self.mapa.get(str(valor).lower())
+            return self.frames[nome] if nome else None
+        n, bruto = self._inteiro(valor)
+        if bruto is not None:
+            return bruto
+        if n is None or not self.minimo <= n <= self.maximo:
+            return None
+        return n * self.escala
+
+    def limitar(self, valor):
+        """Como `codificar`, mas números fora da faixa são saturados em vez de rejeitados."""
+        if self.tipo != "int":
+            return self.codificar(valor)
+        n, bruto = self._inteiro(valor)
+        if bruto is not None:
+            return bruto
+        if n is None:
+            return None
+        return min(max(n, self.minimo), self.maximo) * self.escala
+
+    def decodificar(self, bruto):
+        """Valor do protocolo -> unidade do usuário."""
+        if self.tipo == "int" and self.escala != 1:
+            return bruto // self.escala
+        return bruto
+
+    def descrever(self) -> str:
+        if self.tipo == "bool":
+            return "on/off"
+        if self.tipo == "int":
+            faixa = f"{self.minimo}-{self.maximo}"
+            return f"{faixa} ou {'/'.join(self.mapa)}" if self.mapa else faixa
+        return "/".join(sorted(set(self.mapa.values())))
+
+
+def _compilar_comando(cmd: dict, esquema: dict) -> dict:
+    tipo = cmd["type"]
+    valores = esquema.get("values")
+    valores = valores if isinstance(valores, dict) else {}
+    entrada = {"dps": cmd["dps"]}
+
+    if tipo == "boolean":
+        entrada["tipo"] = "bool"
+
+    elif tipo == "enum":
+        mapa = {k.lower(): v for k, v in cmd.get("mapping", {}).items()}
+        canonicos = set(mapa.values()) or set(cmd["valid_values"])
+        for c in canonicos:
+            mapa.setdefault(c.lower(), c)
+        if "range" in valores:
+            mapa = {k: v for k, v in mapa.items() if v in valores["range"]}
+        entrada.update(tipo="enum", mapa=mapa)
+
+    elif tipo in ("integer", "integer_or_enum"):
+        faixa = cmd["range"]
+        entrada.update(tipo="int", min=faixa["min"], max=faixa["max"], escala=10 ** valores.get("scale", 0))
+        alt = cmd.get("alternative_range")
+        if alt:
+            entrada["alt"] = [alt["min"], alt["max"], faixa["max"] // alt["max"]]
+        if "mapping" in cmd:
+            entrada["mapa"] = {k.lower(): v for k, v in cmd["mapping"].items()}
+
+    elif tipo == "preset":
+        mapa, frames = {}, {}
+        for nome, p in cmd["presets"].items():
+            frames[nome] = p["dps_values"]
+            for alias in p.get("aliases", [nome]):
+                mapa[alias.lower()] = nome
+        entrada.update(tipo="preset", mapa=mapa, frames=frames)
+
+    else:
+        raise ValueError(f"tipo de comando desconhecido: {tipo}")
+
+    return entrada
+
+
+def _esquema_do_dispositivo(disp: dict, dumps: list) -> dict:
+    """
+    Mapping de DPS do devices.json. Filtra pela categoria (se informada) e casa
+    por id; na falta, pela versão do protocolo. Um id repetido entre os dumps é
+    placeholder ("id here") e não identifica nada: casar por ele fazia todo
+    dispositivo pegar o primeiro dump (ar com escala 1 em vez de 10).
+    """
+    ids = [d.get("id") for d in dumps]
+    candidatos = [d for d in dumps if disp.get("category") in (None, d.get("category"))]
+    for d in candidatos:
+        if d.get("id") == disp.get("id") and ids.count(d.get("id")) == 1:
+            return d["mapping"]
+    for d in candidatos:
+        if str(d.get("version")) == str(disp.get("version")):
+            return d["mapping"]
+    return {}
+
+
+def compilar(devices_path: str = FONTE_DEVICES, guidelines_path: str = FONTE_GUIDELINES) -> dict:
+    """Gera a tabela compacta {dispositivo: {comando: entrada}} a partir das fontes."""
+    with open(devices_path, "r", encoding="utf-8") as f:
+        dumps = json.load(f)
+    with open(guidelines_path, "r", encoding="utf-8") as f:
+        guidelines = json.load(f)
+
+    tabela = {}
+    for nome, disp in guidelines["devices"].items():
+        esquema = _esquema_do_dispositivo(disp, dumps)
+        tabela[nome] = {
+            comando: _compilar_comando(cmd, esquema.get(cmd["dps"], {}))
+            for comando, cmd in disp["commands"].items()
+        }
+    return tabela
+
+
+def hash_fontes() -> str | None:
+    """sha256 do conteúdo das fontes; None se alguma não existe (deploy só com o cache)."""
+    h = hashlib.sha256()
+    for fonte in (FONTE_DEVICES, FONTE_GUIDELINES):
+        try:
+            with open(fonte, "rb") as f:
+                h.update(f.read())
+        except OSError:
+            return None
+    return h.hexdigest()
+
+
+def _ler_cache() -> dict | None:
+    """Tabela do cache se ela foi gerada por este compilador a partir destas fontes."""
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Caches sem versão (formato antigo: só a tabela) são descartados
+    if not isinstance(cache, dict) or cache.get("versao") != VERSAO_COMPILADOR:
+        return None
+    fontes = hash_fontes()
+    if fontes is not None and cache.get("fontes") != fontes:
+        return None
+    return cache.get("tabela")
+
+
+def salvar(tabela: dict):
+    tmp = CACHE_PATH + ".tmp"
+    cache = {"versao": VERSAO_COMPILADOR, "fontes": hash_fontes(), "tabela": tabela}
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"), ensure_ascii=False)
+    os.replace(tmp, CACHE_PATH)
+
+
+def carregar() -> dict:
+    """Carrega do cache pré-compilado, recompilando se o compilador ou as fontes mudaram."""
+    tabela = _ler_cache()
+    if tabela is None:
+        tabela = compilar()
+        try:
+            salvar(tabela)
+        except OSError as e:
+            print(f"[AVISO] Nao foi possivel salvar o cache do registro: {e}")
+    return {
+        nome: {comando: Codec(comando, e) for comando, e in comandos.items()}
+        for nome, comandos in tabela.items()
+    }
+
+
+REGISTRO = carregar()
+
+
+def dps_map() -> dict:
+    """Equivalente ao antigo DPS_MAP: {dispositivo: {comando: "dps"|"multi"}}."""
+    return {
+        nome: {c: str(codec.dps) if codec.dps is not None else "multi" for c, codec in comandos.items()}
+        for nome, comandos in REGISTRO.items()
+    }
+
+
+def main():
+    tabela = compilar()
+    salvar(tabela)
+    print(f"Registro compilado em {CACHE_PATH}")
+    for nome, comandos in tabela.items():
+        print(f"\n{nome}")
+        for comando, entrada in comandos.items():
+            print(f"  {comando:<10} DPS {entrada['dps']:>5}  {Codec(comando, entrada).descrever()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Telemetria do host (Raspberry Pi): frequência da CPU, temperatura do SoC,
+throttling, memória, swap e pressão (PSI), lidos de /proc e /sys.
+
+Uma thread amostra a cada INTERVALO segundos (só leituras de arquivos
+virtuais, dezenas de microssegundos por amostra) e guarda as últimas
+amostras. Cada comando resume as amostras do seu intervalo (pior caso:
+temperatura máxima, frequência mínima, menor memória disponível...) e é
+marcado como "limitado" quando o host estava saturado, para separar
+lentidão do modelo de lentidão da máquina.
+"""
+
+import os
+import glob
+import time
+import shutil
+import threading
+import subprocess
+from collections import deque
+
+INTERVALO = 1.0                 # Período de amostragem (s)
+HISTORICO = 600                 # Amostras mantidas (10 min com INTERVALO=1)
+INTERVALO_VCGENCMD = 10.0       # Sem get_throttled no sysfs, chama o vcgencmd no máximo a cada (s)
+
+LIMITE_TEMPERATURA_C = 80.0     # O Pi 5 começa a reduzir a frequência perto de 85 °C
+LIMITE_MEMORIA_PCT = 10.0       # MemAvailable abaixo disso (% do total) = pressão de memória
+LIMITE_PSI_CPU = 50.0           # % do tempo com tarefas esperando CPU (avg10)
+
+_CPUFREQ = "/sys/devices/system/cpu/cpu{}/cpufreq/{}"
+_TEMPERATURA = "/sys/class/thermal/thermal_zone0/temp"
+
+# Bits de `vcgencmd get_throttled` (0-3: agora; 16-19: ocorreu desde o boot)
+BITS_THROTTLED = {
+    0: "subtensao",
+    1: "freq_limitada",
+    2: "throttling",
+    3: "limite_termico",
+}
+
+
+def _ler(caminho: str) -> str | None:
+    try:
+        with open(caminho) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _ler_int(caminho: str, base: int = 10) -> int | None:
+    texto = _ler(caminho)
+    try:
+        return int(texto.strip(), base) if texto else None
+    except ValueError:
+        return None
+
+
+def _meminfo() -> dict:
+    campos = {}
+    for linha in (_ler("/proc/meminfo") or "").splitlines():
+        nome, _, resto = linha.partition(":")
+        if nome in ("MemTotal", "MemAvailable", "SwapTotal", "SwapFree"):
+            campos[nome] = int(resto.split()[0]) * 1024
+    return campos
+
+
+def _vmstat_swap() -> tuple:
+    """(páginas lidas do swap, páginas gravadas no swap) desde o boot."""
+    entrada = saida = 0
+    for linha in (_ler("/proc/vmstat") or "").splitlines():
+        if linha.startswith("pswpin "):
+            entrada = int(linha.split()[1])
+        elif linha.startswith("pswpout "):
+            saida = int(linha.split()[1])
+    return entrada, saida
+
+
+def _cpu_ocupada() -> tuple:
+    """(ticks ocupados, ticks totais) de /proc/stat."""
+    linha = (_ler("/proc/stat") or "").partition("\n")[0].split()
+    if not linha or linha[0] != "cpu":
+        return 0, 0
+    valores = [int(v) for v in linha[1:]]
+    ocioso = valores[3] + (valores[4] if len(valores) > 4 else 0)  # idle + iowait
+    return sum(valores) - ocioso, sum(valores)
+
+
+def _psi(recurso: str) -> float | None:
+    """'some avg10' de /proc/pressure/<recurso> (kernel com PSI)."""
+    texto = _ler(f"/proc/pressure/{recurso}")
+    if not texto:
+        return None
+    for campo in texto.partition("\n")[0].split()[1:]:
+        nome, _, valor = campo.partition("=")
+        if nome == "avg10":
+            return float(valor)
+    return None
+
+
+# Onde os kernels da Raspberry Pi expõem o get_throttled do firmware (Pi 4: soc/soc:firmware,
+# Pi 5: soc@107c000000/soc@107c000000:firmware); busca recursiva no sysfs é lenta demais
+_THROTTLED = ("/sys/devices/platform/soc*/soc*:firmware/get_throttled",
+              "/sys/devices/platform/*firmware/get_throttled")
+
+
+def _caminho_throttled() -> str | None:
+    for padrao in _THROTTLED:
+        for caminho in glob.glob(padrao):
+            return caminho
+    return None
+
+
+def motivos_throttled(bits: int) -> list:
+    return [nome for bit, nome in BITS_THROTTLED.items() if bits & (1 << bit)]
+
+
+class AmostradorHost:
+    """Amostras periódicas do host e resumo por intervalo de um comando."""
+
+    def __init__(self, intervalo: float = INTERVALO, historico: int = HISTORICO):
+        self.intervalo = intervalo
+        self._amostras = deque(maxlen=historico)
+        self._lock = threading.Lock()
+        self._ativo = False
+        self._thread = None
+        self._ncpus = os.cpu_count() or 1
+        self._freq_max = _ler_int(_CPUFREQ.format(0, "cpuinfo_max_freq"))
+        self._throttled = _caminho_throttled()
+        self._vcgencmd = None if self._throttled else shutil.which("vcgencmd")
+        self._ultimo_vcgencmd = (-float("inf"), None)
+        self._cpu_anterior = _cpu_ocupada()
+        self._swap_anterior = _vmstat_swap()
+        self.requisicoes = 0
+        self.requisicoes_limitadas = 0
+
+    def _bits_throttled(self) -> int | None:
+        if self._throttled:
+            return _ler_int(self._throttled, 16)  # Hexa sem prefixo ("5000e"), como o vcgencmd
+        if not self._vcgencmd:
+            return None
+        agora = time.monotonic()
+        if agora - self._ultimo_vcgencmd[0] >= INTERVALO_VCGENCMD:
+            try:
+                saida = subprocess.run([self._vcgencmd, "get_throttled"], capture_output=True,
+                                       text=True, timeout=2).stdout
+                bits = int(saida.strip().partition("=")[2], 16)
+            except (OSError, ValueError, subprocess.SubprocessError):
+                bits = None
+            self._ultimo_vcgencmd = (agora, bits)
+        return self._ultimo_vcgencmd[1]
+
+    def amostrar(self) -> dict:
+        """Lê o estado atual do host e guarda a amostra."""
+        a = {"t": time.perf_counter_ns()}
+
+        freqs = [f for f in (_ler_int(_CPUFREQ.format(i, "scaling_cur_freq")) for i in range(self._ncpus)) if f]
+        if freqs:
+            a["cpu_mhz"] = min(freqs) / 1000
+        temp = _ler_int(_TEMPERATURA)
+        if temp is not None:
+            a["temp_c"] = temp / 1000
+
+        ocupada, total = _cpu_ocupada()
+        o0, t0 = self._cpu_anterior
+        if total > t0:
+            a["cpu_pct"] = 100.0 * (ocupada - o0) / (total - t0)
+        self._cpu_anterior = (ocupada, total)
+
+        mem = _meminfo()
+        if mem.get("MemTotal"):
+            a["mem_disp_pct"] = 100.0 * mem.get("MemAvailable", 0) / mem["MemTotal"]
+        if "SwapTotal" in mem:
+            a["swap_mb"] = (mem["SwapTotal"] - mem.get("SwapFree", 0)) / 2**20
+        entrada, saida = _vmstat_swap()
+        a["swap_paginas"] = (entrada - self._swap_anterior[0]) + (saida - self._swap_anterior[1])
+        self._swap_anterior = (entrada, saida)
+
+        for recurso in ("cpu", "memory"):
+            psi = _psi(recurso)
+            if psi is not None:
+                a[f"psi_{recurso}"] = psi
+
+        bits = self._bits_throttled()
+        if bits is not None:
+            a["throttled"] = bits
+
+        with self._lock:
+            self._amostras.append(a)
+        return a
+
+    def _loop(self):
+        while self._ativo:
+            self.amostrar()
+            time.sleep(self.intervalo)
+
+    def iniciar(self):
+        if self._ativo:
+            return
+        self._ativo = True
+        self._thread = threading.Thread(target=self._loop, name="telemetria-host", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._ativo = False
+
+    def ativo(self) -> bool:
+        return self._ativo
+
+    def ultima(self) -> dict | None:
+        with self._lock:
+            return self._amostras[-1] if self._amostras else None
+
+    def resumo(self, desde_ns: int | None = None, ate_ns: int | None = None) -> dict | None:
+        """
+        Pior caso das amostras no intervalo [desde_ns, ate_ns] (perf_counter_ns,
+        as mesmas marcas de metricas_latencia); se nenhuma amostra caiu no
+        intervalo (comando curto), usa a mais recente. Inclui `limitado` e os
+        `motivos`.
+        """
+        with self._lock:
+            amostras = [a for a in self._amostras
+                        if (desde_ns is None or a["t"] >= desde_ns) and (ate_ns is None or a["t"] <= ate_ns)]
+            if not amostras and self._amostras:
+                amostras = [self._amostras[-1]]
+        if not amostras:
+            return None
+
+        r = {"amostras": len(amostras)}
+        for campo, pior in (("temp_c", max), ("cpu_mhz", min), ("cpu_pct", max), ("mem_disp_pct", min),
+                            ("swap_mb", max), ("psi_cpu", max), ("psi_memory", max)):
+            valores = [a[campo] for a in amostras if campo in a]
+            if valores:
+                r[campo] = round(pior(valores), 1)
+        r["swap_paginas"] = sum(a.get("swap_paginas", 0) for a in amostras)
+        bits = [a["throttled"] for a in amostras if "throttled" in a]
+        if bits:
+            r["throttled"] = hex(_ou(bits))
+
+        motivos = motivos_throttled(_ou(bits) & 0xF) if bits else []
+        if not bits and r.get("temp_c", 0) >= LIMITE_TEMPERATURA_C:
+            motivos.append("temperatura")
+        if self._freq_max and "cpu_mhz" in r and "freq_limitada" not in motivos and r.get("cpu_pct", 0) > 90 \
+                and r["cpu_mhz"] < 0.9 * self._freq_max / 1000:
+            motivos.append("freq_baixa_sob_carga")  # Governador ou firmware segurando o clock com CPU cheia
+        if r.get("mem_disp_pct", 100) < LIMITE_MEMORIA_PCT:
+            motivos.append("memoria")
+        if r["swap_paginas"] > 0:
+            motivos.append("swap")
+        if r.get("psi_cpu", 0) >= LIMITE_PSI_CPU:
+            motivos.append("cpu_saturada")
+        r["limitado"] = bool(motivos)
+        if motivos:
+            r["motivos"] = motivos
+        return r
+
+    def contar(self, resumo: dict | None):
+        """Contabiliza o resumo de um comando (exposto em familias_metricas)."""
+        self.requisicoes += 1
+        if resumo and resumo.get("limitado"):
+            self.requisicoes_limitadas += 1
+
+
+def _ou(valores: list) -> int:
+    resultado = 0
+    for v in valores:
+        resultado |= v
+    return resultado
+
+
+AMOSTRADOR = AmostradorHost()
+
+
+def familias_metricas() -> list:
+    """Coletor do endpoint de metricas (metricas_http)."""
+    a = AMOSTRADOR.ultima() or {}
+    familias = [
+        (nome, "gauge", ajuda, [({}, a[campo])])
+        for campo, nome, ajuda in (
+            ("temp_c", "delta_host_temperatura_celsius", "Temperatura do SoC"),
+            ("cpu_mhz", "delta_host_cpu_mhz", "Menor frequencia atual entre os nucleos"),
+            ("cpu_pct", "delta_host_cpu_uso_percent", "Uso de CPU na ultima amostra"),
+            ("mem_disp_pct", "delta_host_memoria_disponivel_percent", "MemAvailable em % do total"),
+            ("swap_mb", "delta_host_swap_mb", "Swap em uso"),
+            ("psi_cpu", "delta_host_psi_cpu_percent", "Pressao de CPU (some avg10)"),
+            ("psi_memory", "delta_host_psi_memoria_percent", "Pressao de memoria (some avg10)"),
+            ("throttled", "delta_host_throttled", "Bits de vcgencmd get_throttled"),
+        )
+        if campo in a
+    ]
+    familias.append(("delta_host_requisicoes_limitadas_total", "counter",
+                     "Comandos atendidos com o host limitado (throttling, memoria, swap)",
+                     [({}, AMOSTRADOR.requisicoes_limitadas)]))
+    return familias
@@ -0,0 +1,222 @@
+"""
+Termostato automático: controla o AC e o ventilador a partir da temperatura
+fundida dos sensores, sem passar pelo SLM.
+
+Estados: "desligado" -> "ventilador" -> "ar", com histerese entre os limiares
+de ligar e desligar. As regras que antes só existiam no SYSTEM_PROMPT valem
+aqui em código:
+  - AC e ventilador nunca ficam ligados juntos (desliga um antes de ligar o outro);
+  - acima de LIMIAR_AR prefere o AC;
+  - cada aparelho respeita um tempo mínimo ligado e desligado (compressor do AC).
+
+Um comando de voz (ou cena) sobre o AC/ventilador suspende o termostato por
+DURACAO_OVERRIDE; ao expirar ele volta a decidir a partir do estado deixado
+pelo usuário.
+"Pausa o termostato" o suspende até um "retoma o termostato". A exclusão
+mútua vale também para os comandos de voz/cena: ligar um aparelho desliga o
+outro (`liberar`).
+"""
+
+import time
+import threading
+
+import metricas_http
+from device_tools import set_ac_state, set_fan_state
+from registro_dispositivos import REGISTRO
+
+ATIVO = True
+PERIODO_CONTROLE = 30.0      # Intervalo entre decisões (s)
+DURACAO_OVERRIDE = 2 * 3600  # Quanto um comando de voz suspende o termostato (s)
+
+# Histerese (°C): liga acima de *_LIGAR, desliga abaixo de *_DESLIGAR
+VENTILADOR_LIGAR = 25.0
+VENTILADOR_DESLIGAR = 24.0
+LIMIAR_AR = 27.0             # Acima disso troca o ventilador pelo AC
+AR_DESLIGAR = 24.5
+TEMP_ALVO_AR = 23            # Temperatura programada no AC (ideal do SYSTEM_PROMPT)
+VELOCIDADE_VENTILADOR = 3
+
+# Tempos mínimos (s) em cada estado antes de poder mudar
+TEMPO_MINIMO_LIGADO = {"ar": 600.0, "ventilador": 120.0}
+TEMPO_MINIMO_DESLIGADO = {"ar": 300.0, "ventilador": 30.0}
+
+ACOES = metricas_http.Contador(
+    "delta_termostato_acoes_total", "Mudancas de estado feitas pelo termostato", ("estado",))
+
+
+def decidir(estado: str, temp: float) -> str:
+    """Próximo estado desejado, só pela histerese (sem tempos mínimos)."""
+    if temp >= LIMIAR_AR:
+        return "ar"
+    if estado == "ar":
+        return "desligado" if temp <= AR_DESLIGAR else "ar"
+    if estado == "ventilador":
+        return "desligado" if temp <= VENTILADOR_DESLIGAR else "ventilador"
+    return "ventilador" if temp >= VENTILADOR_LIGAR else "desligado"
+
+
+class Termostato:
+    def __init__(self, sensores):
+        self.sensores = sensores
+        self.estado = "desligado"
+        # Instante (monotonic) da última vez que cada aparelho ligou/desligou
+        self._ligou = {"ar": float("-inf"), "ventilador": float("-inf")}
+        self._desligou = {"ar": float("-inf"), "ventilador": float("-inf")}
+        self._override_ate = 0.0
+        self._lock = threading.Lock()
+        self._rodando = False
+        self._acordar = threading.Event()
+        self._thread = None
+
+    # ---------- tempos mínimos ----------
+    def _pode_desligar(self, aparelho: str, agora: float) -> bool:
+        return agora - self._ligou[aparelho] >= TEMPO_MINIMO_LIGADO[aparelho]
+
+    def _pode_ligar(self, aparelho: str, agora: float) -> bool:
+        return agora - self._desligou[aparelho] >= TEMPO_MINIMO_DESLIGADO[aparelho]
+
+    def _transicao_permitida(self, novo: str, agora: float) -> bool:
+        atual = self.estado
+        if atual != "desligado" and not self._pode_desligar(atual, agora):
+            return False
+        if novo != "desligado" and not self._pode_ligar(novo, agora):
+            return False
+        return True
+
+    # ---------- atuação ----------
+    def _acionar(self, aparelho: str, ligar: bool) -> bool:
+        """
+        Uma escrita no aparelho, fora do _lock. Falha (exceção ou changes["errors"]
+        do device_tools) sai no terminal e retorna False.
+        """
+        try:
+            if aparelho == "ar":
+                resultado = (set_ac_state(power=True, target_temp_c=TEMP_ALVO_AR, mode="cold") if ligar
+                             else set_ac_state(power=False))
+            else:
+                resultado = (set_fan_state(power=True, speed=VELOCIDADE_VENTILADOR) if ligar
+                             else set_fan_state(power=False))
+            erro = "; ".join(resultado.get("errors") or ())
+        except Exception as e:
+            erro = str(e)
+        if erro:
+            print(f"[ERRO] Termostato falhou ao {'ligar' if ligar else 'desligar'} {aparelho}: {erro}")
+        return not erro
+
+    def _aplicar(self, atual: str, novo: str) -> str:
+        """Faz a transição nos aparelhos; retorna o estado em que eles realmente ficaram."""
+        # Exclusão mútua: desliga o aparelho atual antes; se não desligou, não liga o outro
+        if atual != "desligado" and not self._acionar(atual, False):
+            return atual
+        if novo != "desligado" and not self._acionar(novo, True):
+            return "desligado"
+        return novo
+
+    def passo(self, agora: float | None = None) -> str:
+        """Uma decisão de controle; retorna o estado após a decisão."""
+        agora = time.monotonic() if agora is None else agora
+        with self._lock:
+            if agora < self._override_ate:
+                return self.estado
+            temp = self.sensores.fusao.resultado()["temp"]
+            if temp is None:
+                return self.estado  # Sem leitura confiável, não mexe em nada
+            atual = self.estado
+            novo = decidir(atual, temp)
+            if novo == atual or not self._transicao_permitida(novo, agora):
+                return atual
+        print(f"[INFO] Termostato: {temp:.1f}C, {atual} -> {novo}")
+        # Escritas fora do _lock: registrar_comando/liberar não esperam a rede (nem o sleep do AC)
+        alcancado = self._aplicar(atual, novo)
+        with self._lock:
+            if alcancado == atual:
+                return self.estado
+            if atual != "desligado":
+                self._desligou[atual] = agora
+            if alcancado != "desligado":
+                self._ligou[alcancado] = agora
+            # Um comando de voz no meio das escritas vale mais que a decisão automática
+            if self.estado == atual and agora >= self._override_ate:
+                self.estado = alcancado
+                ACOES.inc(1, alcancado)
+            return self.estado
+
+    # ---------- overrides de voz ----------
+    def registrar_comando(self, aparelho: str, power, duracao: float = DURACAO_OVERRIDE):
+        """
+        Avisa que o usuário acionou `aparelho` ("ar" ou "ventilador") por voz/cena:
+        suspende o termostato e adota o estado que o usuário deixou.
+        """
+        if power is None:
+            return
+        agora = time.monotonic()
+        with self._lock:
+            self._override_ate = agora + duracao
+            if power:
+                self._ligou[aparelho] = agora
+                self.estado = aparelho
+            else:
+                self._desligou[aparelho] = agora
+                if self.estado == aparelho:
+                    self.estado = "desligado"
+
+    def liberar(self, aparelho: str):
+        """
+        Antes de o usuário ligar `aparelho` por voz/cena: desliga o outro, já que
+        AC e ventilador nunca ficam ligados juntos nem fora do controle automático.
+        """
+        outro = "ventilador" if aparelho == "ar" else "ar"
+        if not self._acionar(outro, False):
+            return
+        with self._lock:
+            self._desligou[outro] = time.monotonic()
+            if self.estado == outro:
+                self.estado = "desligado"
+
+    def registrar_cena(self, passos: dict):
+        """Override a partir dos passos compilados de uma cena (cenas.CENAS[...]["passos"])."""
+        ligados, tocados = [], set()
+        for aparelho, dispositivo, comando in (("ar", "ar", "switch"), ("ventilador", "interruptor", "ventilador")):
+            dps = REGISTRO[dispositivo][comando].dps
+            for frame, _ in passos.get(dispositivo, []):
+                if dps in frame:
+                    tocados.add(aparelho)
+                    if frame[dps]:
+                        ligados.append(aparelho)
+                    self.registrar_comando(aparelho, frame[dps])
+        # Cena que liga um aparelho sem dizer nada do outro: o outro desliga
+        for aparelho in ligados:
+            if ({"ar", "ventilador"} - {aparelho}).isdisjoint(tocados):
+                self.liberar(aparelho)
+
+    def retomar(self):
+        """Cancela o override e decide de novo imediatamente."""
+        with self._lock:
+            self._override_ate = 0.0
+        self._acordar.set()
+
+    def pausar(self):
+        """Suspende o controle automático até `retomar()` (sem mexer nos aparelhos)."""
+        with self._lock:
+            self._override_ate = float("inf")
+
+    # ---------- thread ----------
+    def _loop(self):
+        while self._rodando:
+            self.passo()
+            self._acordar.wait(PERIODO_CONTROLE)
+            self._acordar.clear()
+
+    def iniciar(self):
+        if self._rodando:
+            return
+        self._rodando = True
+        self._thread = threading.Thread(target=self._loop, name="termostato", daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._rodando = False
+        self._acordar.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None